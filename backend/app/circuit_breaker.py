@@ -0,0 +1,70 @@
+from __future__ import annotations
+
+import time
+from typing import Any
+
+
+class CircuitBreaker:
+    """Stops sending requests to an upstream that keeps failing.
+
+    Closed: requests flow and consecutive failures are counted.  After
+    `threshold` of them the breaker opens and every request is refused
+    at once for `reset_after` seconds.  Then it is half-open: a single
+    trial request is let through and the breaker re-arms behind it;
+    success closes the breaker, failure (or a trial that never reports
+    back) keeps it open for another period.
+    """
+
+    def __init__(self, threshold: int, reset_after: float) -> None:
+        self.threshold = threshold
+        self.reset_after = reset_after
+        self._failures = 0
+        self._opened_at: float | None = None
+
+        self.opened = 0
+        self.rejected = 0
+
+    @property
+    def state(self) -> str:
+        if self._opened_at is None:
+            return "closed"
+        if time.monotonic() - self._opened_at < self.reset_after:
+            return "open"
+        return "half_open"
+
+    def allow(self) -> bool:
+        """Whether a request may be sent now."""
+        state = self.state
+        if state == "closed":
+            return True
+        if state == "half_open":
+            self._opened_at = time.monotonic()
+            return True
+        self.rejected += 1
+        return False
+
+    def retry_after(self) -> float:
+        """Seconds until the breaker will let a trial request through."""
+        if self._opened_at is None:
+            return 0.0
+        return max(0.0, self._opened_at + self.reset_after - time.monotonic())
+
+    def record_success(self) -> None:
+        self._failures = 0
+        self._opened_at = None
+
+    def record_failure(self) -> None:
+        self._failures += 1
+        if self._failures >= self.threshold:
+            if self._opened_at is None:
+                self.opened += 1
+            self._opened_at = time.monotonic()
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            "state": self.state,
+            "consecutive_failures": self._failures,
+            "opened": self.opened,
+            "rejected": self.rejected,
+            "retry_after": round(self.retry_after(), 3),
+        }
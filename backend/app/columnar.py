@@ -0,0 +1,68 @@
+from __future__ import annotations
+
+import re
+from typing import Any
+
+import pandas as pd
+
+# Media type of the column-oriented encoding, requested via Accept (or ?format=columns)
+COLUMNS_MEDIA_TYPE = "application/vnd.undercut.columns+json"
+
+_ISO_DATE = re.compile(r"^\d{4}-\d{2}-\d{2}T")
+
+# Plain JSON, but every list of objects is sent as its columns:
+#
+#   [{"lap_number": 1, "driver_number": 4}, {"lap_number": 2, "driver_number": 4}]
+#   -> {"$length": 2, "$columns": {"lap_number": [1, 2], "driver_number": {"$repeat": 4}}}
+#
+# A column is an array, {"$repeat": value} when every row has the same
+# value, or {"$time_deltas": [...], "$unit": "ms" | "us"} for ISO-8601 UTC
+# timestamps: epoch time of the first row, then the difference to the
+# previous row.  Repeated keys and timestamp strings are most of the bytes
+# of the gap/lap/weather series, so this is several times smaller.
+
+
+def encode(value: Any) -> Any:
+    """Column-encode every list of objects in JSON-compatible data."""
+    if isinstance(value, list):
+        if value and all(isinstance(v, dict) for v in value):
+            return _table(value)
+        return [encode(v) for v in value]
+    if isinstance(value, dict):
+        return {k: encode(v) for k, v in value.items()}
+    return value
+
+
+def _table(rows: list[dict]) -> dict[str, Any]:
+    keys: dict[str, None] = {}
+    for r in rows:
+        keys.update(dict.fromkeys(r))
+    return {
+        "$length": len(rows),
+        "$columns": {k: _column([r.get(k) for r in rows]) for k in keys},
+    }
+
+
+def _column(values: list[Any]) -> Any:
+    first = values[0]
+    if len(values) > 1 and all(v == first and type(v) is type(first) for v in values):
+        return {"$repeat": first}
+    if isinstance(first, str) and _ISO_DATE.match(first):
+        deltas = _time_deltas(values)
+        if deltas is not None:
+            return deltas
+    return values
+
+
+def _time_deltas(values: list[Any]) -> dict[str, Any] | None:
+    if not all(isinstance(v, str) for v in values):
+        return None
+    parsed = pd.to_datetime(pd.Series(values), format="ISO8601", utc=True, errors="coerce")
+    if parsed.isna().any():
+        return None
+    micros = pd.DatetimeIndex(parsed).as_unit("us").asi8
+    # Milliseconds when that loses nothing (it usually doesn't)
+    unit = "ms" if not (micros % 1000).any() else "us"
+    ticks = micros // 1000 if unit == "ms" else micros
+    deltas = [int(ticks[0])] + [int(d) for d in (ticks[1:] - ticks[:-1])]
+    return {"$time_deltas": deltas, "$unit": unit}
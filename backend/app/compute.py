@@ -0,0 +1,146 @@
+from __future__ import annotations
+
+import asyncio
+import contextvars
+import os
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, TypeVar
+
+from . import metrics, timing
+
+T = TypeVar("T")
+
+# Worker threads for CPU-bound pandas/numpy work.  numpy and pandas release
+# the GIL in their heavy loops, and session frames are shared in-process,
+# so threads rather than processes.
+_WORKERS = int(os.environ.get("COMPUTE_WORKERS", min(4, os.cpu_count() or 1)))
+# Jobs allowed to wait for a worker before new ones are refused
+_MAX_QUEUE = int(os.environ.get("COMPUTE_MAX_QUEUE", 64))
+
+_pool = ThreadPoolExecutor(max_workers=_WORKERS, thread_name_prefix="compute")
+_slots = asyncio.Semaphore(_WORKERS)
+
+_stats = {
+    "completed": 0,
+    "rejected": 0,
+    "running": 0,
+    "queued": 0,
+    "busy_seconds_total": 0.0,
+}
+
+
+class ComputeBusyError(RuntimeError):
+    """Raised instead of queueing when the compute queue is full."""
+
+    retry_after = 1.0
+
+
+async def run(fn: Callable[..., T], *args: Any) -> T:
+    """Run fn(*args) on the compute pool without blocking the event loop.
+
+    At most one job per worker is handed to the pool; the rest wait here,
+    so a cancelled request never leaves work behind in the pool's queue.
+    Past _MAX_QUEUE waiting jobs, ComputeBusyError is raised at once.
+    """
+    if _slots.locked() and _stats["queued"] >= _MAX_QUEUE:
+        _stats["rejected"] += 1
+        raise ComputeBusyError(f"Compute queue full ({_MAX_QUEUE} waiting)")
+    _stats["queued"] += 1
+    try:
+        with timing.stage("queue"):
+            await _slots.acquire()
+    finally:
+        _stats["queued"] -= 1
+
+    loop = asyncio.get_running_loop()
+    _stats["running"] += 1
+    started = time.perf_counter()
+
+    def done(_: Any) -> None:
+        _stats["running"] -= 1
+        _stats["completed"] += 1
+        _stats["busy_seconds_total"] += time.perf_counter() - started
+        _slots.release()
+
+    # The slot is released when the job finishes, not when the caller
+    # stops waiting: the thread stays busy either way
+    future = _pool.submit(contextvars.copy_context().run, timing.call, fn, *args)
+    future.add_done_callback(lambda f: _call_in_loop(loop, done, f))
+    return await asyncio.wrap_future(future)
+
+
+def _call_in_loop(loop: asyncio.AbstractEventLoop, fn: Callable[..., Any], *args: Any) -> None:
+    try:
+        loop.call_soon_threadsafe(fn, *args)
+    except RuntimeError:
+        pass  # loop already closed at shutdown
+
+
+def stats() -> dict[str, Any]:
+    """Pool size, queue depth and throughput of the compute pool."""
+    return {
+        "workers": _WORKERS,
+        "max_queue": _MAX_QUEUE,
+        **_stats,
+        "busy_seconds_total": round(_stats["busy_seconds_total"], 3),
+    }
+
+
+class LoopLagMonitor:
+    """Measures how late the event loop runs a timer.
+
+    A task sleeps `interval` seconds over and over; whatever it oversleeps
+    by is time the loop spent blocked on something else.  The last
+    `window` samples are kept for the mean, p99 and max.
+    """
+
+    def __init__(self, interval: float = 0.1, window: int = 600) -> None:
+        self.interval = interval
+        self._samples: deque[float] = deque(maxlen=window)
+        self._task: asyncio.Task | None = None
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.ensure_future(self._run())
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            expected = loop.time() + self.interval
+            await asyncio.sleep(self.interval)
+            self._samples.append(max(0.0, loop.time() - expected))
+
+    async def close(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    def stats(self) -> dict[str, Any]:
+        if not self._samples:
+            return {"samples": 0}
+        ordered = sorted(self._samples)
+        p99 = ordered[min(len(ordered) - 1, int(len(ordered) * 0.99))]
+        return {
+            "samples": len(ordered),
+            "current_ms": round(self._samples[-1] * 1000, 2),
+            "mean_ms": round(sum(ordered) / len(ordered) * 1000, 2),
+            "p99_ms": round(p99 * 1000, 2),
+            "max_ms": round(ordered[-1] * 1000, 2),
+        }
+
+
+metrics.callback("compute_workers", "Threads in the compute pool", lambda: _WORKERS)
+metrics.callback("compute_jobs_running", "Compute jobs running on the pool", lambda: _stats["running"])
+metrics.callback("compute_jobs_queued", "Compute jobs waiting for a worker", lambda: _stats["queued"])
+metrics.callback(
+    "compute_jobs_total", "Finished and rejected compute jobs",
+    lambda: {("completed",): _stats["completed"], ("rejected",): _stats["rejected"]},
+    type="counter", labels=("result",),
+)
+metrics.callback(
+    "compute_busy_seconds_total", "Time spent running compute jobs (pandas/numpy work)",
+    lambda: _stats["busy_seconds_total"], type="counter",
+)
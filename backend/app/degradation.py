@@ -0,0 +1,240 @@
+from __future__ import annotations
+
+import numpy as np
+import pandas as pd
+
+from .session_frame import SessionFrame
+
+# Ridge weights.  Compound pace offsets and slopes lean slightly towards
+# 0, so a compound only one car has run doesn't absorb that car's pace and
+# a compound seen at a single tyre age has a defined slope; the fuel
+# effect leans on a typical value while every car is still on its first
+# set and lap number and tyre age move together.
+_OFFSET_PRIOR = 1.0
+_SLOPE_PRIOR = 1.0
+_FUEL_PRIOR = -0.05  # s per lap as the car gets lighter
+_FUEL_PRIOR_WEIGHT = 100.0
+# Residuals beyond this many MADs (in-laps, traffic, errors) are refit without
+_OUTLIER_MADS = 3.0
+
+
+class DegradationModel:
+    """Lap time against tyre age and lap number, fitted for the whole field.
+
+    Every clean racing lap is matched to its stint, and one least-squares
+    fit explains its time as
+
+        driver pace + compound offset + compound slope * tyre age + fuel * lap
+
+    so each stint follows its driver's pace on the compound's degradation
+    curve, and the fuel effect (lighter car every lap) is measured across
+    stints rather than mixed into the degradation.  The fit's normal
+    equations are summed per lap number, so the fit "as of lap N" for any
+    N (historical scrubbing, no peeking at later laps) is one small
+    solve on prefix sums.
+    """
+
+    def __init__(self, frame: SessionFrame, outlier_factor: float) -> None:
+        stints = frame.stints
+        s_driver = pd.to_numeric(stints["driver_number"], errors="coerce").to_numpy(float)
+        s_start = pd.to_numeric(stints["lap_start"], errors="coerce").to_numpy(float)
+        s_end = pd.to_numeric(stints["lap_end"], errors="coerce").fillna(np.inf).to_numpy(float)
+        s_age = pd.to_numeric(stints["tyre_age_at_start"], errors="coerce").fillna(0).to_numpy(float)
+        s_compound = stints["compound"].fillna("").astype(str).str.upper().to_numpy()
+        usable = ~np.isnan(s_driver) & ~np.isnan(s_start) & (s_compound != "")
+        order = np.lexsort((s_start[usable], s_driver[usable]))
+        s_driver, s_start, s_end, s_age, s_compound = (
+            a[usable][order] for a in (s_driver, s_start, s_end, s_age, s_compound)
+        )
+
+        ok = ~np.isnan(frame.lap_duration) & ~frame.lap_pit_out & ~np.isnan(frame.lap_number)
+        ok &= frame.lap_duration <= outlier_factor * np.nanmean(frame.lap_duration)
+        driver, lap, duration = frame.lap_driver[ok], frame.lap_number[ok], frame.lap_duration[ok]
+
+        # Lap numbers are well below 10_000, so (driver, lap) packs into one sortable key
+        stint = np.searchsorted(s_driver * 10_000 + s_start, driver * 10_000 + lap, side="right") - 1
+        found = stint >= 0
+        if s_driver.size:
+            stint = np.maximum(stint, 0)
+            # In-laps: the last lap of a stint that another stint follows
+            followed = np.append(s_driver[1:] == s_driver[:-1], False)
+            found &= (s_driver[stint] == driver) & (lap <= s_end[stint])
+            found &= ~((lap == s_end[stint]) & followed[stint])
+        driver, lap, duration, stint = driver[found], lap[found], duration[found], stint[found]
+
+        drivers, driver_col = np.unique(driver, return_inverse=True)
+        compounds, compound_col = np.unique(s_compound[stint].astype(str), return_inverse=True)
+        self.drivers = {int(d): i for i, d in enumerate(drivers)}
+        self.compounds = {str(c): i for i, c in enumerate(compounds)}
+        n_drivers, n_compounds = len(self.drivers), len(self.compounds)
+        # Columns: driver paces, compound offsets, compound slopes, fuel
+        self._offset = n_drivers
+        self._slope = n_drivers + n_compounds
+        self._fuel = n_drivers + 2 * n_compounds
+        width = self._fuel + 1
+
+        age = s_age[stint] + (lap - s_start[stint])
+        rows = np.arange(lap.size)
+        x = np.zeros((lap.size, width))
+        x[rows, driver_col] = 1.0
+        x[rows, self._offset + compound_col] = 1.0
+        x[rows, self._slope + compound_col] = age
+        x[:, self._fuel] = lap
+
+        self._prior = np.zeros(width)
+        self._prior[self._offset:self._slope] = _OFFSET_PRIOR
+        self._prior[self._slope:self._fuel] = _SLOPE_PRIOR
+        self._prior[self._fuel] = _FUEL_PRIOR_WEIGHT
+        self._prior_target = np.zeros(width)
+        self._prior_target[self._fuel] = _FUEL_PRIOR * _FUEL_PRIOR_WEIGHT
+
+        if lap.size:
+            # Fit everything once and leave out laps that don't fit, then
+            # refit from those that remain
+            coef = self._solve(x.T @ x, x.T @ duration, np.ones(width, bool))
+            residual = duration - x @ coef
+            mad = np.median(np.abs(residual - np.median(residual)))
+            if mad > 0:
+                keep = np.abs(residual) <= _OUTLIER_MADS * 1.4826 * mad
+                x, duration, lap = x[keep], duration[keep], lap[keep]
+                driver_col, compound_col = driver_col[keep], compound_col[keep]
+
+        # Normal equations and lap counts per lap number, summed up to each one
+        order = np.argsort(lap, kind="stable")
+        x, duration, lap = x[order], duration[order], lap[order]
+        driver_col, compound_col = driver_col[order], compound_col[order]
+        self.laps, starts = np.unique(lap, return_index=True)
+        if lap.size:
+            bounds = zip(starts, np.append(starts[1:], lap.size))
+            self._xtx = np.cumsum([x[a:b].T @ x[a:b] for a, b in bounds], axis=0)
+            self._xty = np.cumsum(np.add.reduceat(x * duration[:, None], starts, axis=0), axis=0)
+            group = np.repeat(np.arange(starts.size), np.diff(np.append(starts, lap.size)))
+            self._driver_laps = np.cumsum(_counts(group, driver_col, starts.size, n_drivers), axis=0)
+            self._compound_laps = np.cumsum(_counts(group, compound_col, starts.size, n_compounds), axis=0)
+        self._fits: dict[int | None, tuple[np.ndarray, int] | None] = {}
+        self._batch: tuple[bytes, tuple[np.ndarray, np.ndarray]] | None = None
+
+    def _solve(self, xtx: np.ndarray, xty: np.ndarray, seen: np.ndarray) -> np.ndarray:
+        # Columns with no laps yet are pinned to 0 so the system stays solvable
+        ridge = self._prior + np.where(seen, 0.0, 1.0)
+        return np.linalg.solve(xtx + np.diag(ridge), xty + self._prior_target)
+
+    def _fit(self, up_to_lap: int | None) -> tuple[np.ndarray, int] | None:
+        """Coefficients from laps up to up_to_lap (all laps when None), and
+        how many lap numbers they cover."""
+        if up_to_lap in self._fits:
+            return self._fits[up_to_lap]
+        k = self.laps.size if up_to_lap is None else int(np.searchsorted(self.laps, up_to_lap, side="right"))
+        fit = None
+        if k:
+            seen = np.concatenate((
+                self._driver_laps[k - 1] > 0,
+                np.tile(self._compound_laps[k - 1] > 0, 2),
+                [True],
+            ))
+            fit = self._solve(self._xtx[k - 1], self._xty[k - 1], seen), k
+        self._fits[up_to_lap] = fit
+        return fit
+
+    def _fits_at(self, up_to_laps: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        """_fit for many laps in one batched solve: coefficient rows (NaN
+        where there are no laps yet) and the lap numbers each covers."""
+        k = np.searchsorted(self.laps, up_to_laps, side="right")
+        # Callers ask for the same laps for each driver and compound in turn
+        key = k.tobytes()
+        if self._batch is not None and self._batch[0] == key:
+            return self._batch[1]
+        width = self._fuel + 1
+        coefs = np.full((k.size, width), np.nan)
+        i = k[k > 0] - 1
+        if i.size:
+            seen = np.concatenate((
+                self._driver_laps[i] > 0,
+                np.tile(self._compound_laps[i] > 0, 2),
+                np.ones((i.size, 1), bool),
+            ), axis=1)
+            ridge = self._prior + np.where(seen, 0.0, 1.0)
+            a = self._xtx[i] + ridge[:, :, None] * np.eye(width)
+            b = self._xty[i] + self._prior_target
+            coefs[k > 0] = np.linalg.solve(a, b[:, :, None])[:, :, 0]
+        self._batch = (key, (coefs, k))
+        return coefs, k
+
+    def _compound_columns(self, compounds: list[str | None]) -> np.ndarray:
+        return np.array([self.compounds.get((c or "").upper(), -1) for c in compounds], dtype=int)
+
+    def lap_times(
+        self, up_to_lap: int | None, driver_number: int, compound: str | None,
+        ages: np.ndarray, laps: np.ndarray,
+    ) -> np.ndarray | None:
+        """Predicted lap times for a driver on a compound at the given tyre
+        ages and lap numbers, fitted on laps up to up_to_lap.
+
+        None when the driver or the compound has no fitted laps by then.
+        """
+        fit = self._fit(up_to_lap)
+        d = self.drivers.get(driver_number)
+        c = self.compounds.get((compound or "").upper())
+        if fit is None or d is None or c is None:
+            return None
+        coef, k = fit
+        if self._driver_laps[k - 1, d] == 0 or self._compound_laps[k - 1, c] == 0:
+            return None
+        return (
+            coef[d] + coef[self._offset + c]
+            + coef[self._slope + c] * ages + coef[self._fuel] * laps
+        )
+
+    def lap_times_at(
+        self, up_to_laps: np.ndarray, driver_number: int, compounds: list[str | None],
+        ages: np.ndarray, laps: np.ndarray,
+    ) -> np.ndarray:
+        """lap_times for a driver as of each of up_to_laps at once.
+
+        Row i uses the fit on laps up to up_to_laps[i] and compounds[i],
+        at ages[i] and laps[i]; rows lap_times would give None for are NaN.
+        """
+        out = np.full(np.shape(ages), np.nan)
+        d = self.drivers.get(driver_number)
+        if d is None or not self.laps.size:
+            return out
+        coefs, k = self._fits_at(up_to_laps)
+        c = self._compound_columns(compounds)
+        rows = np.flatnonzero((k > 0) & (c >= 0))
+        known = (self._driver_laps[k[rows] - 1, d] > 0) & (self._compound_laps[k[rows] - 1, c[rows]] > 0)
+        rows = rows[known]
+        coef, c = coefs[rows], c[rows]
+        picked = np.arange(rows.size)
+        out[rows] = (
+            (coef[:, d] + coef[picked, self._offset + c])[:, None]
+            + coef[picked, self._slope + c][:, None] * ages[rows]
+            + coef[:, self._fuel][:, None] * laps[rows]
+        )
+        return out
+
+    def degradation(self, up_to_lap: int | None, compound: str | None) -> float | None:
+        """Fitted time lost per lap of tyre age on a compound, in seconds."""
+        fit = self._fit(up_to_lap)
+        c = self.compounds.get((compound or "").upper())
+        if fit is None or c is None or self._compound_laps[fit[1] - 1, c] == 0:
+            return None
+        return float(fit[0][self._slope + c])
+
+    def degradation_at(self, up_to_laps: np.ndarray, compounds: list[str | None]) -> np.ndarray:
+        """degradation as of each of up_to_laps for compounds[i]; NaN for None."""
+        out = np.full(len(compounds), np.nan)
+        if not self.laps.size:
+            return out
+        coefs, k = self._fits_at(up_to_laps)
+        c = self._compound_columns(compounds)
+        rows = np.flatnonzero((k > 0) & (c >= 0))
+        rows = rows[self._compound_laps[k[rows] - 1, c[rows]] > 0]
+        out[rows] = coefs[rows, self._slope + c[rows]]
+        return out
+
+
+def _counts(group: np.ndarray, column: np.ndarray, groups: int, width: int) -> np.ndarray:
+    """Laps per (lap-number group, column)."""
+    out = np.zeros((groups, width))
+    np.add.at(out, (group, column), 1.0)
+    return out
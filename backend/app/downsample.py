@@ -0,0 +1,66 @@
+from __future__ import annotations
+
+import numpy as np
+import pandas as pd
+
+# Smallest max_points accepted: LTTB always keeps the first and last point
+MIN_POINTS = 3
+
+
+def lttb(x: np.ndarray, y: np.ndarray, n_out: int) -> np.ndarray:
+    """Indices of `n_out` points chosen by Largest-Triangle-Three-Buckets.
+
+    x must be sorted.  The first and last points are always kept; every
+    bucket in between contributes the point forming the largest triangle
+    with the previously kept point and the average of the next bucket,
+    which preserves peaks and troughs far better than striding.
+    """
+    n = x.size
+    if n_out >= n or n_out < MIN_POINTS:
+        return np.arange(n)
+    # n_out - 2 buckets over points 1 .. n-2
+    edges = np.linspace(1, n - 1, n_out - 1).astype(np.intp)
+    out = np.empty(n_out, dtype=np.intp)
+    out[0], out[-1] = 0, n - 1
+    a = 0
+    for i in range(n_out - 2):
+        lo, hi = edges[i], edges[i + 1]
+        if i + 2 < edges.size:
+            avg_x = x[hi:edges[i + 2]].mean()
+            avg_y = y[hi:edges[i + 2]].mean()
+        else:
+            avg_x, avg_y = x[-1], y[-1]
+        area = np.abs((x[a] - avg_x) * (y[lo:hi] - y[a]) - (x[a] - x[lo:hi]) * (avg_y - y[a]))
+        a = lo + int(np.argmax(area))
+        out[i + 1] = a
+    return out
+
+
+def downsample_rows(rows: list[dict], value_key: str, max_points: int) -> list[dict]:
+    """At most max_points rows, picked by LTTB over (date, value_key).
+
+    Rows are returned in time order.  Only rows with a timestamp and a
+    numeric value can be placed on the chart, so others are dropped
+    when the series has to be thinned; shorter series come back as-is.
+    """
+    if len(rows) <= max_points:
+        return rows
+    values = np.array(
+        [
+            v if isinstance(v, (int, float)) and not isinstance(v, bool) else np.nan
+            for v in (r.get(value_key) for r in rows)
+        ],
+        dtype=float,
+    )
+    ts = pd.to_datetime(
+        pd.Series([r.get("date") for r in rows], dtype=object),
+        utc=True, format="ISO8601", errors="coerce",
+    )
+    ns = pd.DatetimeIndex(ts).as_unit("ns").asi8
+    keep = np.flatnonzero(~np.isnan(values) & ~pd.isna(ts).to_numpy())
+    keep = keep[np.argsort(ns[keep], kind="stable")]
+    if keep.size == 0:
+        return []
+    x = (ns[keep] - ns[keep[0]]) / 1e9
+    picked = keep[lttb(x, values[keep], max_points)]
+    return [rows[i] for i in picked]
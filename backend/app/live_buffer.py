@@ -0,0 +1,127 @@
+from __future__ import annotations
+
+import os
+from typing import Any
+from urllib.parse import quote
+
+# Refetch a live payload in full after this many delta polls, so rows a
+# delta query could have missed (late corrections upstream) get repaired
+FULL_REFETCH_POLLS = int(os.environ.get("LIVE_FULL_REFETCH_POLLS", 60))
+# A driver who hasn't completed a lap while the leader did this many has
+# stopped (retired, long repair) and no longer holds the laps cursor back
+_STALLED_LAPS = 3
+
+# Session-wide payloads that can be topped up with a delta query:
+# path -> (cursor field, fields identifying a row)
+DELTA_PATHS: dict[str, tuple[str, tuple[str, ...]]] = {
+    "/intervals": ("date", ("driver_number", "date")),
+    "/position": ("date", ("driver_number", "date")),
+    "/pit": ("date", ("driver_number", "date")),
+    "/weather": ("date", ("date",)),
+    "/laps": ("lap_number", ("driver_number", "lap_number")),
+}
+
+
+class LiveBuffer:
+    """A live session-wide payload kept current by fetching only new rows.
+
+    Time-series payloads (intervals, position, pit, weather) only ever gain
+    rows, so the buffer asks for rows at or after the newest `date` it has
+    and appends the unseen ones to the same list.  Lap rows are rewritten
+    as laps complete, so for laps the buffer re-asks for every lap from the
+    slowest running car's latest one on (each car's own latest lap may
+    still be in progress) and swaps in a new list when any row changed.
+    Cars that have stopped completing laps are left out of that cursor;
+    after FULL_REFETCH_POLLS deltas the buffer asks for a full refetch,
+    which also picks up any lap of theirs the deltas skipped.
+
+    Callers (the SessionFrame, the query planner's indexes) can tell an
+    appended list from a replaced one by identity plus length.
+    """
+
+    def __init__(self, path: str, rows: list[dict], wire_size: int) -> None:
+        self.path = path
+        self.cursor_field, self.key_fields = DELTA_PATHS[path]
+        self.rows = rows
+        self.wire_size = wire_size
+        self._positions = {self._key(r): i for i, r in enumerate(rows)}
+        # Delta queries merged since the full fetch
+        self.polls = 0
+        # Newest date held (date cursors)
+        self._newest: Any | None = None
+        # Each driver's latest lap, and the leader's latest lap when it was
+        # set (lap cursor)
+        self._latest: dict[Any, int] = {}
+        self._advanced_at: dict[Any, int] = {}
+        self._leader = 0
+        self._track(rows)
+
+    def _key(self, row: dict) -> tuple:
+        return tuple(row.get(f) for f in self.key_fields)
+
+    def _track(self, rows: list[dict]) -> None:
+        """Move the cursor state past `rows`."""
+        if self.cursor_field == "date":
+            newest = max((r["date"] for r in rows if r.get("date")), default=None)
+            if newest is not None and (self._newest is None or newest > self._newest):
+                self._newest = newest
+            return
+        advanced: set[Any] = set()
+        for r in rows:
+            lap = r.get("lap_number")
+            if isinstance(lap, int):
+                dn = r.get("driver_number")
+                if lap > self._latest.get(dn, 0):
+                    self._latest[dn] = lap
+                    advanced.add(dn)
+        self._leader = max(self._latest.values(), default=0)
+        for dn in advanced:
+            self._advanced_at[dn] = self._leader
+
+    def _cursor(self) -> Any | None:
+        if self.cursor_field == "date":
+            return self._newest
+        running = [
+            lap for dn, lap in self._latest.items()
+            if self._leader - self._advanced_at[dn] <= _STALLED_LAPS
+        ]
+        # The slowest running car sets the cursor, so a car laps down still
+        # gets its new laps
+        return min(running) if running else None
+
+    def delta_url(self, url: str) -> str | None:
+        """URL for rows newer than the buffer's; None if a full refetch is needed.
+
+        OpenF1 takes comparison filters literally in the query string
+        (`date>=...`), so the operator is appended unencoded.
+        """
+        if self.polls >= FULL_REFETCH_POLLS:
+            return None
+        cursor = self._cursor()
+        if cursor is None:
+            return None
+        sep = "&" if "?" in url else "?"
+        return f"{url}{sep}{self.cursor_field}>={quote(str(cursor), safe=':.-T')}"
+
+    def merge(self, new_rows: list[dict], wire_size: int) -> int:
+        """Fold a delta response into the buffer; returns the rows added or changed."""
+        self.polls += 1
+        self.wire_size += wire_size
+        appended: list[dict] = []
+        replaced: dict[int, dict] = {}
+        for r in new_rows:
+            key = self._key(r)
+            i = self._positions.get(key)
+            if i is None:
+                self._positions[key] = len(self.rows) + len(appended)
+                appended.append(r)
+            elif self.rows[i] != r:
+                replaced[i] = r
+        if replaced:
+            rows = list(self.rows)
+            for i, r in replaced.items():
+                rows[i] = r
+            self.rows = rows
+        self.rows.extend(appended)
+        self._track(new_rows)
+        return len(appended) + len(replaced)
@@ -0,0 +1,207 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+import os
+import time
+from typing import Any
+
+import httpx
+
+from .compute import ComputeBusyError
+from .openf1_client import OfflineMissError, OpenF1Client, UpstreamUnavailableError
+from .rate_limiter import Priority, priority
+from .session_frame import SessionFrame, get_session_frame
+from . import strategy_engine
+
+# Seconds between checks for new data; live payloads refresh every 10 s
+POLL_INTERVAL = float(os.environ.get("LIVE_POLL_SECONDS", 5))
+# Push Monte Carlo probabilities (see monte_carlo) instead of the linear ones
+SIMULATE = os.environ.get("LIVE_SIMULATE", "").lower() in ("1", "true", "yes")
+
+# (session_key, leader, chaser)
+PairKey = tuple[int, int, int]
+
+logger = logging.getLogger(__name__)
+
+# Upstream trouble while refreshing a live session: keep the last values
+# and retry on the next round
+_UPSTREAM_ERRORS = (httpx.HTTPError, UpstreamUnavailableError, OfflineMissError)
+# Incomplete or malformed session data for one pair (e.g. a driver's rows
+# missing fields); the other pairs are still evaluated
+_DATA_ERRORS = (KeyError, IndexError, ValueError, ZeroDivisionError)
+# Seconds between repeats of the same warning; the poll loop would
+# otherwise log it every round
+_WARN_EVERY = 60.0
+_warned: dict[Any, float] = {}
+
+
+def _warn(key: Any, message: str, *args: Any, exc_info: bool = False) -> None:
+    """logger.warning, at most once per _WARN_EVERY seconds for each key."""
+    now = time.monotonic()
+    if now - _warned.get(key, -_WARN_EVERY) < _WARN_EVERY:
+        return
+    for old in [k for k, t in _warned.items() if now - t >= _WARN_EVERY]:
+        del _warned[old]
+    _warned[key] = now
+    logger.warning(message, *args, exc_info=exc_info)
+
+
+class Subscriber:
+    """One client connection's subscriptions and unsent changes.
+
+    Changes for a pair are merged into `pending` until the connection
+    sends them, so a slow client gets the latest values in one message
+    rather than a growing backlog.
+    """
+
+    def __init__(self) -> None:
+        self.pairs: set[PairKey] = set()
+        self.pending: dict[PairKey, dict[str, Any]] = {}
+        self._ready = asyncio.Event()
+
+    def push(self, key: PairKey, changes: dict[str, Any]) -> None:
+        self.pending.setdefault(key, {}).update(changes)
+        self._ready.set()
+
+    async def next_batch(self) -> dict[PairKey, dict[str, Any]]:
+        """Wait for changes and take everything pending."""
+        await self._ready.wait()
+        self._ready.clear()
+        batch, self.pending = self.pending, {}
+        return batch
+
+
+class UndercutHub:
+    """Computes live undercut evaluations once per pair and fans them out.
+
+    One poller per session re-reads the SessionFrame every POLL_INTERVAL
+    at background priority.  When the frame has changed, each subscribed
+    (leader, chaser) pair is evaluated once and only the fields that
+    differ from the last result are pushed to its subscribers, so the
+    work scales with unique pairs rather than connected clients.
+    """
+
+    def __init__(
+        self, client: OpenF1Client, interval: float = POLL_INTERVAL, simulate: bool = SIMULATE,
+    ) -> None:
+        self.client = client
+        self.interval = interval
+        self.simulate = simulate
+        self._subscribers: dict[PairKey, set[Subscriber]] = {}
+        self._latest: dict[PairKey, dict[str, Any]] = {}
+        self._pollers: dict[int, asyncio.Task] = {}
+        self._wake: dict[int, asyncio.Event] = {}
+        self.evaluations = 0
+
+    def subscribe(self, sub: Subscriber, key: PairKey) -> None:
+        sub.pairs.add(key)
+        self._subscribers.setdefault(key, set()).add(sub)
+        if key in self._latest:
+            sub.push(key, self._latest[key])
+        session_key = key[0]
+        self._wake.setdefault(session_key, asyncio.Event()).set()
+        poller = self._pollers.get(session_key)
+        if poller is None or poller.done():
+            self._pollers[session_key] = asyncio.ensure_future(self._poll(session_key))
+
+    def unsubscribe(self, sub: Subscriber, key: PairKey) -> None:
+        sub.pairs.discard(key)
+        subs = self._subscribers.get(key)
+        if subs is None:
+            return
+        subs.discard(sub)
+        if not subs:
+            del self._subscribers[key]
+            self._latest.pop(key, None)
+
+    def disconnect(self, sub: Subscriber) -> None:
+        for key in list(sub.pairs):
+            self.unsubscribe(sub, key)
+
+    def _pairs(self, session_key: int) -> list[PairKey]:
+        return [key for key in self._subscribers if key[0] == session_key]
+
+    async def _poll(self, session_key: int) -> None:
+        wake = self._wake[session_key]
+        seen: tuple[SessionFrame, int] | None = None
+        while self._pairs(session_key):
+            wake.clear()
+            frame: SessionFrame | None = None
+            try:
+                with priority(Priority.BACKGROUND):
+                    frame = await get_session_frame(self.client, session_key)
+            except (*_UPSTREAM_ERRORS, ComputeBusyError) as exc:
+                _warn(("frame", session_key), "Live session %s not refreshed: %r", session_key, exc)
+            except Exception:
+                logger.exception("Live session %s: building the session frame failed", session_key)
+            if frame is not None:
+                changed = seen is None or seen[0] is not frame or seen[1] != frame.version
+                try:
+                    await self._publish(frame, session_key, only_new=not changed)
+                    seen = (frame, frame.version)
+                except ComputeBusyError:
+                    pass  # overloaded: evaluate on the next round
+                except Exception:
+                    logger.exception("Live session %s: evaluating subscribed pairs failed", session_key)
+            try:
+                await asyncio.wait_for(wake.wait(), self.interval)
+            except asyncio.TimeoutError:
+                pass
+        self._pollers.pop(session_key, None)
+        self._wake.pop(session_key, None)
+
+    async def _publish(self, frame: SessionFrame, session_key: int, only_new: bool) -> None:
+        """Evaluate each subscribed pair once and push what changed.
+
+        With only_new, the data hasn't moved since the last round and just
+        pairs subscribed since then are evaluated.
+        """
+        pairs = [
+            key for key in self._pairs(session_key)
+            if not (only_new and key in self._latest)
+        ]
+        if not pairs:
+            return
+        results = await frame.compute(_snapshots, pairs, self.simulate)
+        for key, result in results.items():
+            if key not in self._subscribers:
+                continue  # unsubscribed while evaluating
+            previous = self._latest.get(key)
+            self.evaluations += 1
+            if previous is None:
+                changes = result
+            else:
+                changes = {k: v for k, v in result.items() if previous.get(k) != v}
+            self._latest[key] = result
+            if changes:
+                for sub in self._subscribers.get(key, ()):
+                    sub.push(key, changes)
+
+    async def close(self) -> None:
+        pollers = list(self._pollers.values())
+        for poller in pollers:
+            poller.cancel()
+        await asyncio.gather(*pollers, return_exceptions=True)
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            "pairs": len(self._subscribers),
+            "subscriptions": sum(len(s) for s in self._subscribers.values()),
+            "sessions_polled": len(self._pollers),
+            "evaluations": self.evaluations,
+        }
+
+
+def _snapshots(
+    frame: SessionFrame, pairs: list[PairKey], simulate: bool = False,
+) -> dict[PairKey, dict[str, Any]]:
+    """undercut_snapshot for each pair, skipping pairs whose data can't be evaluated."""
+    out: dict[PairKey, dict[str, Any]] = {}
+    for key in pairs:
+        _, leader, chaser = key
+        try:
+            out[key] = strategy_engine.undercut_snapshot(frame, leader, chaser, simulate)
+        except _DATA_ERRORS:
+            _warn(key, "Live pair %s skipped: its data can't be evaluated", key, exc_info=True)
+    return out
@@ -1,42 +1,180 @@
 from __future__ import annotations
 
+import asyncio
+import math
+import time
 from contextlib import asynccontextmanager
-from typing import Any
+from typing import Any, Awaitable, Callable
 
-from fastapi import FastAPI, HTTPException, Query
+from fastapi import FastAPI, HTTPException, Query, Request, Response, WebSocket, WebSocketDisconnect
 from fastapi.middleware.cors import CORSMiddleware
-
-from .models import DriverInfo, MeetingInfo, SessionInfo, UndercutResult
-from .openf1_client import OpenF1Client
-from . import session_manager, strategy_engine
+from fastapi.responses import JSONResponse
+
+from .compute import ComputeBusyError, LoopLagMonitor
+from .models import (
+    DriverInfo,
+    MeetingInfo,
+    SessionInfo,
+    UndercutMatrix,
+    UndercutResult,
+    UndercutScalars,
+    UndercutSeries,
+    UndercutTimeline,
+)
+from .downsample import MIN_POINTS
+from .live_stream import Subscriber, UndercutHub
+from .openf1_client import OpenF1Client, UpstreamUnavailableError, track_staleness
+from .rate_limiter import Priority, priority
+from .responses import (
+    cached_response,
+    media_type,
+    model_columns_response,
+    render,
+    result_cache_stats,
+    rows_response,
+    wants_columns,
+)
+from .serialization import dumps, merge_objects, model_json, model_response
+from .session_frame import SessionFrame, get_session_frame
+from . import compute, metrics, openf1_client, session_manager, strategy_engine, timing
 
 client: OpenF1Client
+hub: UndercutHub
+loop_lag = LoopLagMonitor()
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    global client
+    global client, hub
     client = OpenF1Client()
+    hub = UndercutHub(client)
+    loop_lag.start()
     yield
+    await loop_lag.close()
+    await hub.close()
     await client.close()
 
 
 app = FastAPI(title="F1 Undercut Strategy Simulator", lifespan=lifespan)
 
+# Routes a user is actively waiting on while scrubbing; their upstream
+# requests jump ahead of background work in the rate limiter
+_INTERACTIVE_PATHS = (
+    "/api/strategy/evaluate",
+    "/api/strategy/series",
+    "/api/strategy/timeline",
+    "/api/strategy/matrix",
+)
+
+
+@app.middleware("http")
+async def upstream_priority(request: Request, call_next):
+    if request.url.path.startswith(_INTERACTIVE_PATHS):
+        with priority(Priority.INTERACTIVE):
+            return await call_next(request)
+    return await call_next(request)
+
+
+_request_latency = metrics.histogram(
+    "http_request_duration_seconds",
+    "Time to produce a response, by route template, method and status",
+    ("route", "method", "status"),
+)
+_evaluations_in_flight = metrics.gauge(
+    "undercut_evaluations_in_flight", "Strategy requests (evaluate, series, timeline, matrix) in progress"
+)
+metrics.callback(
+    "event_loop_lag_seconds", "How late the event loop ran its timers over the last minute",
+    lambda: {
+        (stat.removesuffix("_ms"),): value / 1000
+        for stat, value in loop_lag.stats().items() if stat.endswith("_ms")
+    },
+    labels=("stat",),
+)
+metrics.callback(
+    "live_subscriptions", "Live stream subscriptions (client, pair)", lambda: hub.stats()["subscriptions"]
+)
+
+
+@app.middleware("http")
+async def stale_data_header(request: Request, call_next):
+    """Flag responses built from cached data past its TTL.
+
+    X-Data-Stale carries how many seconds out of date the oldest payload
+    was; a background refresh is already running for it.
+    """
+    with track_staleness() as staleness:
+        response = await call_next(request)
+    if staleness.seconds > 0:
+        response.headers["X-Data-Stale"] = str(math.ceil(staleness.seconds))
+    return response
+
+
+@app.middleware("http")
+async def server_timing(request: Request, call_next):
+    """Per-stage durations as a Server-Timing header, when switched on.
+
+    See timing.track for what turns it on.  A profiled request's stats
+    are saved under PROFILE_DIR and named in X-Profile.
+    """
+    with timing.track(request) as timings:
+        response = await call_next(request)
+    if timings is not None:
+        response.headers["Server-Timing"] = timings.server_timing()
+        profile = timing.save_profile(timings, request.url.path)
+        if profile is not None:
+            response.headers["X-Profile"] = profile
+    return response
+
+
+@app.middleware("http")
+async def observe_requests(request: Request, call_next):
+    started = time.perf_counter()
+    evaluating = request.url.path.startswith(_INTERACTIVE_PATHS)
+    if evaluating:
+        _evaluations_in_flight.inc()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        return response
+    finally:
+        if evaluating:
+            _evaluations_in_flight.dec()
+        # The route template, so /api/drivers?session_key=... is one series
+        route = getattr(request.scope.get("route"), "path", "unmatched")
+        _request_latency.observe(
+            time.perf_counter() - started, route=route, method=request.method, status=status
+        )
+
+
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Data-Stale", "Retry-After", "Server-Timing", "X-Profile"],
 )
 
 
+@app.exception_handler(UpstreamUnavailableError)
+@app.exception_handler(ComputeBusyError)
+async def upstream_unavailable(request: Request, exc: UpstreamUnavailableError | ComputeBusyError):
+    """Circuit breaker open with nothing cached, or the compute queue is
+    full: fail fast with a retry hint."""
+    return JSONResponse(
+        status_code=503,
+        content={"detail": str(exc)},
+        headers={"Retry-After": str(math.ceil(exc.retry_after))},
+    )
+
+
 # ---- Meetings / Sessions / Drivers ----------------------------------------
 
 @app.get("/api/meetings", response_model=list[MeetingInfo])
 async def meetings(year: int = Query(...)):
     raw = await session_manager.list_meetings(client, year)
-    return [
+    return model_response([
         MeetingInfo(
             meeting_key=m["meeting_key"],
             meeting_name=m.get("meeting_name", ""),
@@ -48,13 +186,13 @@ async def meetings(year: int = Query(...)):
             circuit_short_name=m.get("circuit_short_name"),
         )
         for m in raw
-    ]
+    ])
 
 
 @app.get("/api/sessions", response_model=list[SessionInfo])
 async def sessions(meeting_key: int = Query(...)):
     raw = await session_manager.list_sessions(client, meeting_key)
-    return [
+    return model_response([
         SessionInfo(
             session_key=s["session_key"],
             session_name=s.get("session_name", ""),
@@ -66,13 +204,13 @@ async def sessions(meeting_key: int = Query(...)):
             circuit_short_name=s.get("circuit_short_name"),
         )
         for s in raw
-    ]
+    ])
 
 
 @app.get("/api/drivers", response_model=list[DriverInfo])
 async def drivers(session_key: int = Query(...)):
     raw = await session_manager.list_drivers(client, session_key)
-    return [
+    return model_response([
         DriverInfo(
             driver_number=d["driver_number"],
             full_name=d.get("full_name", ""),
@@ -82,53 +220,214 @@ async def drivers(session_key: int = Query(...)):
             headshot_url=d.get("headshot_url"),
         )
         for d in raw
-    ]
+    ])
 
 
 # ---- Strategy endpoints ---------------------------------------------------
 
-@app.get("/api/strategy/evaluate", response_model=UndercutResult)
+@app.get("/api/strategy/evaluate", response_model=UndercutResult | UndercutScalars)
 async def evaluate(
+    request: Request,
     session_key: int = Query(...),
     leader: int = Query(...),
     chaser: int = Query(...),
-    lap: int | None = Query(None, description="Evaluate at this specific lap (historical scrub)"),
+    lap: int | None = Query(None, ge=1, description="Evaluate at this specific lap (historical scrub)"),
+    slim: bool = Query(False, description="Only the lap-dependent numbers; series come from /api/strategy/series"),
+    max_points: int | None = Query(None, ge=MIN_POINTS, description="Thin gap history and weather to this many points"),
+    simulate: bool = Query(False, description="Monte Carlo probability with a confidence interval"),
 ):
-    try:
-        return await strategy_engine.evaluate_undercut(
-            client, session_key, leader, chaser, at_lap=lap
+    async def build() -> Response:
+        if slim:
+            scalars = await strategy_engine.evaluate_undercut_scalars(
+                client, session_key, leader, chaser, at_lap=lap, simulate=simulate
+            )
+            return model_response(scalars)
+        scalars, series = await strategy_engine.evaluate_undercut_parts(
+            client, session_key, leader, chaser, at_lap=lap, max_points=max_points, simulate=simulate
         )
+        # The series half is the bulk of the body and only changes with the
+        # data, so its rendered JSON is reused across laps
+        with timing.stage("render"):
+            columns = wants_columns(request)
+            body = merge_objects(model_json(scalars), render(series, columns)[0])
+        return Response(content=body, media_type=media_type(columns))
+
+    return await _cached(request, session_key, build)
+
+
+@app.get("/api/strategy/series", response_model=UndercutSeries)
+async def series(
+    request: Request,
+    session_key: int = Query(...),
+    leader: int = Query(...),
+    chaser: int = Query(...),
+    max_points: int | None = Query(None, ge=MIN_POINTS, description="Thin gap history and weather to this many points"),
+):
+    """Lap times, stints, gap history and weather for a pair (lap-independent)."""
+
+    async def build() -> Response:
+        result = await strategy_engine.get_undercut_series(
+            client, session_key, leader, chaser, max_points=max_points
+        )
+        columns = wants_columns(request)
+        return Response(content=render(result, columns)[0], media_type=media_type(columns))
+
+    return await _cached(request, session_key, build)
+
+
+@app.get("/api/strategy/timeline", response_model=UndercutTimeline)
+async def timeline(
+    request: Request,
+    session_key: int = Query(...),
+    leader: int = Query(...),
+    chaser: int = Query(...),
+):
+    """Undercut gap, pace, margin and probability for every lap in one call."""
+
+    async def build() -> Response:
+        result = await strategy_engine.get_undercut_timeline(client, session_key, leader, chaser)
+        return model_columns_response(request, result)
+
+    return await _cached(request, session_key, build)
+
+
+@app.get("/api/strategy/matrix", response_model=UndercutMatrix)
+async def matrix(
+    request: Request,
+    session_key: int = Query(...),
+    lap: int | None = Query(None, ge=1, description="Evaluate at this specific lap (historical scrub)"),
+    within: int | None = Query(None, ge=1, description="Only pairs at most this many places apart"),
+):
+    """Undercut margin and probability for every leader/chaser pair at a lap."""
+
+    async def build() -> Response:
+        result = await strategy_engine.get_undercut_matrix(client, session_key, at_lap=lap, within=within)
+        return model_response(result)
+
+    return await _cached(request, session_key, build)
+
+
+async def _cached(
+    request: Request, session_key: int, build: Callable[[], Awaitable[Response]],
+) -> Response:
+    """Serve from the result cache for the session's current data (see responses).
+
+    With ?debug=true the response is built afresh and carries a "timing"
+    object with the stage durations (and "profile" if it was profiled).
+    """
+    try:
+        if timing.debug_requested(request):
+            return _with_timing(await build())
+        version = await strategy_engine.data_version(client, session_key)
+        return await cached_response(request, session_key, version, build)
+    except (UpstreamUnavailableError, ComputeBusyError):
+        raise
     except Exception as exc:
         raise HTTPException(status_code=502, detail=str(exc))
 
 
+def _with_timing(response: Response) -> Response:
+    timings = timing.current()
+    if timings is None or response.status_code != 200 or not response.body.startswith(b"{"):
+        return response
+    debug: dict[str, Any] = {"timing": timings.as_ms()}
+    summary = timing.profile_summary(timings)
+    if summary is not None:
+        debug["profile"] = summary
+    response.body = merge_objects(bytes(response.body), dumps(debug))
+    response.headers["Content-Length"] = str(len(response.body))
+    return response
+
+
+@app.websocket("/api/strategy/stream")
+async def stream(websocket: WebSocket):
+    """Push undercut updates for subscribed driver pairs as live data arrives.
+
+    Clients send {"action": "subscribe" | "unsubscribe", "session_key",
+    "leader", "chaser"}.  The server sends {"session_key", "leader",
+    "chaser", "changes"} where changes holds every field on the first
+    message for a pair and only the fields that changed afterwards.
+    """
+    await websocket.accept()
+    sub = Subscriber()
+    sender = asyncio.ensure_future(_send_updates(websocket, sub))
+    try:
+        while True:
+            msg = await websocket.receive_json()
+            try:
+                key = (int(msg["session_key"]), int(msg["leader"]), int(msg["chaser"]))
+            except (KeyError, TypeError, ValueError):
+                await websocket.send_json({"error": "expected session_key, leader and chaser"})
+                continue
+            if msg.get("action") == "unsubscribe":
+                hub.unsubscribe(sub, key)
+            else:
+                hub.subscribe(sub, key)
+    except WebSocketDisconnect:
+        pass
+    finally:
+        hub.disconnect(sub)
+        sender.cancel()
+
+
+async def _send_updates(websocket: WebSocket, sub: Subscriber) -> None:
+    while True:
+        batch = await sub.next_batch()
+        for (session_key, leader, chaser), changes in batch.items():
+            await websocket.send_json(
+                {"session_key": session_key, "leader": leader, "chaser": chaser, "changes": changes}
+            )
+
+
 @app.get("/api/strategy/gaps")
-async def gaps(session_key: int = Query(...), driver_number: int = Query(...)):
-    raw = await strategy_engine.get_gap_history(client, session_key, driver_number)
-    return raw
+async def gaps(
+    request: Request,
+    session_key: int = Query(...),
+    driver_number: int = Query(...),
+    max_points: int | None = Query(None, ge=MIN_POINTS, description="Thin to this many points (LTTB)"),
+):
+    async def build() -> Response:
+        raw = await strategy_engine.get_gap_history(client, session_key, driver_number, max_points)
+        return rows_response(request, raw)
+
+    if max_points is None:
+        return await build()
+    # Thinned rows aren't memoized on the frame; keep the rendered response
+    return await _cached(request, session_key, build)
 
 
 @app.get("/api/strategy/laps")
-async def laps(session_key: int = Query(...), driver_number: int = Query(...)):
+async def laps(request: Request, session_key: int = Query(...), driver_number: int = Query(...)):
     df = await strategy_engine.get_clean_laps(client, session_key, driver_number)
     if df.empty:
         return []
-    return df.to_dict(orient="records")
+    return rows_response(request, df.to_dict(orient="records"))
 
 
 @app.get("/api/strategy/stints")
 async def stints(
-    session_key: int = Query(...), driver_number: int = Query(None)
+    request: Request, session_key: int = Query(...), driver_number: int = Query(None)
 ):
     params: dict[str, Any] = {"session_key": session_key}
     if driver_number is not None:
         params["driver_number"] = driver_number
-    return await client.get_stints(**params)
+    return rows_response(request, await client.get_stints(**params))
 
 
 @app.get("/api/weather")
-async def weather(session_key: int = Query(...)):
-    return await client.get_weather(session_key=session_key)
+async def weather(
+    request: Request,
+    session_key: int = Query(...),
+    max_points: int | None = Query(None, ge=MIN_POINTS, description="Thin to this many points (LTTB)"),
+):
+    if max_points is None:
+        return rows_response(request, await client.get_weather(session_key=session_key))
+
+    async def build() -> Response:
+        rows = await strategy_engine.get_weather_history(client, session_key, max_points)
+        return rows_response(request, rows)
+
+    return await _cached(request, session_key, build)
 
 
 @app.get("/api/positions")
@@ -141,62 +440,50 @@ async def positions(
     When lap is provided, finds the closest position snapshot to that lap's
     timestamp.  Otherwise returns the latest position for each driver.
     """
-    import asyncio
-
-    pos_raw, laps_raw, drivers_raw = await asyncio.gather(
-        client.get_position(session_key=session_key),
-        client.get_laps(session_key=session_key),
-        client.get_drivers(session_key=session_key),
-    )
-
-    if not pos_raw:
+    frame = await get_session_frame(client, session_key)
+    if not frame.raw["position"]:
         return []
+    return await frame.compute(_positions, lap)
 
-    # Build a driver_number -> latest-position map
-    if lap is not None and laps_raw:
-        from datetime import datetime
 
-        # Find approximate timestamp for the target lap
-        lap_entries = [l for l in laps_raw if l.get("lap_number") == lap and l.get("date_start")]
-        if lap_entries:
-            target_ts = lap_entries[0]["date_start"]
-            try:
-                target_dt = datetime.fromisoformat(target_ts.replace("Z", "+00:00"))
-            except Exception:
-                target_dt = None
-
-            if target_dt:
-                # For each driver, find position entry closest to target_dt
-                from collections import defaultdict
-                by_driver: dict[int, list] = defaultdict(list)
-                for p in pos_raw:
-                    if p.get("driver_number") and p.get("date"):
-                        by_driver[p["driver_number"]].append(p)
-
-                result = {}
-                for dn, entries in by_driver.items():
-                    best = min(
-                        entries,
-                        key=lambda e: abs(
-                            (datetime.fromisoformat(e["date"].replace("Z", "+00:00")) - target_dt).total_seconds()
-                        ),
-                    )
-                    result[dn] = best.get("position")
-
-                return [
-                    {"driver_number": dn, "position": pos}
-                    for dn, pos in sorted(result.items(), key=lambda x: x[1] or 99)
-                ]
+def _positions(frame: SessionFrame, lap: int | None) -> list[dict[str, int | None]]:
+    at_lap = frame.positions_at_lap(lap) if frame.raw["laps"] else None
+    if at_lap is not None:
+        return [
+            {"driver_number": dn, "position": pos}
+            for dn, pos in sorted(at_lap.items(), key=lambda x: x[1] or 99)
+        ]
 
     # Fallback: latest position per driver
-    latest: dict[int, int] = {}
-    for p in pos_raw:
-        dn = p.get("driver_number")
-        pos = p.get("position")
-        if dn is not None and pos is not None:
-            latest[dn] = pos
-
+    latest = frame.latest_positions()
     return [
         {"driver_number": dn, "position": pos}
         for dn, pos in sorted(latest.items(), key=lambda x: x[1])
     ]
+
+
+# ---- Diagnostics ----------------------------------------------------------
+
+@app.get("/metrics", include_in_schema=False)
+async def prometheus_metrics():
+    """Latency histograms and cache/upstream/pool counters for Prometheus."""
+    return Response(content=metrics.render(), media_type=metrics.CONTENT_TYPE)
+
+
+@app.get("/api/stats")
+async def stats():
+    """Fetch-layer, cache, rate-limiter, breaker, compute and live-stream counters for capacity tuning.
+
+    `loop_lag` is how late the event loop has been running timers: time
+    it spent blocked instead of serving requests.
+    """
+    return {
+        "fetch": openf1_client.fetch_stats(),
+        "cache": openf1_client.cache_stats(),
+        "results": result_cache_stats(),
+        "limiter": openf1_client.limiter_stats(),
+        "breaker": openf1_client.breaker_stats(),
+        "compute": compute.stats(),
+        "loop_lag": loop_lag.stats(),
+        "stream": hub.stats(),
+    }
@@ -68,6 +68,82 @@ class WeatherEntry(BaseModel):
     rainfall: float | None = None
 
 
+class UndercutSimulation(BaseModel):
+    """Monte Carlo estimate of an undercut (probabilities in %, margins in s)."""
+
+    samples: int
+    probability: float
+    probability_low: float
+    probability_high: float
+    margin_mean: float
+    margin_p05: float
+    margin_p50: float
+    margin_p95: float
+
+
+class UndercutScalars(BaseModel):
+    """The lap-dependent numbers of an undercut evaluation."""
+
+    gap: float | None = None
+    pit_loss: float | None = None
+    leader_pace: float | None = None
+    chaser_pace: float | None = None
+    projected_outlap_pace: float | None = None
+    pace_delta: float | None = None
+    undercut_margin: float | None = None
+    probability: float
+    window_open: bool
+    leader_compound: str | None = None
+    chaser_compound: str | None = None
+    leader_tyre_age: int | None = None
+    chaser_tyre_age: int | None = None
+    at_lap: int | None = None
+    projected_leader_laps: list[float] | None = None
+    projected_chaser_laps: list[float] | None = None
+    leader_degradation: float | None = None
+    chaser_degradation: float | None = None
+    simulation: UndercutSimulation | None = None
+
+
+class UndercutTimeline(BaseModel):
+    leader_number: int
+    chaser_number: int
+    total_laps: int = 0
+    laps: list[UndercutScalars] = []
+
+
+class UndercutMatrix(BaseModel):
+    """Pairwise undercut numbers at one lap.
+
+    Rows are leaders and columns chasers, both in position order, so
+    cell [i][j] is driver i defending against driver j.  Cells outside
+    the requested pairs are null.
+    """
+
+    at_lap: int | None = None
+    drivers: list[int] = []
+    positions: list[int] = []
+    compounds: list[str | None] = []
+    gap: list[list[float | None]] = []
+    margin: list[list[float | None]] = []
+    probability: list[list[float | None]] = []
+    window_open: list[list[bool | None]] = []
+
+
+class UndercutSeries(BaseModel):
+    """The parts of an evaluation that don't depend on the lap being viewed."""
+
+    leader_info: DriverInfo | None = None
+    chaser_info: DriverInfo | None = None
+    laps_leader: list[LapData] = []
+    laps_chaser: list[LapData] = []
+    stints_leader: list[StintData] = []
+    stints_chaser: list[StintData] = []
+    gap_history: list[GapEntry] = []
+    weather: list[WeatherEntry] = []
+    total_laps: int = 0
+
+
 class UndercutResult(BaseModel):
     gap: float | None = None
     pit_loss: float | None = None
@@ -92,3 +168,8 @@ class UndercutResult(BaseModel):
     weather: list[WeatherEntry] = []
     at_lap: int | None = None
     total_laps: int = 0
+    projected_leader_laps: list[float] | None = None
+    projected_chaser_laps: list[float] | None = None
+    leader_degradation: float | None = None
+    chaser_degradation: float | None = None
+    simulation: UndercutSimulation | None = None
@@ -1,91 +1,569 @@
 from __future__ import annotations
 
 import asyncio
+import os
 import time
-from typing import Any
+from collections import OrderedDict
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from typing import Any, Iterator
 
 import httpx
 
+from .circuit_breaker import CircuitBreaker
+from .live_buffer import DELTA_PATHS, LiveBuffer
+from .query_planner import IndexCache, plan_query
+from .rate_limiter import (
+    Priority, SharedPriority, TokenBucket, priority, request_priority, shared_priority,
+)
+from .session_store import SessionStore
+from . import metrics, serialization
+
 BASE_URL = "https://api.openf1.org/v1"
 
-# Cached responses: key = URL, value = (timestamp, data)
-_cache: dict[str, tuple[float, Any]] = {}
+# Memory budget for cached responses, in estimated bytes
+_CACHE_MAX_BYTES = int(os.environ.get("OPENF1_CACHE_MAX_BYTES", 1024 * 1024 * 1024))
+# Parsed JSON takes roughly this many times its wire size as Python objects
+_OBJECT_OVERHEAD = 3
 
-# Historical data lives a long time; live/latest data refreshes fast
+# Historical data lives a long time; live/latest data refreshes fast.
+# Sessions that finished more than _FINISHED_GRACE ago never change, so
+# their data is cached without expiry.
 _TTL_HISTORICAL = 3600  # 1 hour
 _TTL_LIVE = 10  # 10 seconds
+_FINISHED_GRACE = 3 * 3600  # 3 hours after the scheduled end
 
 _MAX_RETRIES = 3
 _BACKOFF_BASE = 1.0
+_TIMEOUT = float(os.environ.get("OPENF1_TIMEOUT", 30))
+
+# Circuit breaker: after this many consecutive upstream failures, stop
+# calling OpenF1 for a while and fail fast (or serve stale data) instead
+_BREAKER_THRESHOLD = int(os.environ.get("OPENF1_BREAKER_THRESHOLD", 5))
+_BREAKER_RESET = float(os.environ.get("OPENF1_BREAKER_RESET", 30))
+_breaker = CircuitBreaker(_BREAKER_THRESHOLD, _BREAKER_RESET)
+
+# Rate limiter – OpenF1 allows 3 req/s
+_RATE = float(os.environ.get("OPENF1_RATE", 3))
+_BURST = int(os.environ.get("OPENF1_BURST", 3))
+_limiter = TokenBucket(_RATE, _BURST)
+
+# Upstream fetches in progress: key = URL, value = task shared by all callers
+_inflight: dict[str, asyncio.Task] = {}
+# Rate-limiter priority of each fetch in progress, raised as callers join
+_inflight_priority: dict[str, SharedPriority] = {}
+
+# Fetch-layer counters, see fetch_stats()
+_stats = {
+    "upstream_fetches": 0,
+    "coalesced": 0,
+    "planned": 0,
+    "throttled": 0,
+    "stale_served": 0,
+    "revalidations": 0,
+    "breaker_rejections": 0,
+    "store_hits": 0,
+    "store_writes": 0,
+    "live_deltas": 0,
+    "live_delta_rows": 0,
+}
+
+_upstream_requests = metrics.counter(
+    "openf1_requests_total",
+    "Requests sent to OpenF1 by endpoint and HTTP status ('error' when no response arrived)",
+    ("endpoint", "status"),
+)
+_upstream_latency = metrics.histogram(
+    "openf1_request_duration_seconds", "OpenF1 response time per request attempt", ("endpoint",)
+)
+_upstream_retries = metrics.counter(
+    "openf1_retries_total",
+    "OpenF1 request attempts that were retried, by endpoint and reason (status code or 'error')",
+    ("endpoint", "reason"),
+)
+_limiter_wait = metrics.histogram(
+    "openf1_rate_limit_wait_seconds", "Time a request waited in the rate limiter before being sent"
+)
+
+# Per-driver indexes of session-wide payloads, for narrowing queries locally
+_indexes = IndexCache()
+
+# Live session-wide payloads refreshed by delta queries, keyed by URL
+_live: dict[str, LiveBuffer] = {}
+
+# session_key / meeting_key -> scheduled end (epoch seconds), learned from /sessions responses
+_session_end: dict[str, float] = {}
+_meeting_end: dict[str, float] = {}
+
+# Persistent store for finished sessions; empty path disables it.  The
+# default lives in the user cache directory, not wherever the server starts
+_STORE_PATH = os.environ.get(
+    "OPENF1_STORE_PATH",
+    os.path.join(
+        os.environ.get("XDG_CACHE_HOME") or os.path.expanduser("~/.cache"),
+        "f1-undercut", "openf1_store.sqlite3",
+    ),
+)
+# Serve only from the persistent store, never touching the network
+_OFFLINE = os.environ.get("OPENF1_OFFLINE", "").lower() in ("1", "true", "yes")
+
+
+class OfflineMissError(RuntimeError):
+    """Raised in offline mode for a URL that isn't in the persistent store."""
+
+
+class UpstreamUnavailableError(RuntimeError):
+    """Raised without calling OpenF1 while the circuit breaker is open."""
+
+    def __init__(self, message: str, retry_after: float) -> None:
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class Staleness:
+    """How out of date the data behind one response is."""
+
+    __slots__ = ("seconds",)
+
+    def __init__(self) -> None:
+        # Largest time past its TTL of any cached payload served, 0 if all fresh
+        self.seconds = 0.0
+
+
+# Staleness of the request being handled; shared by reference with the
+# tasks it spawns, so fetches anywhere below it report back
+_staleness: ContextVar[Staleness | None] = ContextVar("staleness", default=None)
+
+
+@contextmanager
+def track_staleness() -> Iterator[Staleness]:
+    """Record how stale the payloads fetched in this block are."""
+    staleness = Staleness()
+    token = _staleness.set(staleness)
+    try:
+        yield staleness
+    finally:
+        _staleness.reset(token)
+
+
+class _ResponseCache:
+    """LRU cache of parsed responses, bounded by an estimated memory size.
+
+    Entries are (stored_at, size, data) keyed by URL.  Freshness is checked
+    on read with _ttl_for, since a session's TTL changes once it finishes.
+    Expired entries are kept until evicted or replaced, so they can still
+    be served while a refresh runs (stale-while-revalidate).
+    """
+
+    def __init__(self, max_bytes: int) -> None:
+        self.max_bytes = max_bytes
+        self.bytes = 0
+        self._entries: OrderedDict[str, tuple[float, int, Any]] = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.stale_hits = 0
+
+    def get(self, url: str) -> tuple[Any, float] | None:
+        """(data, seconds past its TTL) for a URL; 0 means fresh."""
+        entry = self._entries.get(url)
+        if entry is None:
+            self.misses += 1
+            return None
+        ts, _, data = entry
+        self._entries.move_to_end(url)
+        ttl = _ttl_for(url)
+        overdue = 0.0 if ttl is None else max(0.0, time.time() - ts - ttl)
+        if overdue > 0:
+            self.stale_hits += 1
+        else:
+            self.hits += 1
+        return data, overdue
+
+    def set(self, url: str, data: Any, size: int) -> None:
+        if url in self._entries:
+            self._remove(url)
+        if size > self.max_bytes:
+            return
+        self._entries[url] = (time.time(), size, data)
+        self.bytes += size
+        while self.bytes > self.max_bytes:
+            oldest = next(iter(self._entries))
+            self._remove(oldest)
+            self.evictions += 1
+
+    def discard(self, url: str) -> None:
+        if url in self._entries:
+            self._remove(url)
+
+    def _remove(self, url: str) -> None:
+        _, size, _ = self._entries.pop(url)
+        self.bytes -= size
+
+    def stats(self) -> dict[str, Any]:
+        lookups = self.hits + self.stale_hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "bytes": self.bytes,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "stale_hits": self.stale_hits,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else None,
+            "evictions": self.evictions,
+        }
+
+
+_cache = _ResponseCache(_CACHE_MAX_BYTES)
+
+
+def _note_sessions(data: Any) -> None:
+    """Remember when sessions end so their data gets the right TTL."""
+    if not isinstance(data, list):
+        return
+    for s in data:
+        key, end = s.get("session_key"), s.get("date_end")
+        if key is None or not end:
+            continue
+        try:
+            ts = datetime.fromisoformat(end.replace("Z", "+00:00")).timestamp()
+        except ValueError:
+            continue
+        _session_end[str(key)] = ts
+        meeting = s.get("meeting_key")
+        if meeting is not None:
+            _meeting_end[str(meeting)] = max(ts, _meeting_end.get(str(meeting), ts))
+
+
+def session_finished(session_key: int | str) -> bool:
+    """True once a session is known to be over and its data final."""
+    end = _session_end.get(str(session_key))
+    return end is not None and time.time() > end + _FINISHED_GRACE
+
+
+def _ttl_for(url: str) -> float | None:
+    """Seconds a response stays fresh; None means it never expires."""
+    params = httpx.URL(url).params
+    session_key = params.get("session_key")
+    if session_key == "latest":
+        return _TTL_LIVE
+    if session_key is not None:
+        if session_key in _session_end:
+            return None if session_finished(session_key) else _TTL_LIVE
+        return _TTL_HISTORICAL
+    meeting_key = params.get("meeting_key")
+    if meeting_key is not None and meeting_key in _meeting_end:
+        finished = time.time() > _meeting_end[meeting_key] + _FINISHED_GRACE
+        return None if finished else _TTL_LIVE
+    year = params.get("year")
+    if year is not None and year.isdigit() and int(year) < datetime.now(timezone.utc).year:
+        return None
+    return _TTL_HISTORICAL
 
-# Concurrency limiter – OpenF1 allows 3 req/s
-_semaphore = asyncio.Semaphore(3)
 
+def _cache_get(url: str) -> tuple[Any, float] | None:
+    return _cache.get(url)
 
-def _ttl_for(url: str) -> int:
-    return _TTL_LIVE if "latest" in url else _TTL_HISTORICAL
 
+def _cache_set(url: str, data: Any, wire_size: int) -> None:
+    _cache.set(url, data, wire_size * _OBJECT_OVERHEAD)
 
-def _cache_get(url: str) -> Any | None:
-    entry = _cache.get(url)
-    if entry is None:
+
+async def _fetch(
+    client: httpx.AsyncClient,
+    url: str,
+    store: SessionStore | None = None,
+    offline: bool = False,
+) -> Any:
+    if url in _live and _ttl_for(url) != _TTL_LIVE:
+        # The session finished since this payload was last polled.  Its rows
+        # were built up from deltas, so refetch it whole before it's cached
+        # (and stored) for good
+        del _live[url]
+        _cache.discard(url)
+    cached = _cache_get(url)
+    if cached is not None:
+        data, overdue = cached
+        if overdue > 0:
+            # Stale-while-revalidate: answer now, refresh in the background
+            _stats["stale_served"] += 1
+            staleness = _staleness.get()
+            if staleness is not None:
+                staleness.seconds = max(staleness.seconds, overdue)
+            if url not in _inflight:
+                _stats["revalidations"] += 1
+                _start_load(client, url, store, offline, revalidate=True)
+        return data
+
+    # Single-flight: concurrent callers for the same URL share one request
+    task = _inflight.get(url)
+    if task is not None:
+        _stats["coalesced"] += 1
+        # Waiting on someone else's fetch shouldn't drop this caller's priority
+        _inflight_priority[url].raise_to(request_priority.get())
+    else:
+        task = _start_load(client, url, store, offline)
+    # Shielded so one caller going away doesn't cancel the fetch for the rest
+    return await asyncio.shield(task)
+
+
+def _start_load(
+    client: httpx.AsyncClient,
+    url: str,
+    store: SessionStore | None,
+    offline: bool,
+    revalidate: bool = False,
+) -> asyncio.Task:
+    coro = _revalidate(client, url, store, offline) if revalidate else _load(client, url, store, offline)
+    shared = SharedPriority(Priority.BACKGROUND if revalidate else request_priority.get())
+    # The task runs in a copy of the current context, taken here
+    token = shared_priority.set(shared)
+    try:
+        task = asyncio.ensure_future(coro)
+    finally:
+        shared_priority.reset(token)
+    _inflight[url] = task
+    _inflight_priority[url] = shared
+    task.add_done_callback(lambda t: _fetch_done(url, t))
+    return task
+
+
+async def _revalidate(
+    client: httpx.AsyncClient, url: str, store: SessionStore | None, offline: bool,
+) -> Any:
+    """Background refresh of a stale entry; nobody is waiting on it."""
+    with priority(Priority.BACKGROUND):
+        return await _load(client, url, store, offline)
+
+
+def _fetch_done(url: str, task: asyncio.Task) -> None:
+    if _inflight.get(url) is task:
+        del _inflight[url]
+        del _inflight_priority[url]
+    # Mark the exception as retrieved even if every waiter was cancelled
+    if not task.cancelled():
+        task.exception()
+
+
+def _accept(url: str, body: bytes) -> Any:
+    """Parse a response body and cache it."""
+    data = serialization.loads(body)
+    if httpx.URL(url).path.endswith("/sessions"):
+        _note_sessions(data)
+    _cache_set(url, data, len(body))
+    return data
+
+
+async def _load(
+    client: httpx.AsyncClient, url: str, store: SessionStore | None, offline: bool,
+) -> Any:
+    """Cache miss: try the persistent store, then OpenF1."""
+    if store is not None:
+        body = await asyncio.to_thread(store.get, url)
+        if body is not None:
+            _stats["store_hits"] += 1
+            return _accept(url, body)
+    if offline:
+        raise OfflineMissError(f"Not in the offline store: {url}")
+
+    buffer = _live.get(url)
+    if buffer is not None:
+        if _ttl_for(url) == _TTL_LIVE:
+            delta_url = buffer.delta_url(url)
+            if delta_url is not None:
+                return await _load_delta(client, url, delta_url, buffer)
+        del _live[url]
+
+    body = await _fetch_upstream(client, url)
+    data = _accept(url, body)
+    if isinstance(data, list) and _is_live_session_url(url):
+        _live[url] = LiveBuffer(httpx.URL(url).path.removeprefix("/v1"), data, len(body))
+    if store is not None and _ttl_for(url) is None:
+        session_key = httpx.URL(url).params.get("session_key")
+        await asyncio.to_thread(store.put, url, session_key, body)
+        _stats["store_writes"] += 1
+    return data
+
+
+def _is_live_session_url(url: str) -> bool:
+    """A whole-session query for a delta-capable endpoint of a live session."""
+    parsed = httpx.URL(url)
+    session_key = parsed.params.get("session_key")
+    return (
+        parsed.path.removeprefix("/v1") in DELTA_PATHS
+        and list(parsed.params.keys()) == ["session_key"]
+        and session_key is not None
+        and session_key.isdigit()
+        and _ttl_for(url) == _TTL_LIVE
+    )
+
+
+async def _load_delta(
+    client: httpx.AsyncClient, url: str, delta_url: str, buffer: LiveBuffer,
+) -> Any:
+    """Refresh a live payload with only the rows added since the last poll."""
+    body = await _fetch_upstream(client, delta_url)
+    _stats["live_deltas"] += 1
+    _stats["live_delta_rows"] += buffer.merge(serialization.loads(body), len(body))
+    _cache_set(url, buffer.rows, buffer.wire_size)
+    return buffer.rows
+
+
+def _retry_after(resp: httpx.Response) -> float | None:
+    """Seconds to wait from a Retry-After header (delta or HTTP date)."""
+    value = resp.headers.get("retry-after")
+    if not value:
         return None
-    ts, data = entry
-    if time.time() - ts > _ttl_for(url):
-        del _cache[url]
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
         return None
-    return data
 
 
-def _cache_set(url: str, data: Any) -> None:
-    _cache[url] = (time.time(), data)
+def _check_breaker(url: str) -> None:
+    if not _breaker.allow():
+        _stats["breaker_rejections"] += 1
+        retry_after = _breaker.retry_after()
+        raise UpstreamUnavailableError(
+            f"OpenF1 is failing, not retrying for {retry_after:.1f}s: {url}", retry_after
+        )
 
 
-async def _fetch(client: httpx.AsyncClient, url: str) -> Any:
-    cached = _cache_get(url)
-    if cached is not None:
-        return cached
+def _endpoint(url: str) -> str:
+    """OpenF1 endpoint of a URL ("/laps"), the label for upstream metrics."""
+    return httpx.URL(url).path.removeprefix("/v1")
+
 
+async def _fetch_upstream(client: httpx.AsyncClient, url: str) -> bytes:
+    _stats["upstream_fetches"] += 1
+    endpoint = _endpoint(url)
     last_exc: Exception | None = None
+    reason = ""  # why the previous attempt failed
     for attempt in range(_MAX_RETRIES):
-        async with _semaphore:
+        _check_breaker(url)
+        if attempt:
+            _upstream_retries.inc(endpoint=endpoint, reason=reason)
+        queued = time.perf_counter()
+        await _limiter.acquire()
+        started = time.perf_counter()
+        _limiter_wait.observe(started - queued)
+        try:
             try:
-                resp = await client.get(url, timeout=30)
-                if resp.status_code in (429, 503):
+                resp = await client.get(url, timeout=_TIMEOUT)
+            finally:
+                _upstream_latency.observe(time.perf_counter() - started, endpoint=endpoint)
+            _upstream_requests.inc(endpoint=endpoint, status=resp.status_code)
+            if resp.status_code in (429, 503):
+                _stats["throttled"] += 1
+                # Throttling means OpenF1 is up; an outage shows as 503
+                if resp.status_code == 429:
+                    _breaker.record_success()
+                else:
+                    _breaker.record_failure()
+                wait = _retry_after(resp)
+                if wait is None:
                     wait = _BACKOFF_BASE * (2 ** attempt)
+                if resp.status_code == 429:
+                    # Rate limited: hold every request, not just this one
+                    _limiter.pause_until(time.monotonic() + wait)
+                else:
                     await asyncio.sleep(wait)
-                    continue
-                resp.raise_for_status()
-                data = resp.json()
-                _cache_set(url, data)
-                return data
-            except httpx.HTTPStatusError as exc:
-                if exc.response.status_code < 500 and exc.response.status_code not in (429,):
-                    raise
-                last_exc = exc
-                wait = _BACKOFF_BASE * (2 ** attempt)
-                await asyncio.sleep(wait)
-            except httpx.RequestError as exc:
-                last_exc = exc
-                wait = _BACKOFF_BASE * (2 ** attempt)
-                await asyncio.sleep(wait)
+                reason = str(resp.status_code)
+                continue
+            resp.raise_for_status()
+            _breaker.record_success()
+            return resp.content
+        except httpx.HTTPStatusError as exc:
+            if exc.response.status_code < 500 and exc.response.status_code not in (429,):
+                _breaker.record_success()
+                raise
+            _breaker.record_failure()
+            last_exc = exc
+            reason = str(exc.response.status_code)
+            wait = _BACKOFF_BASE * (2 ** attempt)
+            await asyncio.sleep(wait)
+        except httpx.RequestError as exc:
+            _upstream_requests.inc(endpoint=endpoint, status="error")
+            _breaker.record_failure()
+            last_exc = exc
+            reason = "error"
+            wait = _BACKOFF_BASE * (2 ** attempt)
+            await asyncio.sleep(wait)
     raise last_exc or RuntimeError(f"Failed to fetch {url}")
 
 
+def fetch_stats() -> dict[str, int]:
+    """Counters for the fetch layer.
+
+    `coalesced` is the number of upstream requests avoided because an
+    identical one was already in flight; `planned` counts narrow queries
+    answered from a session-wide payload.
+    """
+    return {**_stats, "in_flight": len(_inflight)}
+
+
+def limiter_stats() -> dict[str, Any]:
+    """Queue depth and wait times of the upstream rate limiter."""
+    return _limiter.stats()
+
+
+def cache_stats() -> dict[str, Any]:
+    """Size, hit/miss and eviction counters for the response cache."""
+    return _cache.stats()
+
+
+def breaker_stats() -> dict[str, Any]:
+    """State and counters of the upstream circuit breaker."""
+    return _breaker.stats()
+
+
 class OpenF1Client:
     """Async wrapper around the OpenF1 REST API."""
 
-    def __init__(self) -> None:
-        self._client = httpx.AsyncClient(base_url=BASE_URL)
+    def __init__(
+        self,
+        store_path: str | None = _STORE_PATH,
+        offline: bool = _OFFLINE,
+        transport: httpx.AsyncBaseTransport | None = None,
+    ) -> None:
+        # transport replaces the network, e.g. with a local stand-in for benchmarks
+        self._client = httpx.AsyncClient(base_url=BASE_URL, transport=transport)
+        self._store = SessionStore(store_path) if store_path else None
+        self._offline = offline
+        if offline and self._store is None:
+            raise ValueError("Offline mode needs a persistent store (OPENF1_STORE_PATH)")
 
     async def close(self) -> None:
         await self._client.aclose()
+        if self._store is not None:
+            self._store.close()
 
     # --- low-level ---------------------------------------------------------
 
+    def _url(self, path: str, params: dict[str, Any] | None) -> str:
+        return str(self._client.build_request("GET", path, params=params).url)
+
     async def _get(self, path: str, params: dict[str, Any] | None = None) -> list[dict]:
-        url = str(self._client.build_request("GET", path, params=params).url)
-        return await _fetch(self._client, url)
+        plan = plan_query(path, params)
+        if plan is None:
+            url = self._url(path, params)
+            return await _fetch(self._client, url, self._store, self._offline)
+
+        # Narrow query (e.g. one driver): fetch the whole session once and
+        # answer every narrower query from that payload
+        wide_params, filters = plan
+        url = self._url(path, wide_params)
+        rows = await _fetch(self._client, url, self._store, self._offline)
+        _stats["planned"] += 1
+        if not isinstance(rows, list):
+            return rows
+        return _indexes.get(url, rows).select(filters)
 
     # --- endpoints ---------------------------------------------------------
 
@@ -115,3 +593,35 @@ class OpenF1Client:
 
     async def get_position(self, **params: Any) -> list[dict]:
         return await self._get("/position", params or None)
+
+
+# Read from the counters above when /metrics is scraped
+metrics.callback(
+    "openf1_cache_lookups_total", "Response cache lookups by result",
+    lambda: {("hit",): _cache.hits, ("stale",): _cache.stale_hits, ("miss",): _cache.misses},
+    type="counter", labels=("result",),
+)
+metrics.callback(
+    "openf1_cache_hit_ratio", "Fresh hits over all response cache lookups",
+    lambda: _cache.stats()["hit_ratio"],
+)
+metrics.callback("openf1_cache_bytes", "Estimated memory held by cached responses", lambda: _cache.bytes)
+metrics.callback("openf1_cache_entries", "Cached responses", lambda: _cache.stats()["entries"])
+metrics.callback(
+    "openf1_cache_evictions_total", "Responses evicted to stay within the memory budget",
+    lambda: _cache.evictions, type="counter",
+)
+metrics.callback(
+    "openf1_fetch_events_total", "Fetch-layer events (see fetch_stats)",
+    lambda: {(name,): value for name, value in _stats.items()}, type="counter", labels=("event",),
+)
+metrics.callback("openf1_fetches_in_flight", "Upstream loads in progress", lambda: len(_inflight))
+metrics.callback(
+    "openf1_rate_limit_queue_depth", "Requests waiting in the rate limiter, by priority",
+    lambda: {(p,): n for p, n in _limiter.stats()["queue_depth_by_priority"].items()},
+    labels=("priority",),
+)
+metrics.callback(
+    "openf1_circuit_open", "1 while the upstream circuit breaker is open or half-open",
+    lambda: 0 if _breaker.state == "closed" else 1,
+)
@@ -0,0 +1,126 @@
+from __future__ import annotations
+
+import operator
+from collections import OrderedDict, defaultdict
+from typing import Any, Callable
+
+# Session-scoped endpoints small enough to always fetch for the whole
+# session; narrower queries against them are answered from that payload.
+# (car_data/location are per-sample telemetry and stay per-driver.)
+WIDENABLE_PATHS = frozenset({"/laps", "/intervals", "/stints", "/pit", "/position", "/weather", "/drivers"})
+
+# Column each widened payload is indexed on for fast narrowing
+INDEX_FIELD = "driver_number"
+
+# OpenF1 comparison filters are written as e.g. {"lap_number>=": 10}
+_OPERATORS: list[tuple[str, Callable[[Any, Any], bool]]] = [
+    (">=", operator.ge),
+    ("<=", operator.le),
+    (">", operator.gt),
+    ("<", operator.lt),
+]
+
+Filter = tuple[str, Callable[[Any, Any], bool], Any]
+
+
+def plan_query(path: str, params: dict[str, Any] | None) -> tuple[dict[str, Any], list[Filter]] | None:
+    """Split a query into the session-wide query that covers it and local filters.
+
+    Returns None when the query should go upstream as-is: the endpoint
+    isn't widenable, it isn't scoped to one session, or it has no filters.
+    """
+    if path not in WIDENABLE_PATHS or not params or "session_key" not in params:
+        return None
+    filters: list[Filter] = []
+    for key, value in params.items():
+        if key == "session_key":
+            continue
+        for suffix, op in _OPERATORS:
+            if key.endswith(suffix):
+                filters.append((key[: -len(suffix)], op, value))
+                break
+        else:
+            filters.append((key, operator.eq, value))
+    if not filters:
+        return None
+    return {"session_key": params["session_key"]}, filters
+
+
+def _coerce(row_value: Any, value: Any) -> Any:
+    """Make a query value comparable with a row value (query strings are text)."""
+    if isinstance(value, str) and isinstance(row_value, (int, float)) and not isinstance(row_value, bool):
+        try:
+            return type(row_value)(value)
+        except ValueError:
+            return value
+    return value
+
+
+def _matches(row: dict, filters: list[Filter]) -> bool:
+    for field, op, value in filters:
+        row_value = row.get(field)
+        if row_value is None:
+            return False
+        try:
+            if not op(row_value, _coerce(row_value, value)):
+                return False
+        except TypeError:
+            return False
+    return True
+
+
+class RowIndex:
+    """Rows of a session-wide payload grouped by INDEX_FIELD, in payload order."""
+
+    def __init__(self, rows: list[dict]) -> None:
+        self.rows = rows
+        self.size = 0
+        self.by_key: dict[Any, list[dict]] = defaultdict(list)
+        self.extend()
+
+    def extend(self) -> None:
+        """Index rows appended to `rows` since the last call."""
+        for r in self.rows[self.size:]:
+            self.by_key[r.get(INDEX_FIELD)].append(r)
+        self.size = len(self.rows)
+
+    def select(self, filters: list[Filter]) -> list[dict]:
+        candidates = self.rows
+        rest = filters
+        for i, (field, op, value) in enumerate(filters):
+            if field == INDEX_FIELD and op is operator.eq:
+                try:
+                    key = int(value)
+                except (TypeError, ValueError):
+                    break
+                candidates = self.by_key.get(key, [])
+                rest = filters[:i] + filters[i + 1:]
+                break
+        if not rest:
+            return list(candidates)
+        return [r for r in candidates if _matches(r, rest)]
+
+
+class IndexCache:
+    """Recently used RowIndexes, keyed by the wide URL they were built from.
+
+    An index is rebuilt when the client hands back a different payload
+    object for its URL (i.e. the cached response was refreshed), and
+    extended when a live payload has had rows appended.
+    """
+
+    def __init__(self, max_entries: int = 16) -> None:
+        self.max_entries = max_entries
+        self._entries: OrderedDict[str, RowIndex] = OrderedDict()
+
+    def get(self, url: str, rows: list[dict]) -> RowIndex:
+        index = self._entries.get(url)
+        if index is None or index.rows is not rows:
+            index = RowIndex(rows)
+            self._entries[url] = index
+        elif index.size != len(rows):
+            index.extend()
+        self._entries.move_to_end(url)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+        return index
@@ -0,0 +1,163 @@
+from __future__ import annotations
+
+import asyncio
+import heapq
+import itertools
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from enum import IntEnum
+from typing import Any, Iterator
+
+
+class Priority(IntEnum):
+    """Upstream request classes; lower values are served first."""
+
+    INTERACTIVE = 0  # a user is waiting on the response (lap scrubbing)
+    NORMAL = 1
+    BACKGROUND = 2  # prefetch, polling, batch jobs
+
+
+# Priority of upstream requests made from the current task
+request_priority: ContextVar[Priority] = ContextVar("request_priority", default=Priority.NORMAL)
+
+
+class SharedPriority:
+    """Priority of one upstream request made on behalf of several callers.
+
+    It starts at the first caller's priority; raise_to moves it up (and
+    the request with it, if it's already queued in a TokenBucket) when a
+    caller with a higher priority joins.
+    """
+
+    __slots__ = ("level", "_queued")
+
+    def __init__(self, level: Priority) -> None:
+        self.level = level
+        self._queued: tuple[TokenBucket, asyncio.Future] | None = None
+
+    def raise_to(self, level: Priority) -> None:
+        if level >= self.level:
+            return
+        self.level = level
+        if self._queued is not None:
+            bucket, fut = self._queued
+            bucket._requeue(fut, level)
+
+
+# Set inside a shared request; takes precedence over request_priority
+shared_priority: ContextVar[SharedPriority | None] = ContextVar("shared_priority", default=None)
+
+
+@contextmanager
+def priority(level: Priority) -> Iterator[None]:
+    """Run upstream requests in this block at the given priority."""
+    token = request_priority.set(level)
+    try:
+        yield
+    finally:
+        request_priority.reset(token)
+
+
+class TokenBucket:
+    """Requests-per-second limiter with priority-ordered waiters.
+
+    Tokens refill continuously at `rate` per second up to `burst`.  When
+    none are available, callers queue and are released highest priority
+    first (FIFO within a priority) by a single dispatcher task.
+    `pause_until` stops all releases, e.g. to honour a 429 Retry-After.
+    """
+
+    def __init__(self, rate: float, burst: int) -> None:
+        self.rate = rate
+        self.burst = burst
+        self._tokens = float(burst)
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._waiters: list[tuple[int, int, asyncio.Future]] = []
+        self._seq = itertools.count()
+        self._dispatcher: asyncio.Task | None = None
+
+        self.granted = 0
+        self.waited = 0
+        self.wait_seconds_total = 0.0
+        self.wait_seconds_max = 0.0
+        self.pauses = 0
+
+    def _refill(self, now: float) -> None:
+        self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    async def acquire(self, level: Priority | None = None) -> None:
+        """Wait until a request may be sent."""
+        shared = shared_priority.get() if level is None else None
+        if level is None:
+            level = shared.level if shared is not None else request_priority.get()
+        now = time.monotonic()
+        self._refill(now)
+        if not self._waiters and now >= self._paused_until and self._tokens >= 1:
+            self._tokens -= 1
+            self.granted += 1
+            return
+
+        fut = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (int(level), next(self._seq), fut))
+        if self._dispatcher is None or self._dispatcher.done():
+            self._dispatcher = asyncio.ensure_future(self._dispatch())
+        if shared is not None:
+            shared._queued = (self, fut)
+        try:
+            await fut
+        finally:
+            if shared is not None:
+                shared._queued = None
+        waited = time.monotonic() - now
+        self.granted += 1
+        self.waited += 1
+        self.wait_seconds_total += waited
+        self.wait_seconds_max = max(self.wait_seconds_max, waited)
+
+    async def _dispatch(self) -> None:
+        while self._waiters:
+            now = time.monotonic()
+            self._refill(now)
+            delay = max(self._paused_until - now, (1 - self._tokens) / self.rate, 0.0)
+            if delay > 0:
+                await asyncio.sleep(delay)
+                continue
+            _, _, fut = heapq.heappop(self._waiters)
+            if fut.done():  # caller was cancelled while queued
+                continue
+            self._tokens -= 1
+            fut.set_result(None)
+
+    def _requeue(self, fut: asyncio.Future, level: Priority) -> None:
+        """Move a queued waiter to another priority, keeping its place in line."""
+        self._waiters = [
+            (int(level) if f is fut else lvl, seq, f) for lvl, seq, f in self._waiters
+        ]
+        heapq.heapify(self._waiters)
+
+    def pause_until(self, deadline: float) -> None:
+        """Hold every request until `deadline` (time.monotonic seconds)."""
+        if deadline > self._paused_until:
+            self._paused_until = deadline
+            self.pauses += 1
+
+    def stats(self) -> dict[str, Any]:
+        depth = {p.name.lower(): 0 for p in Priority}
+        for level, _, fut in self._waiters:
+            if not fut.done():
+                depth[Priority(level).name.lower()] += 1
+        return {
+            "rate_per_second": self.rate,
+            "burst": self.burst,
+            "queue_depth": sum(depth.values()),
+            "queue_depth_by_priority": depth,
+            "granted": self.granted,
+            "waited": self.waited,
+            "wait_seconds_total": round(self.wait_seconds_total, 3),
+            "wait_seconds_max": round(self.wait_seconds_max, 3),
+            "pauses": self.pauses,
+            "paused_for": round(max(0.0, self._paused_until - time.monotonic()), 3),
+        }
@@ -0,0 +1,199 @@
+from __future__ import annotations
+
+import hashlib
+import os
+from collections import OrderedDict
+from typing import Awaitable, Callable
+
+from fastapi import Request, Response
+from pydantic import BaseModel
+
+from . import columnar, metrics, timing
+from .openf1_client import session_finished
+from .serialization import FastJSONResponse, dumps
+
+# Browsers may reuse data of finished sessions without asking for this long;
+# anything else is revalidated with its ETag on every use
+_FINISHED_MAX_AGE = 24 * 3600
+
+# Serialized bodies of recently sent models, keyed by id() (the model is
+# kept in the entry so the id can't be reused while it's cached).  Models
+# memoized on a SessionFrame are rendered once per data version.
+_RENDERED_MAX = 64
+_rendered: OrderedDict[tuple[int, bool], tuple[BaseModel, bytes, str]] = OrderedDict()
+
+
+# Memory budget for memoized endpoint responses
+_RESULTS_MAX_BYTES = int(os.environ.get("RESPONSE_CACHE_MAX_BYTES", 256 * 1024 * 1024))
+
+
+class _ResultCache:
+    """LRU of rendered responses keyed by request and session data version.
+
+    A key includes the SessionFrame's data_version, so entries for data
+    that has since changed are never hit again and age out of the LRU.
+    """
+
+    def __init__(self, max_bytes: int) -> None:
+        self.max_bytes = max_bytes
+        self.bytes = 0
+        self._entries: OrderedDict[tuple, tuple[bytes, str, str]] = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.not_modified = 0
+
+    def get(self, key: tuple) -> tuple[bytes, str, str] | None:
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry
+
+    def set(self, key: tuple, body: bytes, media: str) -> tuple[bytes, str, str]:
+        entry = (body, etag_for(body), media)
+        old = self._entries.pop(key, None)
+        if old is not None:
+            self.bytes -= len(old[0])
+        if len(body) <= self.max_bytes:
+            self._entries[key] = entry
+            self.bytes += len(body)
+            while self.bytes > self.max_bytes:
+                _, (old, _, _) = self._entries.popitem(last=False)
+                self.bytes -= len(old)
+        return entry
+
+    def stats(self) -> dict[str, int | float | None]:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "bytes": self.bytes,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else None,
+            "not_modified": self.not_modified,
+        }
+
+
+_results = _ResultCache(_RESULTS_MAX_BYTES)
+
+
+def wants_columns(request: Request) -> bool:
+    """True if the client asked for the column-oriented encoding."""
+    return (
+        request.query_params.get("format") == "columns"
+        or columnar.COLUMNS_MEDIA_TYPE in request.headers.get("accept", "")
+    )
+
+
+def media_type(columns: bool) -> str:
+    return columnar.COLUMNS_MEDIA_TYPE if columns else "application/json"
+
+
+def etag_for(body: bytes) -> str:
+    return '"' + hashlib.blake2b(body, digest_size=12).hexdigest() + '"'
+
+
+def _etag_matches(request: Request, etag: str) -> bool:
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    tags = [t.strip().removeprefix("W/") for t in header.split(",")]
+    return "*" in tags or etag in tags
+
+
+def cache_control(session_key: int) -> str:
+    if session_finished(session_key):
+        return f"public, max-age={_FINISHED_MAX_AGE}"
+    return "no-cache"
+
+
+def render(model: BaseModel, columns: bool = False) -> tuple[bytes, str]:
+    """JSON body and ETag of a model, reused while the same object is sent."""
+    key = (id(model), columns)
+    entry = _rendered.get(key)
+    if entry is not None and entry[0] is model:
+        _rendered.move_to_end(key)
+        return entry[1], entry[2]
+    if columns:
+        body = dumps(columnar.encode(model.model_dump(mode="json")))
+    else:
+        body = model.model_dump_json().encode()
+    etag = etag_for(body)
+    _rendered[key] = (model, body, etag)
+    while len(_rendered) > _RENDERED_MAX:
+        _rendered.popitem(last=False)
+    return body, etag
+
+
+async def cached_response(
+    request: Request,
+    session_key: int,
+    data_version: str,
+    build: Callable[[], Awaitable[Response]],
+) -> Response:
+    """Serve a session-derived response from the result cache, with an ETag.
+
+    `build` runs only on a miss; its body is kept for this exact request
+    (path, query, encoding) and data version.  Clients revalidating with
+    a matching If-None-Match get a 304 without a body.
+    """
+    key = (
+        session_key,
+        data_version,
+        request.url.path,
+        tuple(sorted(
+            (k, v) for k, v in request.query_params.multi_items() if k not in timing.QUERY_FLAGS
+        )),
+        wants_columns(request),
+    )
+    entry = _results.get(key)
+    if entry is None:
+        response = await build()
+        if response.status_code != 200:
+            return response
+        entry = _results.set(key, bytes(response.body), response.media_type or "application/json")
+    body, etag, media = entry
+    headers = {"ETag": etag, "Cache-Control": cache_control(session_key), "Vary": "Accept"}
+    if _etag_matches(request, etag):
+        _results.not_modified += 1
+        return Response(status_code=304, headers=headers)
+    return Response(content=body, media_type=media, headers=headers)
+
+
+def result_cache_stats() -> dict[str, int | float | None]:
+    """Size and hit/miss counters of the response-level result cache."""
+    return _results.stats()
+
+
+def model_columns_response(request: Request, model: BaseModel) -> Response:
+    """A model as plain JSON, or column-encoded if the client asked for it."""
+    if not wants_columns(request):
+        return Response(content=model.model_dump_json().encode(), media_type="application/json")
+    body = dumps(columnar.encode(model.model_dump(mode="json")))
+    return Response(content=body, media_type=columnar.COLUMNS_MEDIA_TYPE, headers={"Vary": "Accept"})
+
+
+def rows_response(request: Request, rows: list[dict]) -> Response:
+    """Raw rows as a JSON array, or column-encoded if the client asked for it."""
+    if not wants_columns(request):
+        return FastJSONResponse(rows)
+    return Response(
+        content=dumps(columnar.encode(rows)),
+        media_type=columnar.COLUMNS_MEDIA_TYPE,
+        headers={"Vary": "Accept"},
+    )
+
+
+metrics.callback(
+    "result_cache_lookups_total", "Memoized strategy response lookups by result",
+    lambda: {("hit",): _results.hits, ("miss",): _results.misses},
+    type="counter", labels=("result",),
+)
+metrics.callback(
+    "result_cache_not_modified_total", "Revalidations answered with 304 Not Modified",
+    lambda: _results.not_modified, type="counter",
+)
+metrics.callback("result_cache_bytes", "Bytes of memoized strategy responses", lambda: _results.bytes)
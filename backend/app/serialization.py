@@ -0,0 +1,63 @@
+from __future__ import annotations
+
+import json
+from typing import Any
+
+from fastapi import Response
+from pydantic_core import to_json
+
+# orjson (in requirements.txt) is several times faster than the json module
+# for large upstream payloads and row lists, with the same output; the json
+# module is the fallback when it isn't installed
+try:
+    import orjson
+except ImportError:  # pragma: no cover - depends on the environment
+    orjson = None
+
+
+def loads(data: bytes | str) -> Any:
+    """Parse JSON (upstream responses) with the fastest parser available."""
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def dumps(content: Any) -> bytes:
+    """Encode plain Python data (dicts, lists, scalars) as compact JSON."""
+    if orjson is not None:
+        return orjson.dumps(content, option=orjson.OPT_SERIALIZE_NUMPY)
+    return json.dumps(
+        content, ensure_ascii=False, allow_nan=False, separators=(",", ":")
+    ).encode()
+
+
+class FastJSONResponse(Response):
+    """JSONResponse for plain data, encoded with `dumps`.
+
+    Return it directly from a route to also skip FastAPI's
+    jsonable_encoder walk over the content.
+    """
+
+    media_type = "application/json"
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
+
+
+def model_json(content: Any) -> bytes:
+    """JSON bytes of pydantic models (or lists of them), without validation."""
+    return to_json(content)
+
+
+def merge_objects(*bodies: bytes) -> bytes:
+    """Concatenate the members of JSON-encoded objects into one object."""
+    return b"{" + b",".join(body[1:-1] for body in bodies if body != b"{}") + b"}"
+
+
+def model_response(content: Any) -> Response:
+    """Serialize pydantic models (or lists of them) without re-validating.
+
+    Internal results are built from trusted data already, so routes return
+    this instead of letting `response_model` validate them a second time.
+    """
+    return Response(content=model_json(content), media_type="application/json")
@@ -0,0 +1,459 @@
+from __future__ import annotations
+
+import asyncio
+import itertools
+import os
+import threading
+from collections import OrderedDict, defaultdict
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Callable, Iterable, TypeVar
+
+import numpy as np
+import pandas as pd
+
+from . import compute, timing
+from .openf1_client import OpenF1Client
+
+T = TypeVar("T")
+
+_LAP_COLUMNS = ["driver_number", "lap_number", "lap_duration", "is_pit_out_lap", "date_start"]
+_STINT_COLUMNS = ["driver_number", "stint_number", "compound", "lap_start", "lap_end", "tyre_age_at_start"]
+_PIT_COLUMNS = ["driver_number", "lap_number", "lane_duration"]
+
+# Payloads a frame is built from, and those that only ever grow by appending
+TABLES = ("laps", "stints", "pit", "intervals", "position", "weather", "drivers")
+APPENDABLE_TABLES = frozenset({"intervals", "position", "weather"})
+
+# Derived tables kept per frame; the least recently used go first
+_MAX_DERIVED = int(os.environ.get("SESSION_FRAME_DERIVED_MAX", 256))
+
+
+def _to_df(rows: list[dict], columns: list[str]) -> pd.DataFrame:
+    """DataFrame from raw OpenF1 rows, guaranteeing the columns we index on."""
+    df = pd.DataFrame(rows)
+    for col in columns:
+        if col not in df.columns:
+            df[col] = None
+    return df
+
+
+# Sentinel for missing/unparseable timestamps in int64 nanosecond arrays
+NO_TIME = np.iinfo(np.int64).min
+
+
+def _parse_ts(values: Any) -> np.ndarray:
+    """ISO-8601 strings -> int64 nanoseconds since epoch (NO_TIME if unparseable)."""
+    parsed = pd.to_datetime(
+        pd.Series(values, dtype=object), utc=True, format="ISO8601", errors="coerce"
+    )
+    return pd.DatetimeIndex(parsed).as_unit("ns").asi8
+
+
+def _numeric(value: Any) -> float:
+    return float(value) if isinstance(value, (int, float)) else np.nan
+
+
+class TimeIndex:
+    """One driver's samples of a value, sorted by timestamp.
+
+    Nearest-sample lookups are a binary search; ties between two equally
+    distant samples go to the earlier one, like a first-minimum scan over
+    the payload.
+    """
+
+    __slots__ = ("ts", "values")
+
+    def __init__(self, ts: np.ndarray, values: np.ndarray) -> None:
+        self.ts = ts
+        self.values = values
+
+    def extend(self, ts: np.ndarray, values: np.ndarray) -> None:
+        """Add later samples (re-sorting only if they arrive out of order)."""
+        all_ts = np.concatenate((self.ts, ts))
+        all_values = np.concatenate((self.values, values))
+        if self.ts.size and ts.size and ts[0] < self.ts[-1]:
+            order = np.argsort(all_ts, kind="stable")
+            all_ts, all_values = all_ts[order], all_values[order]
+        self.ts, self.values = all_ts, all_values
+
+    def nearest(self, targets: np.ndarray) -> np.ndarray:
+        """Index of the sample closest to each target (-1 if none)."""
+        targets = np.asarray(targets, dtype=np.int64)
+        out = np.full(targets.shape, -1)
+        n = self.ts.size
+        if n == 0:
+            return out
+        valid = targets != NO_TIME
+        t = targets[valid]
+        right = np.searchsorted(self.ts, t, side="left")
+        left = np.clip(right - 1, 0, n - 1)
+        right_c = np.clip(right, 0, n - 1)
+        take_left = (right > 0) & ((right == n) | (t - self.ts[left] <= self.ts[right_c] - t))
+        nearest = np.where(take_left, left, right_c)
+        # Several samples may share the winning timestamp: take the first
+        out[valid] = np.searchsorted(self.ts, self.ts[nearest], side="left")
+        return out
+
+    def at(self, targets: np.ndarray) -> np.ndarray:
+        """Value of the nearest sample to each target (NaN if none)."""
+        idx = self.nearest(targets)
+        if self.values.size == 0:
+            return np.full(idx.shape, np.nan)
+        return np.where(idx >= 0, self.values[np.maximum(idx, 0)], np.nan)
+
+
+def _time_indexes(
+    rows: list[dict], ts: np.ndarray, value_key: str, require_value: bool
+) -> dict[int, TimeIndex]:
+    """Per-driver TimeIndex over `value_key` from rows with parsed timestamps."""
+    drivers = np.array([_numeric(r.get("driver_number")) for r in rows], dtype=float)
+    values = np.array([_numeric(r.get(value_key)) for r in rows], dtype=float)
+    keep = (ts != NO_TIME) & ~np.isnan(drivers)
+    if require_value:
+        keep &= ~np.isnan(values)
+    drivers, ts, values = drivers[keep], ts[keep], values[keep]
+    order = np.lexsort((ts, drivers))
+    drivers, ts, values = drivers[order], ts[order], values[order]
+    bounds = np.flatnonzero(np.diff(drivers)) + 1
+    return {
+        int(d[0]): TimeIndex(t, v)
+        for d, t, v in zip(
+            np.split(drivers, bounds), np.split(ts, bounds), np.split(values, bounds)
+        )
+        if d.size
+    }
+
+
+def _append_groups(target: dict[int, list[dict]], groups: dict[int, list[dict]]) -> None:
+    for dn, rows in groups.items():
+        target.setdefault(dn, []).extend(rows)
+
+
+def _merge_indexes(target: dict[int, TimeIndex], new: dict[int, TimeIndex]) -> None:
+    for dn, index in new.items():
+        if dn in target:
+            target[dn].extend(index.ts, index.values)
+        else:
+            target[dn] = index
+
+
+def _group_rows(rows: list[dict], key: str = "driver_number") -> dict[int, list[dict]]:
+    """Split raw rows by driver, preserving payload order."""
+    out: dict[int, list[dict]] = defaultdict(list)
+    for r in rows:
+        dn = r.get(key)
+        if dn is not None:
+            out[dn].append(r)
+    return dict(out)
+
+
+class SessionFrame:
+    """Columnar view over every OpenF1 payload for one session.
+
+    Built once per session_key and shared by all strategy_engine functions,
+    so repeated evaluations (e.g. scrubbing the lap slider) read typed
+    columns instead of re-wrapping the raw JSON on every call.
+
+    The raw payloads are kept alongside the columns so pass-through
+    endpoints can still return them untouched.
+
+    Work on a frame runs on the compute pool (see `compute`); `lock`
+    keeps an update from changing the tables under a computation.
+    """
+
+    def __init__(self, session_key: int, payloads: dict[str, list[dict]]) -> None:
+        self.session_key = session_key
+        self.raw = dict(payloads)
+        # Row counts as of the last build/extend, to spot appended rows
+        self._sizes = {name: len(rows) for name, rows in payloads.items()}
+        # Bumped whenever `update` changes any table
+        self.version = 0
+        self._uid = next(_frame_ids)
+        # Derived tables computed on first use (see `derived`)
+        self._derived: OrderedDict[str, tuple[frozenset[str], Any]] = OrderedDict()
+        self.lock = threading.RLock()
+        for name in TABLES:
+            getattr(self, f"_build_{name}")()
+
+    # --- per-table builders ----------------------------------------------------
+
+    def _build_laps(self) -> None:
+        laps = _to_df(self.raw["laps"], _LAP_COLUMNS)
+        self.laps = laps
+        self.lap_driver = pd.to_numeric(laps["driver_number"], errors="coerce").to_numpy(float)
+        self.lap_number = pd.to_numeric(laps["lap_number"], errors="coerce").to_numpy(float)
+        self.lap_duration = pd.to_numeric(laps["lap_duration"], errors="coerce").to_numpy(float)
+        self.lap_pit_out = (laps["is_pit_out_lap"] == True).to_numpy(bool)  # noqa: E712
+        self._lap_rows = {
+            int(dn): np.flatnonzero(self.lap_driver == dn)
+            for dn in np.unique(self.lap_driver[~np.isnan(self.lap_driver)])
+        }
+        self.laps_by_driver = _group_rows(self.raw["laps"])
+        self.lap_start = _parse_ts(laps["date_start"])
+        # First lap start per lap number, overall and per driver, in payload order
+        self._lap_start_any: dict[int, int] = {}
+        self._lap_start_by_driver: dict[int, dict[int, int]] = defaultdict(dict)
+        for dn, lap, ts in zip(self.lap_driver, self.lap_number, self.lap_start):
+            if ts == NO_TIME or np.isnan(lap):
+                continue
+            self._lap_start_any.setdefault(int(lap), int(ts))
+            if not np.isnan(dn):
+                self._lap_start_by_driver[int(dn)].setdefault(int(lap), int(ts))
+
+    def _build_stints(self) -> None:
+        self.stints = _to_df(self.raw["stints"], _STINT_COLUMNS)
+        self.stints_by_driver = {
+            dn: sorted(rows, key=lambda s: s.get("stint_number", 0))
+            for dn, rows in _group_rows(self.raw["stints"]).items()
+        }
+
+    def _build_pit(self) -> None:
+        pit = _to_df(self.raw["pit"], _PIT_COLUMNS)
+        self.pit = pit
+        self.pit_lap = pd.to_numeric(pit["lap_number"], errors="coerce").to_numpy(float)
+        self.pit_lane_duration = pd.to_numeric(pit["lane_duration"], errors="coerce").to_numpy(float)
+
+    # Timestamps are parsed once here; gap/position lookups are binary searches
+
+    def _build_intervals(self) -> None:
+        self.intervals_by_driver: dict[int, list[dict]] = {}
+        self.interval_index: dict[int, TimeIndex] = {}
+        self._extend_intervals(0)
+
+    # Live payloads may grow while a table is built off the event loop, so
+    # only rows up to the recorded size are read
+
+    def _extend_intervals(self, start: int) -> None:
+        rows = self.raw["intervals"][start:self._sizes["intervals"]]
+        _append_groups(self.intervals_by_driver, _group_rows(rows))
+        ts = _parse_ts([r.get("date") for r in rows])
+        _merge_indexes(self.interval_index, _time_indexes(rows, ts, "interval", True))
+
+    def _build_position(self) -> None:
+        self.position_by_driver: dict[int, list[dict]] = {}
+        self.position_index: dict[int, TimeIndex] = {}
+        self._extend_position(0)
+
+    def _extend_position(self, start: int) -> None:
+        rows = self.raw["position"][start:self._sizes["position"]]
+        _append_groups(self.position_by_driver, _group_rows(rows))
+        ts = _parse_ts([r.get("date") for r in rows])
+        _merge_indexes(self.position_index, _time_indexes(rows, ts, "position", False))
+
+    def _build_weather(self) -> None:
+        self.weather = self.raw["weather"]
+
+    def _extend_weather(self, start: int) -> None:
+        pass  # self.weather is the payload list itself
+
+    def _build_drivers(self) -> None:
+        self.drivers = {
+            d["driver_number"]: d for d in self.raw["drivers"] if d.get("driver_number") is not None
+        }
+
+    def changed(self, payloads: dict[str, list[dict]]) -> bool:
+        """Whether `update` would change anything (cheap, no parsing)."""
+        return any(
+            rows is not self.raw[name] or len(rows) != self._sizes[name]
+            for name, rows in payloads.items()
+        )
+
+    def update(self, payloads: dict[str, list[dict]]) -> bool:
+        """Bring the frame up to date with newer payloads; False if unchanged.
+
+        Live sessions hand back the same list with rows appended for the
+        time-series tables, which are extended in place (only the new rows
+        are parsed).  Any other change rebuilds just that table.  Derived
+        tables that depend on a changed table are dropped.
+        """
+        with self.lock:
+            return self._update(payloads)
+
+    def _update(self, payloads: dict[str, list[dict]]) -> bool:
+        changed: set[str] = set()
+        for name, rows in payloads.items():
+            old_size = self._sizes[name]
+            if rows is self.raw[name] and len(rows) == old_size:
+                continue
+            appended = rows is self.raw[name] and len(rows) > old_size
+            self.raw[name] = rows
+            self._sizes[name] = len(rows)
+            if appended and name in APPENDABLE_TABLES:
+                getattr(self, f"_extend_{name}")(old_size)
+            else:
+                getattr(self, f"_build_{name}")()
+            changed.add(name)
+        if changed:
+            self.version += 1
+            self._derived = OrderedDict(
+                (key, entry) for key, entry in self._derived.items() if not entry[0] & changed
+            )
+        return bool(changed)
+
+    @property
+    def data_version(self) -> str:
+        """Changes whenever the data behind this session's results does."""
+        return f"{self._uid}.{self.version}"
+
+    async def compute(self, fn: Callable[..., T], *args: Any) -> T:
+        """fn(self, *args) on the compute pool, holding the frame's lock."""
+        return await compute.run(self._locked, fn, *args)
+
+    def _locked(self, fn: Callable[..., T], *args: Any) -> T:
+        with self.lock:
+            return fn(self, *args)
+
+    # --- lookups -------------------------------------------------------------
+
+    def derived(
+        self,
+        name: str,
+        build: Callable[[SessionFrame], Any],
+        depends: Iterable[str] = TABLES,
+    ) -> Any:
+        """Memoize a table derived from this frame's data.
+
+        `depends` names the tables it's computed from; the entry is dropped
+        when any of them changes.  At most _MAX_DERIVED entries are kept.
+        """
+        entry = self._derived.get(name)
+        if entry is not None:
+            self._derived.move_to_end(name)
+            return entry[1]
+        value = build(self)
+        self._derived[name] = (frozenset(depends), value)
+        while len(self._derived) > _MAX_DERIVED:
+            self._derived.popitem(last=False)
+        return value
+
+    def laps_for(self, driver_number: int) -> pd.DataFrame:
+        """All lap rows for a driver, in payload order."""
+        rows = self._lap_rows.get(driver_number)
+        if rows is None:
+            return self.laps.iloc[0:0]
+        return self.laps.iloc[rows]
+
+    def lap_rows(self, driver_number: int) -> np.ndarray:
+        """Positional row indexes of a driver's laps."""
+        return self._lap_rows.get(driver_number, np.empty(0, dtype=np.intp))
+
+    def intervals_for(self, driver_number: int) -> list[dict]:
+        return self.intervals_by_driver.get(driver_number, [])
+
+    def stints_for(self, driver_number: int) -> list[dict]:
+        return self.stints_by_driver.get(driver_number, [])
+
+    def lap_start_times(self, driver_number: int | None, laps: np.ndarray) -> np.ndarray:
+        """Start timestamp (ns) of each lap, NO_TIME where unknown.
+
+        With a driver, uses that driver's laps; otherwise the first row for
+        the lap number in payload order.
+        """
+        starts = (
+            self._lap_start_any if driver_number is None
+            else self._lap_start_by_driver.get(driver_number, {})
+        )
+        return np.array([starts.get(int(lap), NO_TIME) for lap in laps], dtype=np.int64)
+
+    def positions_at_lap(self, lap: int | None) -> dict[int, Any] | None:
+        """driver_number -> position closest to the start of a lap.
+
+        Returns None when the lap can't be located in time, so callers can
+        fall back to the latest positions.
+        """
+        if lap is None:
+            return None
+        target = self.lap_start_times(None, np.array([lap]))
+        if target[0] == NO_TIME:
+            return None
+
+        result: dict[int, Any] = {}
+        for dn, index in self.position_index.items():
+            pos = index.at(target)[0]
+            result[dn] = None if np.isnan(pos) else int(pos)
+        return result
+
+    def latest_positions(self) -> dict[int, int]:
+        latest: dict[int, int] = {}
+        for p in self.raw["position"]:
+            dn = p.get("driver_number")
+            pos = p.get("position")
+            if dn is not None and pos is not None:
+                latest[dn] = pos
+        return latest
+
+
+# Frames hold on to their payloads, so keep only the most recently used few
+_MAX_FRAMES = int(os.environ.get("SESSION_FRAME_CACHE_SIZE", 8))
+
+# session_key -> frame; rebuilt only when the client hands back new payloads
+_frames: OrderedDict[int, SessionFrame] = OrderedDict()
+# Distinguishes a rebuilt frame from the one it replaced in data_version
+_frame_ids = itertools.count(1)
+# One build/update per session at a time; each runs off the event loop.
+# A session's lock exists only while callers hold or wait on it, so
+# sessions evicted from _frames (or never built) leave nothing behind
+_frame_locks: dict[int, tuple[asyncio.Lock, int]] = {}
+
+
+@asynccontextmanager
+async def _frame_lock(session_key: int) -> AsyncIterator[None]:
+    lock, users = _frame_locks.get(session_key, (None, 0))
+    if lock is None:
+        lock = asyncio.Lock()
+    _frame_locks[session_key] = (lock, users + 1)
+    try:
+        async with lock:
+            yield
+    finally:
+        lock, users = _frame_locks[session_key]
+        if users == 1:
+            del _frame_locks[session_key]
+        else:
+            _frame_locks[session_key] = (lock, users - 1)
+
+
+async def get_session_frame(client: OpenF1Client, session_key: int) -> SessionFrame:
+    """Return the SessionFrame for a session, building it on first use.
+
+    The OpenF1 client returns the same cached list object until an entry is
+    refreshed (or, for live sessions, appends to it), so identity and
+    length of the payloads tell us which tables need updating.
+    """
+    # Looked up first so the client knows whether the session has finished
+    # before deciding how long (and whether to persist) the payloads below
+    with timing.stage("fetch"):
+        await client.get_sessions(session_key=session_key)
+        laps, stints, intervals, pit, weather, position, drivers = await asyncio.gather(
+            client.get_laps(session_key=session_key),
+            client.get_stints(session_key=session_key),
+            client.get_intervals(session_key=session_key),
+            client.get_pit(session_key=session_key),
+            client.get_weather(session_key=session_key),
+            client.get_position(session_key=session_key),
+            client.get_drivers(session_key=session_key),
+        )
+    payloads = {
+        "laps": laps,
+        "stints": stints,
+        "intervals": intervals,
+        "pit": pit,
+        "weather": weather,
+        "position": position,
+        "drivers": drivers,
+    }
+    async with _frame_lock(session_key):
+        frame = _frames.get(session_key)
+        if frame is not None:
+            if frame.changed(payloads):
+                with timing.stage("frame"):
+                    await compute.run(frame.update, payloads)
+            if session_key in _frames:
+                _frames.move_to_end(session_key)
+            return frame
+        with timing.stage("frame"):
+            frame = await compute.run(SessionFrame, session_key, payloads)
+        _frames[session_key] = frame
+        while len(_frames) > _MAX_FRAMES:
+            _frames.popitem(last=False)
+    return frame
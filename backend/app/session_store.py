@@ -0,0 +1,64 @@
+from __future__ import annotations
+
+import os
+import sqlite3
+import threading
+import time
+import zlib
+
+
+class SessionStore:
+    """On-disk store of raw OpenF1 responses, keyed by request URL.
+
+    Only responses that can never change (finished sessions, past seasons)
+    are written, so entries are kept forever.  Bodies are stored as
+    zlib-compressed JSON bytes and parsed lazily by the client when a URL
+    is first requested after a restart.
+
+    Calls are blocking; the client runs them in a worker thread.
+    """
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS responses ("
+            " url TEXT PRIMARY KEY,"
+            " session_key TEXT,"
+            " stored_at REAL NOT NULL,"
+            " body BLOB NOT NULL)"
+        )
+        self._db.execute(
+            "CREATE INDEX IF NOT EXISTS responses_session ON responses (session_key)"
+        )
+        self._db.commit()
+
+    def get(self, url: str) -> bytes | None:
+        with self._lock:
+            row = self._db.execute(
+                "SELECT body FROM responses WHERE url = ?", (url,)
+            ).fetchone()
+        return zlib.decompress(row[0]) if row else None
+
+    def put(self, url: str, session_key: str | None, body: bytes) -> None:
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO responses (url, session_key, stored_at, body)"
+                " VALUES (?, ?, ?, ?)",
+                (url, session_key, time.time(), zlib.compress(body)),
+            )
+            self._db.commit()
+
+    def sessions(self) -> list[str]:
+        """session_keys that have at least one stored response."""
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT DISTINCT session_key FROM responses WHERE session_key IS NOT NULL"
+            ).fetchall()
+        return [r[0] for r in rows]
+
+    def close(self) -> None:
+        with self._lock:
+            self._db.close()
@@ -1,20 +1,28 @@
 from __future__ import annotations
 
-import asyncio
-import statistics
-from typing import Any
+from typing import Any, Callable
 
+import numpy as np
 import pandas as pd
 
+from . import monte_carlo, timing
+from .degradation import DegradationModel
+from .downsample import downsample_rows
 from .models import (
     DriverInfo,
     GapEntry,
     LapData,
     StintData,
+    UndercutMatrix,
     UndercutResult,
+    UndercutScalars,
+    UndercutSeries,
+    UndercutSimulation,
+    UndercutTimeline,
     WeatherEntry,
 )
 from .openf1_client import OpenF1Client
+from .session_frame import SessionFrame, get_session_frame
 
 UNDERCUT_WINDOW_THRESHOLD = 1.5  # seconds
 OUTLIER_FACTOR = 1.2
@@ -22,19 +30,128 @@ OUTLIER_FACTOR = 1.2
 RESPONSE_LAPS = 2
 
 
+class _PitLossIndex:
+    """Cumulative pit-lane durations ordered by lap, for "as of lap N" means."""
+
+    def __init__(self, frame: SessionFrame) -> None:
+        lane = frame.pit_lane_duration
+        has_lane = ~np.isnan(lane)
+        self.total_sum = float(lane[has_lane].sum())
+        self.total_count = int(has_lane.sum())
+
+        dated = ~np.isnan(frame.pit_lap)
+        order = np.argsort(frame.pit_lap[dated], kind="stable")
+        self.laps = frame.pit_lap[dated][order]
+        lane_sorted = lane[dated][order]
+        self.lanes = lane[has_lane]
+        self.lanes_by_lap = lane_sorted
+        self.cum_sum = np.concatenate(([0.0], np.cumsum(np.nan_to_num(lane_sorted))))
+        self.cum_count = np.concatenate(([0], np.cumsum(~np.isnan(lane_sorted))))
+
+    def mean(self, at_lap: int | None) -> float | None:
+        total, count = self.total_sum, self.total_count
+        if at_lap is not None:
+            k = int(np.searchsorted(self.laps, at_lap, side="right"))
+            # No stops yet by at_lap: fall back to the whole session
+            if k:
+                total, count = float(self.cum_sum[k]), int(self.cum_count[k])
+        return total / count if count else None
+
+    def means(self, laps: np.ndarray) -> np.ndarray:
+        """mean() at each of laps (NaN for None)."""
+        k = np.searchsorted(self.laps, laps, side="right")
+        total = np.where(k > 0, self.cum_sum[k], self.total_sum)
+        count = np.where(k > 0, self.cum_count[k], self.total_count)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            return np.where(count > 0, total / count, np.nan)
+
+    def samples(self, at_lap: int | None) -> np.ndarray:
+        """The pit-lane durations behind mean(at_lap)."""
+        if at_lap is not None:
+            k = int(np.searchsorted(self.laps, at_lap, side="right"))
+            if k:
+                lanes = self.lanes_by_lap[:k]
+                return lanes[~np.isnan(lanes)]
+        return self.lanes
+
+
+class _PaceIndex:
+    """One driver's clean-lap history, pre-solved for every "up to lap N".
+
+    Laps are the driver's timed, non-pit-out laps sorted by lap number.
+    For the first k of them the outlier threshold is OUTLIER_FACTOR times
+    their running mean (a prefix sum), and the race pace is the mean of
+    the last `last_n` laps under that threshold.  Both are computed for
+    every k at once, so a lookup is a binary search on the lap number.
+    """
+
+    def __init__(self, frame: SessionFrame, driver_number: int, last_n: int) -> None:
+        rows = frame.lap_rows(driver_number)
+        ok = (
+            ~np.isnan(frame.lap_duration[rows])
+            & ~frame.lap_pit_out[rows]
+            & ~np.isnan(frame.lap_number[rows])
+        )
+        rows = rows[ok]
+        order = np.argsort(frame.lap_number[rows], kind="stable")
+        self.rows = rows[order]
+        self.lap_numbers = frame.lap_number[self.rows]
+        durations = frame.lap_duration[self.rows]
+
+        n = durations.size
+        counts = np.arange(1, n + 1)
+        self.thresholds = OUTLIER_FACTOR * np.cumsum(durations) / counts
+
+        # keep[k, j]: lap j is clean when only the first k+1 laps are known
+        upto = np.tri(n, dtype=bool)
+        keep = upto & (durations[None, :] <= self.thresholds[:, None])
+        # Rank kept laps from the most recent backwards and take the last N
+        from_end = np.cumsum(keep[:, ::-1], axis=1)[:, ::-1]
+        tail = keep & (from_end <= last_n)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            self.pace = (tail * durations[None, :]).sum(axis=1) / tail.sum(axis=1)
+
+    def known(self, up_to_lap: int | None) -> int:
+        """Number of clean-lap candidates at or before up_to_lap."""
+        if up_to_lap is None:
+            return self.lap_numbers.size
+        return int(np.searchsorted(self.lap_numbers, up_to_lap, side="right"))
+
+
+def _pace_index(frame: SessionFrame, driver_number: int, last_n: int = 3) -> _PaceIndex:
+    indexes = frame.derived(f"pace_index:{last_n}", lambda f: {}, depends=("laps",))
+    if driver_number not in indexes:
+        indexes[driver_number] = _PaceIndex(frame, driver_number, last_n)
+    return indexes[driver_number]
+
+
+def _pit_loss_index(frame: SessionFrame) -> _PitLossIndex:
+    return frame.derived("pit_loss_index", _PitLossIndex, depends=("pit",))
+
+
+def _mean_pit_loss(frame: SessionFrame, at_lap: int | None = None) -> float | None:
+    return _pit_loss_index(frame).mean(at_lap)
+
+
 async def calculate_mean_pit_loss(
     client: OpenF1Client, session_key: int, at_lap: int | None = None
 ) -> float | None:
     """Average lane_duration for the session, optionally only pits up to at_lap."""
-    pits = await client.get_pit(session_key=session_key)
-    if at_lap is not None:
-        pits_filtered = [p for p in pits if p.get("lap_number") is not None and p["lap_number"] <= at_lap]
-        if pits_filtered:
-            pits = pits_filtered
-    durations = [p["lane_duration"] for p in pits if p.get("lane_duration") is not None]
-    if not durations:
-        return None
-    return statistics.mean(durations)
+    frame = await get_session_frame(client, session_key)
+    return await frame.compute(_mean_pit_loss, at_lap)
+
+
+def _clean_laps(
+    frame: SessionFrame, driver_number: int, up_to_lap: int | None = None
+) -> pd.DataFrame:
+    index = _pace_index(frame, driver_number)
+    k = index.known(up_to_lap)
+    if k == 0:
+        return frame.laps.iloc[0:0]
+    candidates = index.rows[:k]
+    rows = candidates[frame.lap_duration[candidates] <= index.thresholds[k - 1]]
+    # Keep payload order, as the raw rows came from OpenF1
+    return frame.laps.iloc[np.sort(rows)]
 
 
 async def get_clean_laps(
@@ -44,19 +161,41 @@ async def get_clean_laps(
     up_to_lap: int | None = None,
 ) -> pd.DataFrame:
     """Fetch laps for a driver with pit-out and outlier laps removed."""
-    raw = await client.get_laps(session_key=session_key, driver_number=driver_number)
-    if not raw:
+    frame = await get_session_frame(client, session_key)
+    if frame.laps.empty:
         return pd.DataFrame()
-    df = pd.DataFrame(raw)
-    if up_to_lap is not None:
-        df = df[df["lap_number"] <= up_to_lap]
-    df = df[df["lap_duration"].notna()]
-    df = df[df["is_pit_out_lap"] != True]  # noqa: E712
+    return await frame.compute(_clean_laps, driver_number, up_to_lap)
+
 
-    if not df.empty:
-        mean_dur = df["lap_duration"].mean()
-        df = df[df["lap_duration"] <= OUTLIER_FACTOR * mean_dur]
-    return df
+def _lap_residuals(
+    frame: SessionFrame, driver_number: int, up_to_lap: int | None = None, last_n: int = 10
+) -> np.ndarray:
+    """How the driver's last N clean laps deviate from their mean, for sampling lap-to-lap variation.
+
+    In-laps and traffic laps pass the 120 % outlier filter but aren't
+    ordinary variation, so laps more than 3 MADs from the median are left out.
+    """
+    index = _pace_index(frame, driver_number)
+    k = index.known(up_to_lap)
+    if k == 0:
+        return np.empty(0)
+    durations = frame.lap_duration[index.rows[:k]]
+    recent = durations[durations <= index.thresholds[k - 1]][-last_n:]
+    deviation = recent - np.median(recent)
+    mad = np.median(np.abs(deviation))
+    if mad > 0:
+        recent = recent[np.abs(deviation) <= 3 * 1.4826 * mad]
+    return recent - recent.mean()
+
+
+def _race_pace(
+    frame: SessionFrame, driver_number: int, last_n: int = 3, up_to_lap: int | None = None
+) -> float | None:
+    index = _pace_index(frame, driver_number, last_n)
+    k = index.known(up_to_lap)
+    if k == 0:
+        return None
+    return float(index.pace[k - 1])
 
 
 async def get_driver_race_pace(
@@ -67,11 +206,41 @@ async def get_driver_race_pace(
     up_to_lap: int | None = None,
 ) -> float | None:
     """Mean of the driver's last N clean laps (up to a given lap)."""
-    df = await get_clean_laps(client, session_key, driver_number, up_to_lap=up_to_lap)
-    if df.empty:
+    frame = await get_session_frame(client, session_key)
+    return await frame.compute(_race_pace, driver_number, last_n, up_to_lap)
+
+
+def _fresh_laps(frame: SessionFrame) -> pd.DataFrame:
+    """Clean laps from the first 4 laps (lap_start .. lap_start + 3) of every stint.
+
+    One row per (stint, lap) with the stint's driver, upper-cased compound
+    and the lap time, built by joining stints to laps on driver and
+    filtering on the lap range.
+    """
+    ok = ~np.isnan(frame.lap_duration) & ~frame.lap_pit_out & ~np.isnan(frame.lap_number)
+    laps = pd.DataFrame({
+        "driver_number": frame.lap_driver[ok],
+        "lap_number": frame.lap_number[ok],
+        "lap_duration": frame.lap_duration[ok],
+    })
+    stints = pd.DataFrame({
+        "driver_number": pd.to_numeric(frame.stints["driver_number"], errors="coerce"),
+        "lap_start": pd.to_numeric(frame.stints["lap_start"], errors="coerce"),
+        "compound": frame.stints["compound"].fillna("").astype(str).str.upper(),
+    })
+    joined = stints.merge(laps, on="driver_number")
+    in_range = (joined["lap_number"] >= joined["lap_start"]) & (
+        joined["lap_number"] <= joined["lap_start"] + 3
+    )
+    return joined.loc[in_range, ["driver_number", "compound", "lap_duration"]]
+
+
+def _outlier_filtered_mean(times: np.ndarray) -> float | None:
+    if times.size == 0:
         return None
-    tail = df.sort_values("lap_number").tail(last_n)
-    return float(tail["lap_duration"].mean())
+    mean_t = times.mean()
+    filtered = times[times <= OUTLIER_FACTOR * mean_t]
+    return float(filtered.mean()) if filtered.size else float(mean_t)
 
 
 async def get_fresh_tyre_pace(
@@ -87,109 +256,55 @@ async def get_fresh_tyre_pace(
     degraded pace to measure how much time fresh rubber is worth.
     Falls back to field data for the compound if the driver has no stint data.
     """
-    all_laps_raw = await client.get_laps(
-        session_key=session_key, driver_number=driver_number
-    )
-    stints_raw = await client.get_stints(session_key=session_key)
-    if not all_laps_raw or not stints_raw:
-        return None
+    frame = await get_session_frame(client, session_key)
+    return await frame.compute(_fresh_tyre_pace, driver_number, compound)
 
-    laps_df = pd.DataFrame(all_laps_raw)
-    stints_df = pd.DataFrame(stints_raw)
 
-    driver_stints = stints_df[stints_df["driver_number"] == driver_number]
-    if compound:
-        compound_stints = driver_stints[
-            driver_stints["compound"].str.upper() == compound.upper()
-        ]
-        if not compound_stints.empty:
-            driver_stints = compound_stints
+def _fresh_tyre_pace(
+    frame: SessionFrame, driver_number: int, compound: str | None
+) -> float | None:
+    if frame.lap_rows(driver_number).size == 0 or frame.stints.empty:
+        return None
 
+    driver_stints = frame.stints[frame.stints["driver_number"] == driver_number]
     if driver_stints.empty:
-        return await _field_fresh_pace(client, session_key, compound)
-
-    # Collect the first 3 clean racing laps of each stint
-    fresh_times: list[float] = []
-    for _, stint in driver_stints.iterrows():
-        lap_start = stint["lap_start"]
-        early_laps = laps_df[
-            (laps_df["lap_number"] >= lap_start)
-            & (laps_df["lap_number"] <= lap_start + 3)
-            & (laps_df["is_pit_out_lap"] != True)  # noqa: E712
-            & (laps_df["lap_duration"].notna())
-        ]
-        fresh_times.extend(early_laps["lap_duration"].tolist())
+        return _field_fresh_pace(frame, compound)
 
-    if not fresh_times:
-        return await _field_fresh_pace(client, session_key, compound)
+    fresh = frame.derived("fresh_laps", _fresh_laps, depends=("laps", "stints"))
+    fresh = fresh[fresh["driver_number"] == driver_number]
+    if compound:
+        # Only narrow to the compound if the driver actually ran it
+        has_compound = (
+            driver_stints["compound"].fillna("").astype(str).str.upper() == compound.upper()
+        ).any()
+        if has_compound:
+            fresh = fresh[fresh["compound"] == compound.upper()]
 
-    mean_t = statistics.mean(fresh_times)
-    filtered = [t for t in fresh_times if t <= OUTLIER_FACTOR * mean_t]
-    return statistics.mean(filtered) if filtered else mean_t
+    if fresh.empty:
+        return _field_fresh_pace(frame, compound)
+    return _outlier_filtered_mean(fresh["lap_duration"].to_numpy())
 
 
-async def _field_fresh_pace(
-    client: OpenF1Client, session_key: int, compound: str | None,
-) -> float | None:
+def _field_fresh_pace(frame: SessionFrame, compound: str | None) -> float | None:
     """Fallback: field-wide fresh-tyre pace for a compound."""
-    all_laps_raw = await client.get_laps(session_key=session_key)
-    stints_raw = await client.get_stints(session_key=session_key)
-    if not all_laps_raw or not stints_raw:
+    if frame.laps.empty or frame.stints.empty:
         return None
 
-    laps_df = pd.DataFrame(all_laps_raw)
-    stints_df = pd.DataFrame(stints_raw)
+    fresh = frame.derived("fresh_laps", _fresh_laps, depends=("laps", "stints"))
     if compound:
-        stints_df = stints_df[stints_df["compound"].str.upper() == compound.upper()]
-
-    fresh_times: list[float] = []
-    for _, stint in stints_df.iterrows():
-        dn = stint["driver_number"]
-        lap_start = stint["lap_start"]
-        early = laps_df[
-            (laps_df["driver_number"] == dn)
-            & (laps_df["lap_number"] >= lap_start)
-            & (laps_df["lap_number"] <= lap_start + 3)
-            & (laps_df["is_pit_out_lap"] != True)  # noqa: E712
-            & (laps_df["lap_duration"].notna())
-        ]
-        fresh_times.extend(early["lap_duration"].tolist())
+        fresh = fresh[fresh["compound"] == compound.upper()]
+    return _outlier_filtered_mean(fresh["lap_duration"].to_numpy())
 
-    if not fresh_times:
-        return None
-    mean_t = statistics.mean(fresh_times)
-    filtered = [t for t in fresh_times if t <= OUTLIER_FACTOR * mean_t]
-    return statistics.mean(filtered) if filtered else mean_t
 
+def _optional(value: float) -> float | None:
+    return None if np.isnan(value) else float(value)
 
-async def _get_gap_at_lap(
-    client: OpenF1Client,
-    session_key: int,
-    chaser_number: int,
-    leader_number: int,
-    at_lap: int,
-    all_laps_leader: list[dict],
-    all_laps_chaser: list[dict],
-    gap_history_raw: list[dict],
-) -> float | None:
-    """Find the interval between two drivers at a specific lap."""
-    chaser_lap = next(
-        (l for l in all_laps_chaser if l.get("lap_number") == at_lap and l.get("date_start")),
-        None,
-    )
-    if chaser_lap and chaser_lap.get("date_start"):
-        target_ts = chaser_lap["date_start"]
-        best: dict | None = None
-        best_diff = float("inf")
-        for entry in gap_history_raw:
-            if entry.get("date") and isinstance(entry.get("interval"), (int, float)):
-                diff = abs(_ts_diff(entry["date"], target_ts))
-                if diff < best_diff:
-                    best_diff = diff
-                    best = entry
-        if best is not None and isinstance(best.get("interval"), (int, float)):
-            return float(best["interval"])
 
+def _rounded(values: np.ndarray | None, digits: int = 3) -> list[float] | None:
+    return None if values is None else [round(float(v), digits) for v in values]
+
+
+def _latest_gap(gap_history_raw: list[dict]) -> float | None:
     for entry in reversed(gap_history_raw):
         val = entry.get("interval")
         if isinstance(val, (int, float)):
@@ -197,39 +312,75 @@ async def _get_gap_at_lap(
     return None
 
 
-def _ts_diff(a: str, b: str) -> float:
-    """Approximate seconds difference between two ISO timestamps."""
-    from datetime import datetime
-    try:
-        ta = datetime.fromisoformat(a.replace("Z", "+00:00"))
-        tb = datetime.fromisoformat(b.replace("Z", "+00:00"))
-        return (ta - tb).total_seconds()
-    except Exception:
-        return float("inf")
+def _gaps_at_laps(frame: SessionFrame, chaser_number: int, laps: np.ndarray) -> np.ndarray:
+    """The chaser's interval at the start of each lap (NaN where there is no gap).
+
+    Uses the interval sample nearest to the chaser's lap start, falling back
+    to the latest interval when the lap can't be located in time.
+    """
+    latest = _latest_gap(frame.intervals_for(chaser_number))
+    gaps = np.full(laps.size, np.nan if latest is None else latest)
+    index = frame.interval_index.get(chaser_number)
+    if index is None or laps.size == 0:
+        return gaps
+    nearest = index.at(frame.lap_start_times(chaser_number, laps))
+    return np.where(np.isnan(nearest), gaps, nearest)
+
+
+def _gap_at_lap(frame: SessionFrame, chaser_number: int, at_lap: int) -> float | None:
+    """Find the interval between the chaser and the car ahead at a specific lap."""
+    return _optional(_gaps_at_laps(frame, chaser_number, np.array([at_lap]))[0])
+
+
+def _paces_at_laps(frame: SessionFrame, driver_number: int, laps: np.ndarray) -> np.ndarray:
+    """Vectorized _race_pace over many laps (NaN where there is no pace)."""
+    index = _pace_index(frame, driver_number)
+    if index.pace.size == 0:
+        return np.full(laps.size, np.nan)
+    k = np.searchsorted(index.lap_numbers, laps, side="right")
+    return np.where(k > 0, index.pace[np.maximum(k - 1, 0)], np.nan)
 
 
 async def get_current_gap(
     client: OpenF1Client, session_key: int, driver_number: int
 ) -> float | None:
     """Latest interval value for the driver."""
-    intervals = await client.get_intervals(
-        session_key=session_key, driver_number=driver_number
-    )
-    if not intervals:
-        return None
-    for entry in reversed(intervals):
-        val = entry.get("interval")
-        if isinstance(val, (int, float)):
-            return float(val)
-    return None
+    frame = await get_session_frame(client, session_key)
+    return _latest_gap(frame.intervals_for(driver_number))
+
+
+def _gap_rows(frame: SessionFrame, driver_number: int, max_points: int | None) -> list[dict]:
+    """A driver's interval samples, LTTB-thinned to max_points for charts.
+
+    Thinned rows aren't memoized on the frame: max_points is up to the
+    client, so responses built from them are left to the result cache.
+    """
+    rows = frame.intervals_for(driver_number)
+    if max_points is None:
+        return rows
+    return downsample_rows(rows, "interval", max_points)
+
+
+def _weather_rows(frame: SessionFrame, max_points: int | None) -> list[dict]:
+    """Weather samples, LTTB-thinned on track temperature to max_points."""
+    if max_points is None:
+        return frame.weather
+    return downsample_rows(frame.weather, "track_temperature", max_points)
 
 
 async def get_gap_history(
-    client: OpenF1Client, session_key: int, driver_number: int
+    client: OpenF1Client, session_key: int, driver_number: int, max_points: int | None = None,
 ) -> list[dict]:
-    return await client.get_intervals(
-        session_key=session_key, driver_number=driver_number
-    )
+    """Interval samples for a driver; max_points thins them for display only."""
+    frame = await get_session_frame(client, session_key)
+    return await frame.compute(_gap_rows, driver_number, max_points)
+
+
+async def get_weather_history(
+    client: OpenF1Client, session_key: int, max_points: int | None = None,
+) -> list[dict]:
+    frame = await get_session_frame(client, session_key)
+    return await frame.compute(_weather_rows, max_points)
 
 
 def _stint_at_lap(stints: list[dict], driver_number: int, at_lap: int | None) -> dict | None:
@@ -244,6 +395,23 @@ def _stint_at_lap(stints: list[dict], driver_number: int, at_lap: int | None) ->
     return max(driver_stints, key=lambda s: s.get("stint_number", 0))
 
 
+def _stints_at_laps(stints: list[dict], driver_number: int, laps: np.ndarray) -> list[dict | None]:
+    """_stint_at_lap for every lap at once."""
+    driver_stints = sorted(
+        (s for s in stints if s.get("driver_number") == driver_number),
+        key=lambda s: s.get("stint_number", 0),
+    )
+    if not driver_stints:
+        return [None] * laps.size
+    start = np.array([s.get("lap_start", 0) for s in driver_stints], dtype=float)
+    end = np.array([s.get("lap_end", 999) for s in driver_stints], dtype=float)
+    # First stint covering each lap; laps outside all of them get the latest stint
+    covers = (start[None, :] <= laps[:, None]) & (laps[:, None] <= end[None, :])
+    latest = max(range(len(driver_stints)), key=lambda i: driver_stints[i].get("stint_number", 0))
+    picked = np.where(covers.any(axis=1), covers.argmax(axis=1), latest)
+    return [driver_stints[i] for i in picked]
+
+
 def _probability_from_margin(margin: float | None) -> float:
     """Map undercut margin (seconds) to a 0-100 probability.
 
@@ -267,9 +435,198 @@ def _tyre_age_at_lap(stint: dict | None, at_lap: int | None) -> int | None:
     return base_age + max(0, laps_into_stint)
 
 
-async def get_pit_stop_advantage(
-    client: OpenF1Client, session_key: int, compound: str | None,
-) -> float | None:
+def _stop_advantages(frame: SessionFrame) -> pd.DataFrame:
+    """Fresh-tyre advantage of every pit stop in the session.
+
+    For each stint after the first, compares the last 3 clean laps before
+    the out-lap with the first 3 clean laps after it.  Clean laps are
+    sorted by (driver, lap) once, so every stint's windows are found with
+    a binary search instead of re-filtering the whole session.  Stops
+    whose windows are empty or outliers get a NaN advantage.
+    """
+    stints = frame.stints
+    new = stints[pd.to_numeric(stints["stint_number"], errors="coerce") > 1]
+    out = pd.DataFrame({
+        "driver_number": pd.to_numeric(new["driver_number"], errors="coerce").to_numpy(float),
+        "compound": new["compound"].fillna("").astype(str).str.upper().to_numpy(),
+        "advantage": np.nan,
+    })
+    if out.empty:
+        return out
+
+    ok = ~np.isnan(frame.lap_duration) & ~frame.lap_pit_out
+    drivers = frame.lap_driver[ok]
+    lap_numbers = frame.lap_number[ok]
+    durations = frame.lap_duration[ok]
+    order = np.lexsort((lap_numbers, drivers))
+    drivers, lap_numbers, durations = drivers[order], lap_numbers[order], durations[order]
+    if durations.size == 0:
+        return out
+
+    # Lap numbers are well below 10_000, so (driver, lap) packs into one sortable key
+    keys = drivers * 10_000 + lap_numbers
+    dn = out["driver_number"].to_numpy(float)
+    pit_lap = pd.to_numeric(new["lap_start"], errors="coerce").to_numpy(float)
+    driver_lo = np.searchsorted(keys, dn * 10_000 - 0.5, side="left")
+    driver_hi = np.searchsorted(keys, dn * 10_000 + 9_999.5, side="right")
+    before = np.searchsorted(keys, dn * 10_000 + pit_lap, side="left")
+    after = np.searchsorted(keys, dn * 10_000 + pit_lap, side="right")
+
+    window = np.arange(3)
+    pre_idx = before[:, None] - 3 + window
+    pre_ok = pre_idx >= driver_lo[:, None]
+    post_idx = after[:, None] + window
+    post_ok = post_idx < driver_hi[:, None]
+    last = durations.size - 1
+    pre_vals = np.where(pre_ok, durations[np.clip(pre_idx, 0, last)], 0.0)
+    post_vals = np.where(post_ok, durations[np.clip(post_idx, 0, last)], 0.0)
+    pre_n = pre_ok.sum(axis=1)
+    post_n = post_ok.sum(axis=1)
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        pre_mean = pre_vals.sum(axis=1) / pre_n
+        post_mean = post_vals.sum(axis=1) / post_n
+
+    # Sanity filter: ignore stops where either mean is an outlier
+    all_mean = np.nanmean(frame.lap_duration)
+    valid = (
+        (pre_n > 0) & (post_n > 0)
+        & (pre_mean <= OUTLIER_FACTOR * all_mean)
+        & (post_mean <= OUTLIER_FACTOR * all_mean)
+        & ~np.isnan(pit_lap)
+    )
+    out["advantage"] = np.where(valid, pre_mean - post_mean, np.nan)
+    return out
+
+
+def _advantage_table(frame: SessionFrame) -> dict[str | None, float | None]:
+    """Mean stop advantage per new compound, plus the field-wide mean under None."""
+    stops = _stop_advantages(frame)
+    table: dict[str | None, float | None] = {}
+    for key, group in [(None, stops), *stops.groupby("compound")]:
+        adv = group["advantage"].dropna()
+        table[key] = float(adv.mean()) if not adv.empty else None
+    return table
+
+
+def _advantage_samples(frame: SessionFrame) -> dict[str | None, np.ndarray]:
+    """Measured stop advantages per new compound, and all of them under None."""
+    stops = _stop_advantages(frame)
+    return {
+        key: group["advantage"].dropna().to_numpy(float)
+        for key, group in [(None, stops), *stops.groupby("compound")]
+    }
+
+
+def _stop_advantage_samples(frame: SessionFrame, compound: str | None) -> np.ndarray:
+    """The stops _pit_stop_advantage averages, with the same compound fallback."""
+    if frame.laps.empty or frame.stints.empty:
+        return np.empty(0)
+    samples = frame.derived("advantage_samples", _advantage_samples, depends=("laps", "stints"))
+    if compound and compound.upper() in samples:
+        return samples[compound.upper()]
+    return samples[None]
+
+
+def _simulate(
+    frame: SessionFrame,
+    leader_number: int,
+    chaser_number: int,
+    at_lap: int | None,
+    gap: float,
+    chaser_compound: str | None,
+    pace_delta: float,
+) -> UndercutSimulation:
+    """Monte Carlo undercut from this session's stops, pit lanes and lap times.
+
+    The measured stops give the spread of the per-lap gain; they're
+    centred on pace_delta, so the simulation agrees with the evaluation
+    on average whether that came from the degradation model or the stops.
+    """
+    # Seeded by what's evaluated, so repeats (and unchanged live data) agree
+    seed = [frame.session_key, leader_number, chaser_number, max(at_lap or 0, 0)]
+    stops = _stop_advantage_samples(frame, chaser_compound)
+    advantages = stops - stops.mean() + pace_delta if stops.size else np.array([pace_delta])
+    return monte_carlo.simulate_undercut(
+        gap,
+        RESPONSE_LAPS,
+        advantages=advantages,
+        leader_residuals=_lap_residuals(frame, leader_number, at_lap),
+        chaser_residuals=_lap_residuals(frame, chaser_number, at_lap),
+        pit_lanes=_pit_loss_index(frame).samples(at_lap),
+        seed=seed,
+    )
+
+
+def _degradation_model(frame: SessionFrame) -> DegradationModel:
+    """The session's tyre degradation fit, refit when laps or stints change."""
+    return frame.derived(
+        "degradation_model", lambda f: DegradationModel(f, OUTLIER_FACTOR), depends=("laps", "stints"),
+    )
+
+
+def _current_lap(frame: SessionFrame, at_lap: int | None) -> int | None:
+    """at_lap, capped at the latest lap anyone has started (the default)."""
+    laps = frame.lap_number[~np.isnan(frame.lap_number)]
+    if not laps.size:
+        return at_lap
+    latest = int(laps.max())
+    return latest if at_lap is None else min(at_lap, latest)
+
+
+def _projected_laps(
+    frame: SessionFrame, stint: dict | None, at_lap: int | None, fresh: bool,
+) -> np.ndarray | None:
+    """A driver's lap times over the RESPONSE_LAPS laps after the current one.
+
+    Staying out on the stint's tyres, or with fresh a new set of the same
+    compound fitted at the pit stop.  Predicted by the session's
+    degradation model from laps up to at_lap; None when it has no fit for
+    the driver or compound yet.
+    """
+    lap = _current_lap(frame, at_lap)
+    if stint is None or lap is None or stint.get("driver_number") is None:
+        return None
+    ahead = np.arange(1, RESPONSE_LAPS + 1)
+    if fresh:
+        ages = ahead - 1
+    else:
+        ages = stint.get("tyre_age_at_start", 0) + max(0, lap - stint.get("lap_start", 0)) + ahead
+    times = _degradation_model(frame).lap_times(
+        at_lap, stint["driver_number"], stint.get("compound"), ages, lap + ahead,
+    )
+    return None if times is None or np.isnan(times).any() else times
+
+
+def _projected_laps_at(
+    frame: SessionFrame, driver_number: int, stints: list[dict | None], laps: np.ndarray, fresh: bool,
+) -> np.ndarray:
+    """_projected_laps at every lap at once: one row per lap, NaN rows for None."""
+    latest = _current_lap(frame, None)
+    current = laps.astype(float) if latest is None else np.minimum(laps, latest).astype(float)
+    ahead = np.arange(1, RESPONSE_LAPS + 1)
+    if fresh:
+        ages = np.broadcast_to(ahead - 1, (laps.size, RESPONSE_LAPS)).astype(float)
+    else:
+        base = np.array([s.get("tyre_age_at_start", 0) if s else 0 for s in stints], dtype=float)
+        start = np.array([s.get("lap_start", 0) if s else 0 for s in stints], dtype=float)
+        ages = (base + np.maximum(0, current - start))[:, None] + ahead
+    compounds = [s.get("compound") if s else None for s in stints]
+    times = _degradation_model(frame).lap_times_at(
+        laps, driver_number, compounds, ages, current[:, None] + ahead,
+    )
+    times[np.isnan(times).any(axis=1)] = np.nan
+    return times
+
+
+def _degradation(frame: SessionFrame, stint: dict | None, at_lap: int | None) -> float | None:
+    """Fitted seconds per lap of tyre age on the stint's compound."""
+    if stint is None:
+        return None
+    return _degradation_model(frame).degradation(at_lap, stint.get("compound"))
+
+
+def _pit_stop_advantage(frame: SessionFrame, compound: str | None) -> float | None:
     """Measure the real fresh-tyre advantage by comparing driver pace
     before and after actual pit stops in this session.
 
@@ -282,126 +639,64 @@ async def get_pit_stop_advantage(
     the new compound).  This naturally accounts for fuel burn since the laps
     are only a few apart.
     """
-    all_laps = await client.get_laps(session_key=session_key)
-    stints_raw = await client.get_stints(session_key=session_key)
-    if not all_laps or not stints_raw:
+    if frame.laps.empty or frame.stints.empty:
         return None
+    table = frame.derived("advantage_table", _advantage_table, depends=("laps", "stints"))
+    # A compound nobody switched onto falls back to every stop in the session
+    if compound and compound.upper() in table:
+        return table[compound.upper()]
+    return table.get(None)
 
-    laps_df = pd.DataFrame(all_laps)
-    stints_df = pd.DataFrame(stints_raw)
-
-    # Only look at stints after the first (i.e. after a pit stop)
-    new_stints = stints_df[stints_df["stint_number"] > 1].copy()
-    if compound:
-        filtered = new_stints[new_stints["compound"].str.upper() == compound.upper()]
-        if not filtered.empty:
-            new_stints = filtered
-
-    advantages: list[float] = []
-    for _, stint in new_stints.iterrows():
-        dn = stint["driver_number"]
-        pit_lap = stint["lap_start"]  # the out-lap number
-
-        driver_laps = laps_df[
-            (laps_df["driver_number"] == dn)
-            & (laps_df["lap_duration"].notna())
-            & (laps_df["is_pit_out_lap"] != True)  # noqa: E712
-        ].sort_values("lap_number")
-
-        # Pre-stop: last 3 clean laps before the pit
-        pre = driver_laps[driver_laps["lap_number"] < pit_lap].tail(3)
-        # Post-stop: first 3 clean laps after the out-lap
-        post = driver_laps[driver_laps["lap_number"] > pit_lap].head(3)
-
-        if pre.empty or post.empty:
-            continue
 
-        pre_mean = pre["lap_duration"].mean()
-        post_mean = post["lap_duration"].mean()
-
-        # Sanity filter: ignore if either mean is an outlier
-        all_mean = laps_df[laps_df["lap_duration"].notna()]["lap_duration"].mean()
-        if pre_mean > OUTLIER_FACTOR * all_mean or post_mean > OUTLIER_FACTOR * all_mean:
-            continue
-
-        advantages.append(pre_mean - post_mean)
-
-    if not advantages:
-        return None
-
-    return statistics.mean(advantages)
+async def get_pit_stop_advantage(
+    client: OpenF1Client, session_key: int, compound: str | None,
+) -> float | None:
+    frame = await get_session_frame(client, session_key)
+    return await frame.compute(_pit_stop_advantage, compound)
 
 
-async def evaluate_undercut(
-    client: OpenF1Client,
-    session_key: int,
+def _undercut_scalars(
+    frame: SessionFrame,
     leader_number: int,
     chaser_number: int,
-    at_lap: int | None = None,
-) -> UndercutResult:
-    """Full undercut evaluation.
-
-    The undercut equation over RESPONSE_LAPS:
-      total_gain = RESPONSE_LAPS * (leader_degraded_pace - fresh_tyre_pace)
-      undercut_margin = total_gain - pit_loss - gap
-      Success ⟺ undercut_margin > 0
+    at_lap: int | None,
+    gap: float | None,
+    leader_pace: float | None,
+    chaser_pace: float | None,
+    simulate: bool = False,
+) -> UndercutScalars:
+    """Lap-dependent part of the evaluation, given the gap and both paces.
+
+    With simulate, the probability comes from a Monte Carlo simulation
+    (see monte_carlo) instead of the linear mapping of the margin.
     """
-
-    (
-        pit_loss,
-        leader_pace,
-        chaser_pace,
-        gap_history_raw,
-        stints_raw,
-        weather_raw,
-        leader_all_laps_raw,
-        chaser_all_laps_raw,
-        drivers_raw,
-    ) = await asyncio.gather(
-        calculate_mean_pit_loss(client, session_key, at_lap=at_lap),
-        get_driver_race_pace(client, session_key, leader_number, up_to_lap=at_lap),
-        get_driver_race_pace(client, session_key, chaser_number, up_to_lap=at_lap),
-        get_gap_history(client, session_key, chaser_number),
-        client.get_stints(session_key=session_key),
-        client.get_weather(session_key=session_key),
-        client.get_laps(session_key=session_key, driver_number=leader_number),
-        client.get_laps(session_key=session_key, driver_number=chaser_number),
-        client.get_drivers(session_key=session_key),
-    )
-
-    all_lap_numbers = [
-        l.get("lap_number", 0)
-        for l in leader_all_laps_raw + chaser_all_laps_raw
-        if l.get("lap_number")
-    ]
-    total_laps = max(all_lap_numbers) if all_lap_numbers else 0
-
-    # Gap
-    if at_lap is not None:
-        gap = await _get_gap_at_lap(
-            client, session_key, chaser_number, leader_number,
-            at_lap, leader_all_laps_raw, chaser_all_laps_raw, gap_history_raw,
-        )
-    else:
-        gap = None
-        for entry in reversed(gap_history_raw):
-            val = entry.get("interval")
-            if isinstance(val, (int, float)):
-                gap = float(val)
-                break
+    with timing.stage("pit_loss"):
+        pit_loss = _mean_pit_loss(frame, at_lap)
 
     # Stints
-    leader_stint = _stint_at_lap(stints_raw, leader_number, at_lap)
-    chaser_stint = _stint_at_lap(stints_raw, chaser_number, at_lap)
+    with timing.stage("stints"):
+        leader_stint = _stint_at_lap(frame.stints_for(leader_number), leader_number, at_lap)
+        chaser_stint = _stint_at_lap(frame.stints_for(chaser_number), chaser_number, at_lap)
     chaser_compound = chaser_stint["compound"] if chaser_stint else None
 
-    # Fresh-tyre advantage: measured from actual pit stops in this session.
-    # This is the per-lap gain a driver gets from fresh vs degraded tyres.
-    tyre_advantage = await get_pit_stop_advantage(client, session_key, chaser_compound)
-    fresh_pace = (leader_pace - tyre_advantage) if (leader_pace and tyre_advantage) else None
+    # Both cars over the response window from the degradation model: the
+    # leader stays out on ageing tyres, the chaser is on a new set
+    with timing.stage("degradation"):
+        leader_laps = _projected_laps(frame, leader_stint, at_lap, fresh=False)
+        chaser_laps = _projected_laps(frame, chaser_stint, at_lap, fresh=True)
 
-    # Pace delta per lap: how much the chaser gains per lap on fresh rubber
-    pace_delta = tyre_advantage  # positive = fresh tyres are faster per lap
+    if leader_laps is not None and chaser_laps is not None:
+        fresh_pace: float | None = float(chaser_laps[0])
+        # Pace delta per lap: how much the chaser gains per lap on fresh rubber
+        pace_delta: float | None = float((leader_laps - chaser_laps).mean())
+    else:
+        # No fit yet: fall back to the fresh-tyre advantage measured from
+        # actual pit stops in this session, the per-lap gain a driver gets
+        # from fresh vs degraded tyres
+        with timing.stage("advantage"):
+            tyre_advantage = _pit_stop_advantage(frame, chaser_compound)
+        fresh_pace = (leader_pace - tyre_advantage) if (leader_pace and tyre_advantage) else None
+        pace_delta = tyre_advantage  # positive = fresh tyres are faster per lap
 
     # Undercut margin over the response window.
     # Both drivers make the same pit stop so pit_loss cancels out.
@@ -414,53 +709,140 @@ async def evaluate_undercut(
         undercut_margin = total_gain - gap
 
     probability = _probability_from_margin(undercut_margin)
-    window_open = gap is not None and gap < UNDERCUT_WINDOW_THRESHOLD
-
-    def _to_lap_data(raw: list[dict]) -> list[LapData]:
-        out: list[LapData] = []
-        for r in raw:
-            if r.get("lap_number") is None:
-                continue
-            out.append(
-                LapData(
-                    lap_number=r["lap_number"],
-                    lap_duration=r.get("lap_duration"),
-                    is_pit_out_lap=r.get("is_pit_out_lap", False),
-                    duration_sector_1=r.get("duration_sector_1"),
-                    duration_sector_2=r.get("duration_sector_2"),
-                    duration_sector_3=r.get("duration_sector_3"),
-                    i1_speed=r.get("i1_speed"),
-                    st_speed=r.get("st_speed"),
-                )
+    simulation = None
+    if simulate and undercut_margin is not None:
+        with timing.stage("simulation"):
+            simulation = _simulate(
+                frame, leader_number, chaser_number, at_lap, gap, chaser_compound, pace_delta,
             )
-        return sorted(out, key=lambda l: l.lap_number)
+        probability = simulation.probability
+
+    with timing.stage("model"):
+        return UndercutScalars(
+            gap=gap,
+            pit_loss=pit_loss,
+            leader_pace=leader_pace,
+            chaser_pace=chaser_pace,
+            projected_outlap_pace=fresh_pace,
+            pace_delta=pace_delta,
+            undercut_margin=undercut_margin,
+            probability=probability,
+            window_open=gap is not None and gap < UNDERCUT_WINDOW_THRESHOLD,
+            leader_compound=leader_stint["compound"] if leader_stint else None,
+            chaser_compound=chaser_compound,
+            leader_tyre_age=_tyre_age_at_lap(leader_stint, at_lap),
+            chaser_tyre_age=_tyre_age_at_lap(chaser_stint, at_lap),
+            at_lap=at_lap,
+            projected_leader_laps=_rounded(leader_laps),
+            projected_chaser_laps=_rounded(chaser_laps),
+            leader_degradation=_degradation(frame, leader_stint, at_lap),
+            chaser_degradation=_degradation(frame, chaser_stint, at_lap),
+            simulation=simulation,
+        )
 
-    def _to_stint_data(raw: list[dict], dn: int) -> list[StintData]:
-        return [
-            StintData(
-                stint_number=s["stint_number"],
-                compound=s["compound"],
-                lap_start=s["lap_start"],
-                lap_end=s["lap_end"],
-                tyre_age_at_start=s.get("tyre_age_at_start", 0),
-                driver_number=s["driver_number"],
+
+def _evaluate_scalars(
+    frame: SessionFrame,
+    leader_number: int,
+    chaser_number: int,
+    at_lap: int | None,
+    simulate: bool = False,
+) -> UndercutScalars:
+    """Scalar evaluation at a lap, or at the latest data when at_lap is None."""
+    with timing.stage("gap"):
+        if at_lap is not None:
+            gap = _gap_at_lap(frame, chaser_number, at_lap)
+        else:
+            gap = _latest_gap(frame.intervals_for(chaser_number))
+
+    with timing.stage("pace"):
+        leader_pace = _race_pace(frame, leader_number, up_to_lap=at_lap)
+        chaser_pace = _race_pace(frame, chaser_number, up_to_lap=at_lap)
+
+    return _undercut_scalars(
+        frame, leader_number, chaser_number, at_lap,
+        gap=gap, leader_pace=leader_pace, chaser_pace=chaser_pace, simulate=simulate,
+    )
+
+
+def _total_laps(frame: SessionFrame, leader_number: int, chaser_number: int) -> int:
+    all_lap_numbers = [
+        l.get("lap_number", 0)
+        for dn in (leader_number, chaser_number)
+        for l in frame.laps_by_driver.get(dn, [])
+        if l.get("lap_number")
+    ]
+    return max(all_lap_numbers) if all_lap_numbers else 0
+
+
+def undercut_snapshot(
+    frame: SessionFrame, leader_number: int, chaser_number: int, simulate: bool = False,
+) -> dict[str, Any]:
+    """Scalar evaluation at the latest data, as pushed to live subscribers."""
+    scalars = _evaluate_scalars(frame, leader_number, chaser_number, None, simulate)
+    return {
+        **scalars.model_dump(),
+        "total_laps": _total_laps(frame, leader_number, chaser_number),
+    }
+
+
+def _to_lap_data(raw: list[dict]) -> list[LapData]:
+    out: list[LapData] = []
+    for r in raw:
+        if r.get("lap_number") is None:
+            continue
+        out.append(
+            LapData(
+                lap_number=r["lap_number"],
+                lap_duration=r.get("lap_duration"),
+                is_pit_out_lap=r.get("is_pit_out_lap", False),
+                duration_sector_1=r.get("duration_sector_1"),
+                duration_sector_2=r.get("duration_sector_2"),
+                duration_sector_3=r.get("duration_sector_3"),
+                i1_speed=r.get("i1_speed"),
+                st_speed=r.get("st_speed"),
             )
-            for s in raw
-            if s.get("driver_number") == dn
-        ]
+        )
+    return sorted(out, key=lambda l: l.lap_number)
+
+
+def _to_stint_data(raw: list[dict], dn: int) -> list[StintData]:
+    return [
+        StintData(
+            stint_number=s["stint_number"],
+            compound=s["compound"],
+            lap_start=s["lap_start"],
+            lap_end=s["lap_end"],
+            tyre_age_at_start=s.get("tyre_age_at_start", 0),
+            driver_number=s["driver_number"],
+        )
+        for s in raw
+        if s.get("driver_number") == dn
+    ]
 
-    def _driver_info(raw: list[dict], dn: int) -> DriverInfo | None:
-        for d in raw:
-            if d.get("driver_number") == dn:
-                return DriverInfo(
-                    driver_number=d["driver_number"],
-                    full_name=d.get("full_name", ""),
-                    name_acronym=d.get("name_acronym", ""),
-                    team_name=d.get("team_name"),
-                    team_colour=d.get("team_colour"),
-                    headshot_url=d.get("headshot_url"),
-                )
+
+def _driver_info(frame: SessionFrame, dn: int) -> DriverInfo | None:
+    d = frame.drivers.get(dn)
+    if d is None:
         return None
+    return DriverInfo(
+        driver_number=d["driver_number"],
+        full_name=d.get("full_name", ""),
+        name_acronym=d.get("name_acronym", ""),
+        team_name=d.get("team_name"),
+        team_colour=d.get("team_colour"),
+        headshot_url=d.get("headshot_url"),
+    )
+
+
+def _undercut_series(
+    frame: SessionFrame, leader_number: int, chaser_number: int, max_points: int | None = None,
+) -> UndercutSeries:
+    gap_history_raw = _gap_rows(frame, chaser_number, max_points)
+    stints_raw = frame.raw["stints"]
+    weather_raw = _weather_rows(frame, max_points)
+    leader_all_laps_raw = frame.laps_by_driver.get(leader_number, [])
+    chaser_all_laps_raw = frame.laps_by_driver.get(chaser_number, [])
 
     gap_history = [
         GapEntry(
@@ -485,28 +867,339 @@ async def evaluate_undercut(
         if w.get("date")
     ]
 
-    return UndercutResult(
-        gap=gap,
-        pit_loss=pit_loss,
-        leader_pace=leader_pace,
-        chaser_pace=chaser_pace,
-        projected_outlap_pace=fresh_pace,
-        pace_delta=pace_delta,
-        undercut_margin=undercut_margin,
-        probability=probability,
-        window_open=window_open,
-        leader_compound=leader_stint["compound"] if leader_stint else None,
-        chaser_compound=chaser_compound,
-        leader_tyre_age=_tyre_age_at_lap(leader_stint, at_lap),
-        chaser_tyre_age=_tyre_age_at_lap(chaser_stint, at_lap),
-        leader_info=_driver_info(drivers_raw, leader_number),
-        chaser_info=_driver_info(drivers_raw, chaser_number),
+    return UndercutSeries(
+        leader_info=_driver_info(frame, leader_number),
+        chaser_info=_driver_info(frame, chaser_number),
         laps_leader=_to_lap_data(leader_all_laps_raw),
         laps_chaser=_to_lap_data(chaser_all_laps_raw),
         stints_leader=_to_stint_data(stints_raw, leader_number),
         stints_chaser=_to_stint_data(stints_raw, chaser_number),
         gap_history=gap_history,
         weather=weather,
+        total_laps=_total_laps(frame, leader_number, chaser_number),
+    )
+
+
+def _series(
+    frame: SessionFrame, leader_number: int, chaser_number: int, max_points: int | None = None,
+) -> UndercutSeries:
+    with timing.stage("series"):
+        if max_points is not None:
+            return _undercut_series(frame, leader_number, chaser_number, max_points)
+        return frame.derived(
+            f"series:{leader_number}:{chaser_number}",
+            lambda f: _undercut_series(f, leader_number, chaser_number),
+        )
+
+
+async def data_version(client: OpenF1Client, session_key: int) -> str:
+    """Token that changes whenever results for the session could change."""
+    frame = await get_session_frame(client, session_key)
+    return frame.data_version
+
+
+async def get_undercut_series(
+    client: OpenF1Client,
+    session_key: int,
+    leader_number: int,
+    chaser_number: int,
+    max_points: int | None = None,
+) -> UndercutSeries:
+    """Lap times, stints, gap history and weather for a pair; the same at every lap.
+
+    max_points thins the gap history and weather for charting; the
+    undercut numbers are always computed from every sample.
+    """
+    frame = await get_session_frame(client, session_key)
+    return await frame.compute(_series, leader_number, chaser_number, max_points)
+
+
+async def evaluate_undercut(
+    client: OpenF1Client,
+    session_key: int,
+    leader_number: int,
+    chaser_number: int,
+    at_lap: int | None = None,
+    max_points: int | None = None,
+    simulate: bool = False,
+) -> UndercutResult:
+    """Full undercut evaluation.
+
+    The undercut equation over RESPONSE_LAPS:
+      total_gain = RESPONSE_LAPS * (leader_degraded_pace - fresh_tyre_pace)
+      undercut_margin = total_gain - pit_loss - gap
+      Success ⟺ undercut_margin > 0
+
+    Both paces are projected lap by lap from the session's degradation
+    model (see degradation), or taken from the measured pit-stop
+    advantage until it has a fit for both cars.
+
+    With simulate, the probability is a Monte Carlo estimate with a
+    confidence interval (see monte_carlo.simulate_undercut).
+    """
+
+    scalars, series = await evaluate_undercut_parts(
+        client, session_key, leader_number, chaser_number, at_lap, max_points, simulate
+    )
+    return UndercutResult.model_construct(
+        **dict(scalars), **dict(series),
+    )
+
+
+async def evaluate_undercut_parts(
+    client: OpenF1Client,
+    session_key: int,
+    leader_number: int,
+    chaser_number: int,
+    at_lap: int | None = None,
+    max_points: int | None = None,
+    simulate: bool = False,
+) -> tuple[UndercutScalars, UndercutSeries]:
+    """evaluate_undercut as its lap-dependent and lap-independent halves.
+
+    The full series half is memoized per pair, so callers that serialize
+    it separately only pay for it once per data version; a thinned one
+    (max_points) is rebuilt each time.
+    """
+    frame = await get_session_frame(client, session_key)
+    return await frame.compute(_parts, leader_number, chaser_number, at_lap, max_points, simulate)
+
+
+def _parts(
+    frame: SessionFrame,
+    leader_number: int,
+    chaser_number: int,
+    at_lap: int | None,
+    max_points: int | None,
+    simulate: bool = False,
+) -> tuple[UndercutScalars, UndercutSeries]:
+    return (
+        _evaluate_scalars(frame, leader_number, chaser_number, at_lap, simulate),
+        _series(frame, leader_number, chaser_number, max_points),
+    )
+
+
+async def evaluate_undercut_scalars(
+    client: OpenF1Client,
+    session_key: int,
+    leader_number: int,
+    chaser_number: int,
+    at_lap: int | None = None,
+    simulate: bool = False,
+) -> UndercutScalars:
+    """Just the lap-dependent numbers of evaluate_undercut, for lap scrubbing."""
+    frame = await get_session_frame(client, session_key)
+    return await frame.compute(_evaluate_scalars, leader_number, chaser_number, at_lap, simulate)
+
+
+def _timeline(frame: SessionFrame, leader_number: int, chaser_number: int) -> UndercutTimeline:
+    """_undercut_scalars for every lap of the race, computed as columns.
+
+    Each number is one array over the lap axis (the same lookups
+    _undercut_scalars makes for one lap, vectorized); the per-lap models
+    are only assembled from the columns at the end.
+    """
+    total_laps = _total_laps(frame, leader_number, chaser_number)
+    laps = np.arange(1, total_laps + 1)
+    with timing.stage("gap"):
+        gaps = _gaps_at_laps(frame, chaser_number, laps)
+    with timing.stage("pace"):
+        leader_paces = _paces_at_laps(frame, leader_number, laps)
+        chaser_paces = _paces_at_laps(frame, chaser_number, laps)
+    with timing.stage("pit_loss"):
+        pit_losses = _pit_loss_index(frame).means(laps)
+    with timing.stage("stints"):
+        leader_stints = _stints_at_laps(frame.stints_for(leader_number), leader_number, laps)
+        chaser_stints = _stints_at_laps(frame.stints_for(chaser_number), chaser_number, laps)
+    leader_compounds = [s["compound"] if s else None for s in leader_stints]
+    chaser_compounds = [s["compound"] if s else None for s in chaser_stints]
+
+    with timing.stage("degradation"):
+        leader_laps = _projected_laps_at(frame, leader_number, leader_stints, laps, fresh=False)
+        chaser_laps = _projected_laps_at(frame, chaser_number, chaser_stints, laps, fresh=True)
+        model = _degradation_model(frame)
+        leader_degradation = model.degradation_at(laps, leader_compounds)
+        chaser_degradation = model.degradation_at(laps, chaser_compounds)
+    leader_projected = ~np.isnan(leader_laps).any(axis=1)
+    chaser_projected = ~np.isnan(chaser_laps).any(axis=1)
+    projected = leader_projected & chaser_projected
+
+    # Laps without a fit fall back to the measured stop advantage
+    with timing.stage("advantage"):
+        by_compound = {c: _pit_stop_advantage(frame, c) for c in set(chaser_compounds)}
+        advantages = np.array([by_compound[c] for c in chaser_compounds], dtype=float)
+    # As in _undercut_scalars, a zero pace or advantage gives no fresh pace
+    has_fallback = (np.nan_to_num(leader_paces) != 0) & (np.nan_to_num(advantages) != 0)
+    fresh_paces = np.where(
+        projected, chaser_laps[:, 0], np.where(has_fallback, leader_paces - advantages, np.nan),
+    )
+    pace_deltas = np.where(projected, (leader_laps - chaser_laps).mean(axis=1), advantages)
+    margins = RESPONSE_LAPS * pace_deltas - gaps
+    probabilities = _probabilities_from_margins(margins)
+    window_open = gaps < UNDERCUT_WINDOW_THRESHOLD
+
+    with timing.stage("model"):
+        return UndercutTimeline(
+            leader_number=leader_number,
+            chaser_number=chaser_number,
+            total_laps=total_laps,
+            laps=[
+                UndercutScalars.model_construct(
+                    gap=_optional(gaps[i]),
+                    pit_loss=_optional(pit_losses[i]),
+                    leader_pace=_optional(leader_paces[i]),
+                    chaser_pace=_optional(chaser_paces[i]),
+                    projected_outlap_pace=_optional(fresh_paces[i]),
+                    pace_delta=_optional(pace_deltas[i]),
+                    undercut_margin=_optional(margins[i]),
+                    probability=float(probabilities[i]),
+                    window_open=bool(window_open[i]),
+                    leader_compound=leader_compounds[i],
+                    chaser_compound=chaser_compounds[i],
+                    leader_tyre_age=_tyre_age_at_lap(leader_stints[i], int(lap)),
+                    chaser_tyre_age=_tyre_age_at_lap(chaser_stints[i], int(lap)),
+                    at_lap=int(lap),
+                    projected_leader_laps=_rounded(leader_laps[i]) if leader_projected[i] else None,
+                    projected_chaser_laps=_rounded(chaser_laps[i]) if chaser_projected[i] else None,
+                    leader_degradation=_optional(leader_degradation[i]),
+                    chaser_degradation=_optional(chaser_degradation[i]),
+                    simulation=None,
+                )
+                for i, lap in enumerate(laps)
+            ],
+        )
+
+
+async def get_undercut_timeline(
+    client: OpenF1Client,
+    session_key: int,
+    leader_number: int,
+    chaser_number: int,
+) -> UndercutTimeline:
+    """The lap-dependent undercut numbers for every lap of the race.
+
+    Equivalent to calling evaluate_undercut once per lap, but every
+    number is computed as an array over all laps at once, and the result
+    is memoized on the session frame.
+    """
+    frame = await get_session_frame(client, session_key)
+    return await frame.compute(_memoized_timeline, leader_number, chaser_number)
+
+
+def _memoized_timeline(
+    frame: SessionFrame, leader_number: int, chaser_number: int
+) -> UndercutTimeline:
+    return frame.derived(
+        f"timeline:{leader_number}:{chaser_number}",
+        lambda f: _timeline(f, leader_number, chaser_number),
+    )
+
+
+def _probabilities_from_margins(margins: np.ndarray) -> np.ndarray:
+    """Array form of _probability_from_margin (NaN margins map to 0 %)."""
+    clamped = np.clip(np.nan_to_num(margins, nan=-3.0), -3.0, 3.0)
+    return np.round((clamped + 3.0) / 6.0 * 100, 1)
+
+
+def _undercut_matrix(
+    frame: SessionFrame, at_lap: int | None, within: int | None
+) -> UndercutMatrix:
+    """Margin and probability for every (leader, chaser) pair at a lap.
+
+    Cars are ordered by position; the gap between any two is the sum of
+    the intervals of the cars from the leader's follower down to the
+    chaser, so adjacent pairs get exactly the gap evaluate_undercut uses.
+    Only pairs with the leader ahead (and, if `within` is given, no more
+    than `within` places ahead) are filled in.
+    """
+    positions = frame.positions_at_lap(at_lap)
+    if positions is None:
+        positions = frame.latest_positions()
+    ordered = sorted(
+        ((dn, pos) for dn, pos in positions.items() if pos is not None),
+        key=lambda x: x[1],
+    )
+    drivers = [dn for dn, _ in ordered]
+    n = len(drivers)
+
+    intervals = np.full(n, np.nan)
+    advantages = np.full(n, np.nan)
+    # Projected time over the response window staying out / on new tyres
+    held = np.full(n, np.nan)
+    fresh = np.full(n, np.nan)
+    compounds: list[str | None] = []
+    for i, dn in enumerate(drivers):
+        if at_lap is not None:
+            intervals[i] = _gaps_at_laps(frame, dn, np.array([at_lap]))[0]
+        else:
+            latest = _latest_gap(frame.intervals_for(dn))
+            intervals[i] = np.nan if latest is None else latest
+        stint = _stint_at_lap(frame.stints_for(dn), dn, at_lap)
+        compound = stint["compound"] if stint else None
+        compounds.append(compound)
+        adv = _pit_stop_advantage(frame, compound)
+        advantages[i] = np.nan if adv is None else adv
+        held_laps = _projected_laps(frame, stint, at_lap, fresh=False)
+        fresh_laps = _projected_laps(frame, stint, at_lap, fresh=True)
+        if held_laps is not None and fresh_laps is not None:
+            held[i], fresh[i] = held_laps.sum(), fresh_laps.sum()
+
+    # Cumulative interval from P1; the race leader's own interval is 0
+    steps = intervals.copy()
+    if n:
+        steps[0] = 0.0
+    behind_p1 = np.cumsum(steps)
+    gap = behind_p1[None, :] - behind_p1[:, None]
+
+    places = np.arange(n)
+    ahead_by = places[None, :] - places[:, None]
+    pair = ahead_by > 0
+    if within is not None:
+        pair &= ahead_by <= within
+
+    # As in evaluate_undercut: the degradation model's projection where
+    # both cars have a fit, the measured stop advantage otherwise
+    projected_gain = held[:, None] - fresh[None, :]
+    gain = np.where(np.isnan(projected_gain), RESPONSE_LAPS * advantages[None, :], projected_gain)
+    margin = gain - gap
+    probability = _probabilities_from_margins(margin)
+    window_open = gap < UNDERCUT_WINDOW_THRESHOLD
+
+    def _cells(values: np.ndarray, cast: Callable[[Any], Any]) -> list[list[Any]]:
+        return [
+            [cast(values[i, j]) if pair[i, j] else None for j in range(n)]
+            for i in range(n)
+        ]
+
+    return UndercutMatrix(
         at_lap=at_lap,
-        total_laps=total_laps,
+        drivers=drivers,
+        positions=[pos for _, pos in ordered],
+        compounds=compounds,
+        gap=_cells(gap, _optional),
+        margin=_cells(margin, _optional),
+        probability=_cells(probability, float),
+        window_open=_cells(window_open, bool),
     )
+
+
+async def get_undercut_matrix(
+    client: OpenF1Client,
+    session_key: int,
+    at_lap: int | None = None,
+    within: int | None = None,
+) -> UndercutMatrix:
+    """Undercut margin/probability for all on-track pairs at a lap.
+
+    Laps past the latest one are evaluated at the latest.  Results are
+    left to the result cache rather than memoized on the frame.
+    """
+    frame = await get_session_frame(client, session_key)
+    return await frame.compute(_clamped_matrix, at_lap, within)
+
+
+def _clamped_matrix(
+    frame: SessionFrame, at_lap: int | None, within: int | None
+) -> UndercutMatrix:
+    lap = at_lap if at_lap is None else _current_lap(frame, at_lap)
+    return _undercut_matrix(frame, lap, within)
@@ -0,0 +1,169 @@
+from __future__ import annotations
+
+import cProfile
+import os
+import pstats
+import random
+import re
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Callable, Iterator, TypeVar
+
+from fastapi import Request
+
+T = TypeVar("T")
+
+# Record stages for every request and send them as Server-Timing
+_ALWAYS = os.environ.get("SERVER_TIMING", "").lower() in ("1", "true", "yes")
+# Fraction of requests whose compute work is profiled with cProfile
+_PROFILE_SAMPLE_RATE = float(os.environ.get("PROFILE_SAMPLE_RATE", 0))
+# Where sampled profiles are written, as pstats files (snakeviz, pstats)
+_PROFILE_DIR = os.environ.get("PROFILE_DIR", "profiles")
+# Let clients ask for a profile with ?debug=true&profile=true
+_PROFILE_ON_REQUEST = os.environ.get("PROFILE_ON_REQUEST", "").lower() in ("1", "true", "yes")
+# Functions listed in a debug response's profile block
+_PROFILE_TOP = 15
+
+# Query parameters that switch instrumentation on; they don't change the
+# result, so the result cache ignores them
+QUERY_FLAGS = ("timing", "debug", "profile")
+
+
+class Timings:
+    """Seconds spent per named stage while handling one request.
+
+    A stage entered several times (e.g. once per lap) accumulates.  The
+    object is shared with compute-pool jobs started by the request (they
+    run in a copy of its context), so stages timed there land here too.
+    """
+
+    def __init__(self, profile: bool = False) -> None:
+        self.started = time.perf_counter()
+        self.stages: dict[str, float] = {}
+        # One profiler per compute job; cProfile can't span threads
+        self.profiles: list[cProfile.Profile] | None = [] if profile else None
+
+    def add(self, name: str, seconds: float) -> None:
+        self.stages[name] = self.stages.get(name, 0.0) + seconds
+
+    def as_ms(self) -> dict[str, float]:
+        """Stages in milliseconds, plus the total so far."""
+        out = {name: round(s * 1000, 3) for name, s in self.stages.items()}
+        out["total"] = round((time.perf_counter() - self.started) * 1000, 3)
+        return out
+
+    def server_timing(self) -> str:
+        """Value of a Server-Timing header."""
+        return ", ".join(f"{name};dur={ms}" for name, ms in self.as_ms().items())
+
+    def profile_stats(self) -> pstats.Stats | None:
+        if not self.profiles:
+            return None
+        stats = pstats.Stats(self.profiles[0])
+        for profile in self.profiles[1:]:
+            stats.add(profile)
+        return stats
+
+
+_current: ContextVar[Timings | None] = ContextVar("timings", default=None)
+
+
+def _flag(request: Request, name: str) -> bool:
+    return request.query_params.get(name, "").lower() in ("1", "true", "yes")
+
+
+def debug_requested(request: Request) -> bool:
+    """True if the client asked for the timing block in the response body."""
+    return _flag(request, "debug")
+
+
+def current() -> Timings | None:
+    return _current.get()
+
+
+@contextmanager
+def track(request: Request) -> Iterator[Timings | None]:
+    """Time the stages of the request handled in this block.
+
+    Recording is on with SERVER_TIMING, or for a request with ?timing=true
+    or ?debug=true.  A PROFILE_SAMPLE_RATE share of requests is profiled
+    too, as is one asking with ?profile=true if PROFILE_ON_REQUEST is set.
+    """
+    enabled = _flag(request, "timing") or debug_requested(request)
+    profile = (
+        (_PROFILE_ON_REQUEST and debug_requested(request) and _flag(request, "profile"))
+        or (_PROFILE_SAMPLE_RATE > 0 and random.random() < _PROFILE_SAMPLE_RATE)
+    )
+    if not (enabled or profile or _ALWAYS):
+        yield None
+        return
+    timings = Timings(profile)
+    token = _current.set(timings)
+    try:
+        yield timings
+    finally:
+        _current.reset(token)
+
+
+class stage:
+    """Attribute the time spent in a `with` block to a stage of the request.
+
+    A class rather than a generator so it costs next to nothing when the
+    request isn't being timed (it's entered once per lap in timelines).
+    """
+
+    __slots__ = ("name", "_timings", "_started")
+
+    def __init__(self, name: str) -> None:
+        self.name = name
+
+    def __enter__(self) -> None:
+        self._timings = _current.get()
+        if self._timings is not None:
+            self._started = time.perf_counter()
+
+    def __exit__(self, *exc: Any) -> None:
+        if self._timings is not None:
+            self._timings.add(self.name, time.perf_counter() - self._started)
+
+
+def call(fn: Callable[..., T], *args: Any) -> T:
+    """fn(*args), under cProfile if the current request is being profiled."""
+    timings = _current.get()
+    if timings is None or timings.profiles is None:
+        return fn(*args)
+    profile = cProfile.Profile()
+    try:
+        return profile.runcall(fn, *args)
+    finally:
+        timings.profiles.append(profile)
+
+
+def save_profile(timings: Timings, path: str) -> str | None:
+    """Write a profiled request's stats under PROFILE_DIR; returns the file name."""
+    stats = timings.profile_stats()
+    if stats is None:
+        return None
+    os.makedirs(_PROFILE_DIR, exist_ok=True)
+    slug = re.sub(r"[^A-Za-z0-9]+", "_", path).strip("_") or "root"
+    name = f"{time.strftime('%Y%m%d-%H%M%S')}-{time.time_ns() % 10**9:09d}-{slug}.prof"
+    stats.dump_stats(os.path.join(_PROFILE_DIR, name))
+    return name
+
+
+def profile_summary(timings: Timings) -> list[dict[str, Any]] | None:
+    """The functions with the most cumulative time in a profiled request."""
+    stats = timings.profile_stats()
+    if stats is None:
+        return None
+    rows = []
+    for (filename, line, func), (_, calls, own, cumulative, _) in stats.stats.items():  # type: ignore[attr-defined]
+        rows.append({
+            "function": f"{os.path.basename(filename)}:{line}({func})",
+            "calls": calls,
+            "own_ms": round(own * 1000, 3),
+            "cumulative_ms": round(cumulative * 1000, 3),
+        })
+    rows.sort(key=lambda r: r["cumulative_ms"], reverse=True)
+    return rows[:_PROFILE_TOP]
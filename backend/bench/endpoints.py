@@ -0,0 +1,246 @@
+"""Latency and throughput of the main strategy paths on synthetic races.
+
+Each race size is generated with bench.synthetic and served to
+OpenF1Client by the local stand-in, so nothing touches the network.  For
+evaluate_undercut, /api/positions and get_pit_stop_advantage it reports
+the cold latency (first call, building the session frame), p50/p95 of
+warm calls while scrubbing through the laps, and throughput with several
+concurrent callers.
+
+Save a run as the baseline, then compare later runs against it; the
+comparison fails (exit status 1) when anything is slower than the
+baseline by more than --tolerance.
+
+    cd backend && python -m bench.endpoints --save bench/baseline.json
+    cd backend && python -m bench.endpoints --compare bench/baseline.json
+"""
+from __future__ import annotations
+
+import os
+
+# The stand-in has no rate limit, so don't throttle requests to it like
+# the real API (read when the client module is imported)
+os.environ.setdefault("OPENF1_RATE", "1000000")
+os.environ.setdefault("OPENF1_BURST", "1000000")
+
+import argparse  # noqa: E402
+import asyncio  # noqa: E402
+import json  # noqa: E402
+import platform  # noqa: E402
+import sys  # noqa: E402
+import time  # noqa: E402
+from typing import Any, Awaitable, Callable  # noqa: E402
+
+import httpx  # noqa: E402
+
+from app import main as api, session_frame, strategy_engine  # noqa: E402
+from app.openf1_client import OpenF1Client  # noqa: E402
+
+from .stand_in import OpenF1StandIn  # noqa: E402
+from .synthetic import generate_race  # noqa: E402
+
+# Race sizes: a short race, a typical one, and a long one sampled every second
+SIZES: dict[str, dict[str, Any]] = {
+    "small": dict(drivers=10, laps=30, interval_step=8.0),
+    "medium": dict(drivers=20, laps=57, interval_step=4.0),
+    "large": dict(drivers=20, laps=78, interval_step=1.0),
+}
+
+_COMPOUNDS = ["SOFT", "MEDIUM", "HARD", None]
+
+# call number -> awaitable doing one operation
+Operation = Callable[[int], Awaitable[Any]]
+
+
+def _operations(
+    client: OpenF1Client, http: httpx.AsyncClient, session_key: int, payloads: dict[str, list[dict]],
+) -> dict[str, Operation]:
+    leader = payloads["/drivers"][0]["driver_number"]
+    chaser = payloads["/drivers"][1]["driver_number"]
+    laps = max(r["lap_number"] for r in payloads["/laps"])
+
+    async def evaluate(i: int) -> Any:
+        lap = i % laps + 1
+        return await strategy_engine.evaluate_undercut(client, session_key, leader, chaser, at_lap=lap)
+
+    async def positions(i: int) -> Any:
+        lap = i % laps + 1
+        resp = await http.get("/api/positions", params={"session_key": session_key, "lap": lap})
+        resp.raise_for_status()
+        return resp.content
+
+    async def pit_stop_advantage(i: int) -> Any:
+        compound = _COMPOUNDS[i % len(_COMPOUNDS)]
+        return await strategy_engine.get_pit_stop_advantage(client, session_key, compound)
+
+    return {
+        "evaluate_undercut": evaluate,
+        "positions": positions,
+        "pit_stop_advantage": pit_stop_advantage,
+    }
+
+
+def _percentile(ordered: list[float], q: float) -> float:
+    return ordered[min(len(ordered) - 1, int(len(ordered) * q))]
+
+
+async def _measure_once(op: Operation, calls: int, concurrency: int) -> dict[str, float]:
+    # Cold: the fetched payloads stay cached, the session frame is rebuilt
+    session_frame._frames.clear()
+    t = time.perf_counter()
+    await op(0)
+    cold = time.perf_counter() - t
+
+    latencies = []
+    for i in range(calls):
+        t = time.perf_counter()
+        await op(i)
+        latencies.append(time.perf_counter() - t)
+    latencies.sort()
+
+    async def worker(start: int) -> None:
+        for i in range(start, calls, concurrency):
+            await op(i)
+
+    t = time.perf_counter()
+    await asyncio.gather(*(worker(w) for w in range(concurrency)))
+    elapsed = time.perf_counter() - t
+
+    return {
+        "cold_ms": cold * 1000,
+        "p50_ms": _percentile(latencies, 0.50) * 1000,
+        "p95_ms": _percentile(latencies, 0.95) * 1000,
+        "throughput": calls / elapsed,
+    }
+
+
+async def _measure(op: Operation, calls: int, concurrency: int, rounds: int) -> dict[str, float]:
+    """Best of several rounds per metric, which is far less noisy than one.
+
+    A first, discarded round fills the fetch cache and warms up imports.
+    """
+    await _measure_once(op, min(calls, 20), concurrency)
+    runs = [await _measure_once(op, calls, concurrency) for _ in range(rounds)]
+    return {
+        "cold_ms": round(min(r["cold_ms"] for r in runs), 3),
+        "p50_ms": round(min(r["p50_ms"] for r in runs), 3),
+        "p95_ms": round(min(r["p95_ms"] for r in runs), 3),
+        "throughput": round(max(r["throughput"] for r in runs), 1),
+    }
+
+
+async def run(
+    sizes: list[str], calls: int, concurrency: int, rounds: int,
+) -> dict[str, dict[str, dict[str, float]]]:
+    results: dict[str, dict[str, dict[str, float]]] = {}
+    for n, size in enumerate(sizes):
+        session_key = 9000 + n
+        payloads = generate_race(session_key=session_key, **SIZES[size])
+        client = OpenF1Client(store_path=None, transport=OpenF1StandIn(payloads))
+        # /api/positions goes through the app itself, in-process
+        api.client = client
+        http = httpx.AsyncClient(transport=httpx.ASGITransport(app=api.app), base_url="http://bench")
+        try:
+            rows = sum(len(v) for v in payloads.values())
+            print(f"{size}: {SIZES[size]}, {rows} rows", file=sys.stderr)
+            results[size] = {
+                name: await _measure(op, calls, concurrency, rounds)
+                for name, op in _operations(client, http, session_key, payloads).items()
+            }
+        finally:
+            await http.aclose()
+            await client.close()
+    return results
+
+
+def _compare(
+    results: dict[str, dict[str, dict[str, float]]],
+    baseline: dict[str, dict[str, dict[str, float]]],
+    tolerance: float,
+) -> list[str]:
+    """Regressions beyond tolerance, as printable lines."""
+    regressions = []
+    for size, ops in results.items():
+        for name, now in ops.items():
+            before = baseline.get(size, {}).get(name)
+            if before is None:
+                continue
+            for metric in ("cold_ms", "p50_ms", "p95_ms"):
+                if now[metric] > before[metric] * (1 + tolerance):
+                    regressions.append(
+                        f"{size} {name} {metric}: {now[metric]:.3f} vs {before[metric]:.3f}"
+                    )
+            if now["throughput"] < before["throughput"] / (1 + tolerance):
+                regressions.append(
+                    f"{size} {name} throughput: {now['throughput']:.1f} vs {before['throughput']:.1f}"
+                )
+    return regressions
+
+
+def _print_table(
+    results: dict[str, dict[str, dict[str, float]]],
+    baseline: dict[str, dict[str, dict[str, float]]] | None,
+) -> None:
+    header = f"{'size':<8}{'operation':<21}{'cold ms':>10}{'p50 ms':>10}{'p95 ms':>10}{'req/s':>10}"
+    print(header + ("   p50 vs baseline" if baseline else ""))
+    for size, ops in results.items():
+        for name, r in ops.items():
+            line = (
+                f"{size:<8}{name:<21}{r['cold_ms']:>10.2f}{r['p50_ms']:>10.3f}"
+                f"{r['p95_ms']:>10.3f}{r['throughput']:>10.1f}"
+            )
+            before = (baseline or {}).get(size, {}).get(name)
+            if before:
+                line += f"   {r['p50_ms'] / before['p50_ms']:.2f}x"
+            print(line)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", default=",".join(SIZES), help=f"comma-separated, from {', '.join(SIZES)}")
+    parser.add_argument("--calls", type=int, default=200, help="warm calls per operation")
+    parser.add_argument("--concurrency", type=int, default=8, help="concurrent callers for throughput")
+    parser.add_argument("--rounds", type=int, default=3, help="repetitions; the best of each metric is kept")
+    parser.add_argument("--save", metavar="PATH", help="write the results as a baseline")
+    parser.add_argument("--compare", metavar="PATH", help="baseline to compare against")
+    # Best-of-3 timings still move by up to ~30% between runs on a shared machine
+    parser.add_argument("--tolerance", type=float, default=0.5, help="allowed slowdown (0.5 = 50%%)")
+    args = parser.parse_args()
+
+    sizes = [s for s in args.sizes.split(",") if s]
+    unknown = [s for s in sizes if s not in SIZES]
+    if unknown:
+        parser.error(f"unknown sizes: {', '.join(unknown)}")
+
+    results = asyncio.run(run(sizes, args.calls, args.concurrency, args.rounds))
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)["results"]
+    _print_table(results, baseline)
+
+    if args.save:
+        meta = {
+            "python": platform.python_version(),
+            "machine": platform.machine(),
+            "calls": args.calls,
+            "concurrency": args.concurrency,
+            "rounds": args.rounds,
+        }
+        with open(args.save, "w") as f:
+            json.dump({"meta": meta, "results": results}, f, indent=2)
+            f.write("\n")
+        print(f"saved baseline to {args.save}")
+
+    if baseline is not None:
+        regressions = _compare(results, baseline, args.tolerance)
+        if regressions:
+            print(f"\n{len(regressions)} regression(s) beyond {args.tolerance:.0%}:")
+            for line in regressions:
+                print(f"  {line}")
+            sys.exit(1)
+        print(f"\nno regressions beyond {args.tolerance:.0%}")
+
+
+if __name__ == "__main__":
+    main()
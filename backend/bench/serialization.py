@@ -0,0 +1,102 @@
+"""Cost of producing the /api/strategy/evaluate body for a full race.
+
+Compares the pre-fast-path pipeline (series rebuilt as pydantic rows on
+every request, validated again against response_model, encoded with the
+json module) with the current one (series memoized per data version and
+rendered once, scalars encoded straight to bytes), and the two upstream
+JSON parsers.
+
+    cd backend && python -m bench.serialization [--laps 70 --drivers 20]
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import time
+from typing import Callable
+
+from fastapi.encoders import jsonable_encoder
+from pydantic import TypeAdapter
+
+from app import serialization, strategy_engine
+from app.models import UndercutResult, UndercutSeries
+from app.responses import render
+from app.session_frame import SessionFrame
+from app.serialization import merge_objects, model_json
+
+from .synthetic import SESSION_KEY, generate_race
+
+_result_adapter = TypeAdapter(UndercutResult)
+
+
+def _best_ms(fn: Callable[[], object], repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        t = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - t)
+    return best * 1000
+
+
+def _frame(payloads: dict[str, list[dict]]) -> SessionFrame:
+    return SessionFrame(SESSION_KEY, {path.lstrip("/"): rows for path, rows in payloads.items()
+                                      if path not in ("/sessions", "/meetings")})
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--drivers", type=int, default=20)
+    parser.add_argument("--laps", type=int, default=57)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    payloads = generate_race(drivers=args.drivers, laps=args.laps)
+    frame = _frame(payloads)
+    leader, chaser = payloads["/drivers"][0]["driver_number"], payloads["/drivers"][1]["driver_number"]
+    at_lap = args.laps // 2
+
+    def before() -> bytes:
+        scalars = strategy_engine._evaluate_scalars(frame, leader, chaser, at_lap)
+        series = strategy_engine._undercut_series(frame, leader, chaser)
+        result = UndercutResult(
+            **scalars.model_dump(),
+            **{name: getattr(series, name) for name in UndercutSeries.model_fields},
+        )
+        # What FastAPI does with response_model, then JSONResponse
+        validated = _result_adapter.validate_python(result.model_dump())
+        content = jsonable_encoder(_result_adapter.dump_python(validated, mode="json"))
+        return json.dumps(content, ensure_ascii=False, allow_nan=False, separators=(",", ":")).encode()
+
+    def after() -> bytes:
+        scalars = strategy_engine._evaluate_scalars(frame, leader, chaser, at_lap)
+        series = strategy_engine._series(frame, leader, chaser)
+        return merge_objects(model_json(scalars), render(series)[0])
+
+    def after_cold() -> bytes:
+        # First request after the data changed: series built and rendered once
+        frame._derived.clear()
+        return after()
+
+    assert json.loads(before()) == json.loads(after())
+    size = len(after())
+    rows = {k: len(v) for k, v in payloads.items() if len(v) > 1}
+    print(f"race: {args.drivers} drivers x {args.laps} laps, rows {rows}")
+    print(f"evaluate body: {size / 1024:.0f} KiB")
+    t_before = _best_ms(before, args.repeat)
+    t_after = _best_ms(after, args.repeat)
+    print(f"  before (rebuild + revalidate + json)  {t_before:8.2f} ms")
+    t_cold = _best_ms(after_cold, args.repeat)
+    print(f"  after, first request per data version {t_cold:8.2f} ms   {t_before / t_cold:.1f}x")
+    print(f"  after  (memoized series + fast path)  {t_after:8.2f} ms   {t_before / t_after:.0f}x")
+
+    raw = json.dumps(payloads["/intervals"]).encode()
+    t_json = _best_ms(lambda: json.loads(raw), args.repeat)
+    t_fast = _best_ms(lambda: serialization.loads(raw), args.repeat)
+    parser_name = "orjson" if serialization.orjson is not None else "json (orjson not installed)"
+    print(f"upstream /intervals parse ({len(raw) / 1024:.0f} KiB):")
+    print(f"  json                                  {t_json:8.2f} ms")
+    print(f"  {parser_name:<38}{t_fast:8.2f} ms   {t_json / t_fast:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
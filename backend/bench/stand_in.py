@@ -0,0 +1,95 @@
+"""A local stand-in for the OpenF1 endpoints OpenF1Client calls.
+
+Serves payloads from memory (e.g. from synthetic.generate_race) through an
+httpx transport, so the client runs unchanged with no network:
+
+    client = OpenF1Client(store_path=None, transport=OpenF1StandIn(payloads))
+
+Equality filters and OpenF1's literal comparison filters (`date>=...`,
+`lap_number<=...`) are applied like the real API does.
+"""
+from __future__ import annotations
+
+import asyncio
+import json
+import operator
+from typing import Any, Callable
+from urllib.parse import unquote
+
+import httpx
+
+_OPERATORS: list[tuple[str, Callable[[Any, Any], bool]]] = [
+    (">=", operator.ge),
+    ("<=", operator.le),
+    (">", operator.gt),
+    ("<", operator.lt),
+]
+
+
+def _coerce(value: str, like: Any) -> Any:
+    """The query-string value as the type of the row field it's compared to."""
+    if isinstance(like, bool):
+        return value.lower() == "true"
+    if isinstance(like, (int, float)):
+        try:
+            return type(like)(value)
+        except ValueError:
+            return float(value)
+    return value
+
+
+def _filters(query: str) -> list[tuple[str, Callable[[Any, Any], bool], str]]:
+    out = []
+    for part in query.split("&"):
+        if not part:
+            continue
+        part = unquote(part.replace("+", " "))
+        for symbol, op in _OPERATORS:
+            # `date>=x` and `date>x`: the operator is part of the key
+            field, found, value = part.partition(symbol)
+            if found and "=" not in field:
+                out.append((field, op, value))
+                break
+        else:
+            field, _, value = part.partition("=")
+            out.append((field, operator.eq, value))
+    return out
+
+
+def _matches(row: dict, filters: list[tuple[str, Callable[[Any, Any], bool], str]]) -> bool:
+    for field, op, value in filters:
+        actual = row.get(field)
+        if actual is None:
+            return False
+        try:
+            if not op(actual, _coerce(value, actual)):
+                return False
+        except (TypeError, ValueError):
+            return False
+    return True
+
+
+class OpenF1StandIn(httpx.AsyncBaseTransport):
+    """httpx transport answering OpenF1 requests from in-memory payloads.
+
+    `payloads` is keyed by path ("/laps", "/sessions", ...).  `latency`
+    adds a fixed delay per request to mimic the real API's round trip.
+    """
+
+    def __init__(self, payloads: dict[str, list[dict]], latency: float = 0.0) -> None:
+        self.payloads = payloads
+        self.latency = latency
+        self.requests = 0
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        self.requests += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        path = request.url.path.removeprefix("/v1")
+        if path not in self.payloads:
+            return httpx.Response(404, json={"detail": "Not Found"})
+        filters = _filters(request.url.query.decode())
+        rows = [r for r in self.payloads[path] if _matches(r, filters)]
+        return httpx.Response(
+            200, content=json.dumps(rows).encode(), headers={"content-type": "application/json"}
+        )
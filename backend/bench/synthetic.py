@@ -0,0 +1,156 @@
+"""Synthetic OpenF1 payloads for a race of configurable size.
+
+The rows mimic the shape of the real endpoints closely enough for the
+backend to treat them as a normal session: lap times with tyre wear and
+noise, 1-3 stints per driver with pit stops, intervals and positions
+sampled every few seconds, and a weather reading per minute.
+"""
+from __future__ import annotations
+
+import random
+from datetime import datetime, timedelta, timezone
+
+SESSION_KEY = 9999
+MEETING_KEY = 1
+
+_DRIVER_NUMBERS = [1, 11, 16, 55, 44, 63, 4, 81, 14, 18, 10, 31, 23, 2, 22, 3, 27, 20, 24, 77]
+_COMPOUNDS = ["SOFT", "MEDIUM", "HARD"]
+
+
+def generate_race(
+    seed: int = 1,
+    drivers: int = 20,
+    laps: int = 57,
+    interval_step: float = 4.0,
+    session_end: datetime | None = None,
+    stops: int | None = None,
+    session_key: int = SESSION_KEY,
+) -> dict[str, list[dict]]:
+    """Payloads keyed by OpenF1 path ("/laps", "/intervals", ...).
+
+    interval_step is the seconds between interval samples; real sessions
+    have one every ~4 s per driver.  session_end defaults to two hours
+    after the start, i.e. a finished session.  stops fixes every driver's
+    number of pit stops (one more stint each); by default it is 0-2.
+    """
+    rnd = random.Random(seed)
+    start = datetime(2024, 3, 2, 15, 0, tzinfo=timezone.utc)
+    numbers = (_DRIVER_NUMBERS * (drivers // len(_DRIVER_NUMBERS) + 1))[:drivers]
+    numbers = [n + 100 * (i // len(_DRIVER_NUMBERS)) for i, n in enumerate(numbers)]
+    base_pace = {d: 92 + i * 0.08 + rnd.random() * 0.3 for i, d in enumerate(numbers)}
+
+    lap_rows, stint_rows, pit_rows = [], [], []
+    finish = start
+    for i, d in enumerate(numbers):
+        n_stints = rnd.choice([1, 2, 2, 3]) if stops is None else stops + 1
+        cuts = sorted(rnd.sample(range(8, laps - 4), n_stints - 1)) if laps > 12 else []
+        firsts = [1] + cuts
+        lasts = [c - 1 for c in cuts] + [laps]
+        stints = []
+        for n, (first, last) in enumerate(zip(firsts, lasts), start=1):
+            stint = dict(
+                session_key=session_key, meeting_key=MEETING_KEY, driver_number=d,
+                stint_number=n, compound=rnd.choice(_COMPOUNDS), lap_start=first,
+                lap_end=last, tyre_age_at_start=rnd.choice([0, 0, 3]),
+            )
+            stints.append(stint)
+            if n > 1:
+                lane = None if rnd.random() < 0.1 else round(20 + rnd.random() * 4, 3)
+                pit_rows.append(dict(
+                    session_key=session_key, meeting_key=MEETING_KEY, driver_number=d,
+                    lap_number=first, date=(start + timedelta(seconds=first * 93)).isoformat(),
+                    pit_duration=lane, lane_duration=lane,
+                ))
+        stint_rows.extend(stints)
+
+        t = start + timedelta(seconds=i * 0.5)
+        for lap in range(1, laps + 1):
+            stint = next(s for s in stints if s["lap_start"] <= lap <= s["lap_end"])
+            pit_out = lap == stint["lap_start"] and stint["stint_number"] > 1
+            duration = base_pace[d] + 0.06 * (lap - stint["lap_start"]) - 0.03 * lap + rnd.gauss(0, 0.3)
+            if pit_out:
+                duration += 20
+            if lap == 1:
+                duration += 5
+            if rnd.random() < 0.03:
+                duration += 15  # traffic, a mistake
+            recorded = None if rnd.random() < 0.03 else round(duration, 3)
+            lap_rows.append(dict(
+                session_key=session_key, meeting_key=MEETING_KEY, driver_number=d,
+                lap_number=lap, date_start=t.isoformat(), lap_duration=recorded,
+                is_pit_out_lap=pit_out,
+                duration_sector_1=None if recorded is None else round(recorded / 3, 3),
+                duration_sector_2=None, duration_sector_3=None, i1_speed=300, st_speed=310,
+            ))
+            t += timedelta(seconds=duration)
+        finish = max(finish, t)
+    rnd.shuffle(lap_rows)  # OpenF1 doesn't promise any order
+
+    interval_rows, position_rows = [], []
+    t, tick = start, 0
+    while t < finish:
+        order = sorted(numbers, key=lambda d: base_pace[d] + rnd.random() * 0.6)
+        ahead = 0.0
+        for pos, d in enumerate(order):
+            to_leader = 0.0 if pos == 0 else ahead + rnd.random() * 2.5
+            date = (t + timedelta(milliseconds=pos * 37)).isoformat()
+            if pos > len(order) - 3 and rnd.random() < 0.5:
+                interval_rows.append(dict(
+                    session_key=session_key, driver_number=d, date=date,
+                    gap_to_leader="+1 LAP", interval="+1 LAP",
+                ))
+            else:
+                interval_rows.append(dict(
+                    session_key=session_key, driver_number=d, date=date,
+                    gap_to_leader=round(to_leader, 3),
+                    interval=None if pos == 0 else round(to_leader - ahead, 3),
+                ))
+            ahead = to_leader
+            if tick % 15 == 0:
+                position_rows.append(dict(
+                    session_key=session_key, driver_number=d,
+                    date=(t + timedelta(milliseconds=pos * 11)).isoformat(), position=pos + 1,
+                ))
+        t += timedelta(seconds=interval_step)
+        tick += 1
+
+    minutes = int((finish - start).total_seconds() // 60) + 1
+    weather_rows = [
+        dict(
+            session_key=session_key, meeting_key=MEETING_KEY,
+            date=(start + timedelta(minutes=m)).isoformat(),
+            track_temperature=round(40 + rnd.random(), 1), air_temperature=25.0,
+            humidity=50.0, rainfall=0, pressure=1013.0, wind_speed=1.2, wind_direction=180,
+        )
+        for m in range(minutes)
+    ]
+    driver_rows = [
+        dict(
+            session_key=session_key, meeting_key=MEETING_KEY, driver_number=d,
+            full_name=f"Driver {d}", name_acronym=f"D{d % 100:02d}", team_name="Team",
+            team_colour="FF0000", headshot_url=None,
+        )
+        for d in numbers
+    ]
+    end = session_end or start + timedelta(hours=2)
+    session = dict(
+        session_key=session_key, meeting_key=MEETING_KEY, session_name="Race",
+        session_type="Race", date_start=start.isoformat(), date_end=end.isoformat(),
+        country_name="Testland", circuit_short_name="Test", year=start.year,
+    )
+    meeting = dict(
+        meeting_key=MEETING_KEY, meeting_name="Test Grand Prix", country_name="Testland",
+        location="Test", date_start=start.isoformat(), date_end=end.isoformat(),
+        year=start.year, circuit_short_name="Test",
+    )
+    return {
+        "/laps": lap_rows,
+        "/stints": stint_rows,
+        "/pit": pit_rows,
+        "/intervals": interval_rows,
+        "/position": position_rows,
+        "/weather": weather_rows,
+        "/drivers": driver_rows,
+        "/sessions": [session],
+        "/meetings": [meeting],
+    }
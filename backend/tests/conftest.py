@@ -0,0 +1,48 @@
+from __future__ import annotations
+
+import asyncio
+from typing import Any, Awaitable, Callable, Iterator
+
+import pytest
+
+from app.openf1_client import OpenF1Client
+from bench import synthetic
+from bench.stand_in import OpenF1StandIn
+
+# The client's caches and the session frames are process-wide and keyed by
+# session_key, so every synthetic race gets its own
+RACE_SEEDS = (1, 2, 3)
+
+
+def race_session_key(seed: int) -> int:
+    return 9100 + seed
+
+
+@pytest.fixture(scope="session")
+def run() -> Iterator[Callable[[Awaitable[Any]], Any]]:
+    """Run a coroutine to completion on one event loop shared by every test.
+
+    The rate limiter and the session-frame locks hold on to the loop they
+    were first used on, so tests can't each start their own.
+    """
+    loop = asyncio.new_event_loop()
+    yield loop.run_until_complete
+    loop.close()
+
+
+class Race:
+    """A synthetic finished race served to an OpenF1Client with no network."""
+
+    def __init__(self, seed: int) -> None:
+        self.session_key = race_session_key(seed)
+        self.payloads = synthetic.generate_race(seed=seed, session_key=self.session_key)
+        self.client = OpenF1Client(store_path=None, transport=OpenF1StandIn(self.payloads))
+        self.drivers = [d["driver_number"] for d in self.payloads["/drivers"]]
+        self.total_laps = max(l["lap_number"] for l in self.payloads["/laps"])
+
+
+@pytest.fixture(scope="session", params=RACE_SEEDS, ids=lambda seed: f"race{seed}")
+def race(request: pytest.FixtureRequest, run: Callable[[Awaitable[Any]], Any]) -> Iterator[Race]:
+    r = Race(request.param)
+    yield r
+    run(r.client.close())
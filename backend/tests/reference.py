@@ -0,0 +1,266 @@
+"""The strategy engine's original implementations, kept as a reference.
+
+These are the per-call pandas/list versions the columnar engine replaced.
+The equivalence tests run both on the same synthetic races and expect the
+same numbers.
+"""
+from __future__ import annotations
+
+import statistics
+
+import pandas as pd
+
+from app.openf1_client import OpenF1Client
+
+OUTLIER_FACTOR = 1.2
+
+
+async def calculate_mean_pit_loss(
+    client: OpenF1Client, session_key: int, at_lap: int | None = None
+) -> float | None:
+    """Average lane_duration for the session, optionally only pits up to at_lap."""
+    pits = await client.get_pit(session_key=session_key)
+    if at_lap is not None:
+        pits_filtered = [p for p in pits if p.get("lap_number") is not None and p["lap_number"] <= at_lap]
+        if pits_filtered:
+            pits = pits_filtered
+    durations = [p["lane_duration"] for p in pits if p.get("lane_duration") is not None]
+    if not durations:
+        return None
+    return statistics.mean(durations)
+
+
+async def get_clean_laps(
+    client: OpenF1Client,
+    session_key: int,
+    driver_number: int,
+    up_to_lap: int | None = None,
+) -> pd.DataFrame:
+    """Fetch laps for a driver with pit-out and outlier laps removed."""
+    raw = await client.get_laps(session_key=session_key, driver_number=driver_number)
+    if not raw:
+        return pd.DataFrame()
+    df = pd.DataFrame(raw)
+    if up_to_lap is not None:
+        df = df[df["lap_number"] <= up_to_lap]
+    df = df[df["lap_duration"].notna()]
+    df = df[df["is_pit_out_lap"] != True]  # noqa: E712
+
+    if not df.empty:
+        mean_dur = df["lap_duration"].mean()
+        df = df[df["lap_duration"] <= OUTLIER_FACTOR * mean_dur]
+    return df
+
+
+async def get_driver_race_pace(
+    client: OpenF1Client,
+    session_key: int,
+    driver_number: int,
+    last_n: int = 3,
+    up_to_lap: int | None = None,
+) -> float | None:
+    """Mean of the driver's last N clean laps (up to a given lap)."""
+    df = await get_clean_laps(client, session_key, driver_number, up_to_lap=up_to_lap)
+    if df.empty:
+        return None
+    tail = df.sort_values("lap_number").tail(last_n)
+    return float(tail["lap_duration"].mean())
+
+
+async def get_fresh_tyre_pace(
+    client: OpenF1Client,
+    session_key: int,
+    driver_number: int,
+    compound: str | None,
+) -> float | None:
+    """Estimate the driver's own pace on fresh tyres for a compound.
+
+    Uses the driver's first 3 clean racing laps of their current stint
+    (when the tyres were newest).  This is compared against their current
+    degraded pace to measure how much time fresh rubber is worth.
+    Falls back to field data for the compound if the driver has no stint data.
+    """
+    all_laps_raw = await client.get_laps(
+        session_key=session_key, driver_number=driver_number
+    )
+    stints_raw = await client.get_stints(session_key=session_key)
+    if not all_laps_raw or not stints_raw:
+        return None
+
+    laps_df = pd.DataFrame(all_laps_raw)
+    stints_df = pd.DataFrame(stints_raw)
+
+    driver_stints = stints_df[stints_df["driver_number"] == driver_number]
+    if compound:
+        compound_stints = driver_stints[
+            driver_stints["compound"].str.upper() == compound.upper()
+        ]
+        if not compound_stints.empty:
+            driver_stints = compound_stints
+
+    if driver_stints.empty:
+        return await _field_fresh_pace(client, session_key, compound)
+
+    # Collect the first 3 clean racing laps of each stint
+    fresh_times: list[float] = []
+    for _, stint in driver_stints.iterrows():
+        lap_start = stint["lap_start"]
+        early_laps = laps_df[
+            (laps_df["lap_number"] >= lap_start)
+            & (laps_df["lap_number"] <= lap_start + 3)
+            & (laps_df["is_pit_out_lap"] != True)  # noqa: E712
+            & (laps_df["lap_duration"].notna())
+        ]
+        fresh_times.extend(early_laps["lap_duration"].tolist())
+
+    if not fresh_times:
+        return await _field_fresh_pace(client, session_key, compound)
+
+    mean_t = statistics.mean(fresh_times)
+    filtered = [t for t in fresh_times if t <= OUTLIER_FACTOR * mean_t]
+    return statistics.mean(filtered) if filtered else mean_t
+
+
+async def _field_fresh_pace(
+    client: OpenF1Client, session_key: int, compound: str | None,
+) -> float | None:
+    """Fallback: field-wide fresh-tyre pace for a compound."""
+    all_laps_raw = await client.get_laps(session_key=session_key)
+    stints_raw = await client.get_stints(session_key=session_key)
+    if not all_laps_raw or not stints_raw:
+        return None
+
+    laps_df = pd.DataFrame(all_laps_raw)
+    stints_df = pd.DataFrame(stints_raw)
+    if compound:
+        stints_df = stints_df[stints_df["compound"].str.upper() == compound.upper()]
+
+    fresh_times: list[float] = []
+    for _, stint in stints_df.iterrows():
+        dn = stint["driver_number"]
+        lap_start = stint["lap_start"]
+        early = laps_df[
+            (laps_df["driver_number"] == dn)
+            & (laps_df["lap_number"] >= lap_start)
+            & (laps_df["lap_number"] <= lap_start + 3)
+            & (laps_df["is_pit_out_lap"] != True)  # noqa: E712
+            & (laps_df["lap_duration"].notna())
+        ]
+        fresh_times.extend(early["lap_duration"].tolist())
+
+    if not fresh_times:
+        return None
+    mean_t = statistics.mean(fresh_times)
+    filtered = [t for t in fresh_times if t <= OUTLIER_FACTOR * mean_t]
+    return statistics.mean(filtered) if filtered else mean_t
+
+
+async def _get_gap_at_lap(
+    client: OpenF1Client,
+    session_key: int,
+    chaser_number: int,
+    leader_number: int,
+    at_lap: int,
+    all_laps_leader: list[dict],
+    all_laps_chaser: list[dict],
+    gap_history_raw: list[dict],
+) -> float | None:
+    """Find the interval between two drivers at a specific lap."""
+    chaser_lap = next(
+        (l for l in all_laps_chaser if l.get("lap_number") == at_lap and l.get("date_start")),
+        None,
+    )
+    if chaser_lap and chaser_lap.get("date_start"):
+        target_ts = chaser_lap["date_start"]
+        best: dict | None = None
+        best_diff = float("inf")
+        for entry in gap_history_raw:
+            if entry.get("date") and isinstance(entry.get("interval"), (int, float)):
+                diff = abs(_ts_diff(entry["date"], target_ts))
+                if diff < best_diff:
+                    best_diff = diff
+                    best = entry
+        if best is not None and isinstance(best.get("interval"), (int, float)):
+            return float(best["interval"])
+
+    for entry in reversed(gap_history_raw):
+        val = entry.get("interval")
+        if isinstance(val, (int, float)):
+            return float(val)
+    return None
+
+
+def _ts_diff(a: str, b: str) -> float:
+    """Approximate seconds difference between two ISO timestamps."""
+    from datetime import datetime
+    try:
+        ta = datetime.fromisoformat(a.replace("Z", "+00:00"))
+        tb = datetime.fromisoformat(b.replace("Z", "+00:00"))
+        return (ta - tb).total_seconds()
+    except Exception:
+        return float("inf")
+
+
+async def get_pit_stop_advantage(
+    client: OpenF1Client, session_key: int, compound: str | None,
+) -> float | None:
+    """Measure the real fresh-tyre advantage by comparing driver pace
+    before and after actual pit stops in this session.
+
+    For each pit stop:
+      - pre_pace  = mean of last 3 clean laps BEFORE the stop (degraded tyres)
+      - post_pace = mean of first 3 clean laps AFTER the stop (fresh tyres)
+      - advantage = pre_pace - post_pace  (positive = fresh is faster)
+
+    Returns the average advantage across all stops (optionally filtered by
+    the new compound).  This naturally accounts for fuel burn since the laps
+    are only a few apart.
+    """
+    all_laps = await client.get_laps(session_key=session_key)
+    stints_raw = await client.get_stints(session_key=session_key)
+    if not all_laps or not stints_raw:
+        return None
+
+    laps_df = pd.DataFrame(all_laps)
+    stints_df = pd.DataFrame(stints_raw)
+
+    # Only look at stints after the first (i.e. after a pit stop)
+    new_stints = stints_df[stints_df["stint_number"] > 1].copy()
+    if compound:
+        filtered = new_stints[new_stints["compound"].str.upper() == compound.upper()]
+        if not filtered.empty:
+            new_stints = filtered
+
+    advantages: list[float] = []
+    for _, stint in new_stints.iterrows():
+        dn = stint["driver_number"]
+        pit_lap = stint["lap_start"]  # the out-lap number
+
+        driver_laps = laps_df[
+            (laps_df["driver_number"] == dn)
+            & (laps_df["lap_duration"].notna())
+            & (laps_df["is_pit_out_lap"] != True)  # noqa: E712
+        ].sort_values("lap_number")
+
+        # Pre-stop: last 3 clean laps before the pit
+        pre = driver_laps[driver_laps["lap_number"] < pit_lap].tail(3)
+        # Post-stop: first 3 clean laps after the out-lap
+        post = driver_laps[driver_laps["lap_number"] > pit_lap].head(3)
+
+        if pre.empty or post.empty:
+            continue
+
+        pre_mean = pre["lap_duration"].mean()
+        post_mean = post["lap_duration"].mean()
+
+        # Sanity filter: ignore if either mean is an outlier
+        all_mean = laps_df[laps_df["lap_duration"].notna()]["lap_duration"].mean()
+        if pre_mean > OUTLIER_FACTOR * all_mean or post_mean > OUTLIER_FACTOR * all_mean:
+            continue
+
+        advantages.append(pre_mean - post_mean)
+
+    if not advantages:
+        return None
+
+    return statistics.mean(advantages)
@@ -0,0 +1,47 @@
+from __future__ import annotations
+
+from typing import Iterator
+from urllib.parse import urlencode
+
+import pytest
+from fastapi import Request
+
+from app import main, responses
+
+from .conftest import Race
+
+
+def _request(path: str, **params) -> Request:
+    return Request({
+        "type": "http", "method": "GET", "path": path, "headers": [],
+        "query_string": urlencode(params).encode(),
+    })
+
+
+@pytest.fixture
+def api(race: Race) -> Iterator[Race]:
+    """Route handlers called directly, with the race's client as the app's."""
+    had_client = hasattr(main, "client")
+    previous = getattr(main, "client", None)
+    main.client = race.client
+    yield race
+    if had_client:
+        main.client = previous
+    else:
+        del main.client
+
+
+def test_thinned_gaps_and_weather_come_from_the_result_cache(api, run):
+    dn = api.drivers[1]
+    gap_request = _request("/api/strategy/gaps", session_key=api.session_key, driver_number=dn, max_points=50)
+    first = run(main.gaps(gap_request, api.session_key, dn, 50))
+    hits = responses.result_cache_stats()["hits"]
+    again = run(main.gaps(gap_request, api.session_key, dn, 50))
+    assert responses.result_cache_stats()["hits"] == hits + 1
+    assert again.body == first.body and again.headers["ETag"] == first.headers["ETag"]
+
+    weather_request = _request("/api/weather", session_key=api.session_key, max_points=20)
+    run(main.weather(weather_request, api.session_key, 20))
+    hits = responses.result_cache_stats()["hits"]
+    run(main.weather(weather_request, api.session_key, 20))
+    assert responses.result_cache_stats()["hits"] == hits + 1
@@ -0,0 +1,74 @@
+from __future__ import annotations
+
+import pytest
+
+from app import circuit_breaker
+from app.circuit_breaker import CircuitBreaker
+
+
+class FakeClock:
+    def __init__(self) -> None:
+        self.now = 500.0
+
+    def monotonic(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch: pytest.MonkeyPatch) -> FakeClock:
+    fake = FakeClock()
+    monkeypatch.setattr(circuit_breaker, "time", fake)
+    return fake
+
+
+def _fail(breaker: CircuitBreaker, times: int) -> None:
+    for _ in range(times):
+        assert breaker.allow()
+        breaker.record_failure()
+
+
+def test_opens_after_consecutive_failures(clock):
+    breaker = CircuitBreaker(threshold=3, reset_after=30)
+    _fail(breaker, 2)
+    breaker.record_success()  # a success resets the count
+    _fail(breaker, 2)
+    assert breaker.state == "closed"
+    _fail(breaker, 1)
+    assert breaker.state == "open"
+    assert not breaker.allow()
+    assert breaker.stats()["opened"] == 1
+    assert breaker.stats()["rejected"] == 1
+    clock.now += 10
+    assert breaker.retry_after() == pytest.approx(20)
+
+
+def test_half_open_lets_one_trial_through(clock):
+    breaker = CircuitBreaker(threshold=2, reset_after=30)
+    _fail(breaker, 2)
+    clock.now += 30
+    assert breaker.state == "half_open"
+    assert breaker.allow()
+    # Re-armed behind the trial: nothing else goes until it reports back
+    assert breaker.state == "open"
+    assert not breaker.allow()
+    breaker.record_success()
+    assert breaker.state == "closed"
+    assert breaker.allow()
+
+
+def test_failed_trial_keeps_it_open_for_another_period(clock):
+    breaker = CircuitBreaker(threshold=2, reset_after=30)
+    _fail(breaker, 2)
+    clock.now += 31
+    assert breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == "open"
+    assert breaker.retry_after() == pytest.approx(30)
+    assert breaker.stats()["opened"] == 1
+    # A trial that never reports back also waits out a whole period
+    clock.now += 30
+    assert breaker.allow()
+    clock.now += 29
+    assert not breaker.allow()
+    clock.now += 1
+    assert breaker.allow()
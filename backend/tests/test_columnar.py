@@ -0,0 +1,95 @@
+from __future__ import annotations
+
+from datetime import datetime, timedelta, timezone
+from typing import Any
+
+from app import columnar
+from app.serialization import dumps, loads
+
+
+def _decode(value: Any) -> Any:
+    """The frontend's decodeColumns (frontend/src/api/client.ts), in Python."""
+    if isinstance(value, list):
+        return [_decode(v) for v in value]
+    if not isinstance(value, dict):
+        return value
+    if "$columns" not in value:
+        return {k: _decode(v) for k, v in value.items()}
+    length = value["$length"]
+    columns = {k: _decode_column(c, length) for k, c in value["$columns"].items()}
+    return [{k: values[i] for k, values in columns.items()} for i in range(length)]
+
+
+def _decode_column(column: Any, length: int) -> list[Any]:
+    if isinstance(column, list):
+        return column
+    if "$repeat" in column:
+        return [column["$repeat"]] * length
+    scale = 1000 if column["$unit"] == "ms" else 1
+    out, t = [], 0
+    for d in column["$time_deltas"]:
+        t += d
+        out.append(datetime.fromtimestamp(t * scale / 1e6, timezone.utc).isoformat())
+    return out
+
+
+def _instant(value: str) -> datetime:
+    return datetime.fromisoformat(value.replace("Z", "+00:00"))
+
+
+def _round_trip(value: Any) -> Any:
+    return _decode(loads(dumps(columnar.encode(value))))
+
+
+def test_constant_columns_collapse_and_round_trip():
+    rows = [
+        {"session_key": 9, "driver_number": 4, "lap_number": n, "compound": "SOFT", "pit": n == 3}
+        for n in range(1, 6)
+    ]
+    encoded = columnar.encode(rows)
+    assert encoded["$length"] == 5
+    assert encoded["$columns"]["session_key"] == {"$repeat": 9}
+    assert encoded["$columns"]["compound"] == {"$repeat": "SOFT"}
+    assert encoded["$columns"]["lap_number"] == [1, 2, 3, 4, 5]
+    assert encoded["$columns"]["pit"] == [False, False, True, False, False]
+    assert _round_trip(rows) == rows
+
+
+def test_values_that_only_look_equal_are_not_collapsed():
+    rows = [{"gap": 1}, {"gap": 1.0}, {"gap": True}]
+    assert columnar.encode(rows)["$columns"]["gap"] == [1, 1.0, True]
+    assert [type(r["gap"]) for r in _round_trip(rows)] == [int, float, bool]
+
+
+def test_timestamps_become_deltas_and_decode_to_the_same_instants():
+    start = datetime(2024, 3, 2, 15, 0, 0, tzinfo=timezone.utc)
+    ms = [(start + timedelta(seconds=4.25 * i)).isoformat() for i in range(6)]
+    column = columnar.encode([{"date": d} for d in ms])["$columns"]["date"]
+    assert column["$unit"] == "ms"
+    assert column["$time_deltas"][1:] == [4250] * 5
+    assert [_instant(r["date"]) for r in _round_trip([{"date": d} for d in ms])] == [_instant(d) for d in ms]
+
+    us = ["2024-03-02T15:00:00.123456+00:00", "2024-03-02T15:00:04.000001Z"]
+    column = columnar.encode([{"date": d} for d in us])["$columns"]["date"]
+    assert column["$unit"] == "us"
+    assert [_instant(r["date"]) for r in _round_trip([{"date": d} for d in us])] == [_instant(d) for d in us]
+
+
+def test_mixed_and_missing_fields_stay_plain():
+    rows = [
+        {"date": "2024-03-02T15:00:00+00:00", "interval": 0.5},
+        {"date": None, "interval": None, "extra": "x"},
+    ]
+    encoded = columnar.encode(rows)
+    assert encoded["$columns"]["date"] == ["2024-03-02T15:00:00+00:00", None]
+    # A field missing from a row decodes as null, as the frontend reads it
+    assert _round_trip(rows) == [{**rows[0], "extra": None}, rows[1]]
+
+
+def test_nested_lists_of_objects_are_encoded_everywhere():
+    value = {"laps": [{"n": 1}, {"n": 2}], "meta": {"stints": [{"c": "HARD"}]}, "ids": [1, 2], "empty": []}
+    encoded = columnar.encode(value)
+    assert encoded["laps"] == {"$length": 2, "$columns": {"n": [1, 2]}}
+    assert encoded["meta"]["stints"] == {"$length": 1, "$columns": {"c": ["HARD"]}}
+    assert encoded["ids"] == [1, 2] and encoded["empty"] == []
+    assert _round_trip(value) == value
@@ -0,0 +1,109 @@
+from __future__ import annotations
+
+import numpy as np
+import pytest
+
+from app.degradation import DegradationModel
+from app.session_frame import SessionFrame
+
+OFFSET = {"SOFT": 0.0, "MEDIUM": 0.5, "HARD": 0.9}
+SLOPE = {"SOFT": 0.09, "MEDIUM": 0.05, "HARD": 0.03}
+FUEL = -0.03
+# (compound, first lap, tyre age at start) per stint; every driver stops twice
+PLANS = {
+    1: [("SOFT", 1, 0), ("MEDIUM", 15, 0), ("HARD", 33, 3)],
+    2: [("MEDIUM", 1, 0), ("HARD", 21, 0), ("SOFT", 42, 0)],
+    3: [("MEDIUM", 1, 3), ("SOFT", 25, 0), ("HARD", 36, 0)],
+    4: [("SOFT", 1, 0), ("HARD", 12, 0), ("MEDIUM", 38, 3)],
+    5: [("SOFT", 1, 3), ("MEDIUM", 17, 0), ("SOFT", 40, 0)],
+    6: [("MEDIUM", 1, 0), ("SOFT", 28, 0), ("MEDIUM", 39, 0)],
+    7: [("SOFT", 1, 0), ("HARD", 14, 0), ("SOFT", 44, 3)],
+    8: [("MEDIUM", 1, 0), ("HARD", 19, 3), ("SOFT", 37, 0)],
+}
+PACE = {dn: 90.0 + 0.15 * dn for dn in PLANS}
+LAPS = 50
+NOISE = 0.1  # s of lap-to-lap variation
+# (driver, lap) with a slow lap (traffic, a mistake) the fit should leave out
+SLOW_LAPS = {(1, 7), (2, 30), (3, 18), (4, 44), (6, 9), (8, 26)}
+
+
+def _true_lap_time(dn: int, compound: str, age: int, lap: int) -> float:
+    return PACE[dn] + OFFSET[compound] + SLOPE[compound] * age + FUEL * lap
+
+
+def _payloads() -> dict[str, list[dict]]:
+    rng = np.random.default_rng(3)
+    laps, stints = [], []
+    for dn, plan in PLANS.items():
+        for n, (compound, start, age0) in enumerate(plan, start=1):
+            end = plan[n][1] - 1 if n < len(plan) else LAPS
+            stints.append(dict(
+                driver_number=dn, stint_number=n, compound=compound,
+                lap_start=start, lap_end=end, tyre_age_at_start=age0,
+            ))
+            for lap in range(start, end + 1):
+                pit_out = lap == start and n > 1
+                duration = _true_lap_time(dn, compound, age0 + lap - start, lap)
+                duration += rng.normal(0, NOISE) + (20.0 if pit_out else 0.0)
+                if (dn, lap) in SLOW_LAPS:
+                    duration += 8.0
+                laps.append(dict(
+                    driver_number=dn, lap_number=lap, is_pit_out_lap=pit_out,
+                    lap_duration=duration, date_start=None,
+                ))
+    return {
+        "laps": laps, "stints": stints, "pit": [], "intervals": [],
+        "position": [], "weather": [], "drivers": [],
+    }
+
+
+def _model() -> DegradationModel:
+    return DegradationModel(SessionFrame(1, _payloads()), outlier_factor=1.2)
+
+
+def test_recovers_known_degradation_rates():
+    model = _model()
+    for compound, slope in SLOPE.items():
+        assert model.degradation(None, compound) == pytest.approx(slope, abs=5e-3)
+    assert model.degradation(None, "INTERMEDIATE") is None
+
+
+def test_predicts_lap_times_with_the_fuel_effect():
+    model = _model()
+    ages, laps = np.array([2.0, 10.0]), np.array([30.0, 45.0])
+    for dn in PACE:
+        for compound in SLOPE:
+            expected = [_true_lap_time(dn, compound, int(a), int(l)) for a, l in zip(ages, laps)]
+            predicted = model.lap_times(None, dn, compound, ages, laps)
+            assert predicted == pytest.approx(expected, abs=0.06)
+    assert model.lap_times(None, 99, "SOFT", ages, laps) is None
+
+
+def test_fit_as_of_a_lap_only_uses_laps_up_to_it():
+    model = _model()
+    ages, laps = np.array([1.0, 2.0]), np.array([11.0, 12.0])
+    # Nobody has run hards before lap 12 (driver 4's out-lap), or anything by lap 0
+    assert model.degradation(12, "HARD") is None
+    assert model.lap_times(12, 4, "HARD", ages, laps) is None
+    assert model.degradation(13, "HARD") is not None
+    assert model.lap_times(0, 1, "SOFT", ages, laps) is None
+    # The fit moves as laps come in
+    assert model.degradation(20, "SOFT") != model.degradation(None, "SOFT")
+
+
+def test_batched_fits_match_single_fits():
+    model = _model()
+    up_to = np.arange(0, LAPS + 3)
+    compounds = [("SOFT", "MEDIUM", "HARD", None)[i % 4] for i in range(up_to.size)]
+    ages = np.tile([[1.0, 2.0]], (up_to.size, 1)) + up_to[:, None] % 7
+    laps = up_to[:, None] + np.array([1.0, 2.0])
+    batched = model.lap_times_at(up_to, 2, compounds, ages, laps)
+    rates = model.degradation_at(up_to, compounds)
+    for i, lap in enumerate(up_to):
+        single = model.lap_times(int(lap), 2, compounds[i], ages[i], laps[i])
+        if single is None:
+            assert np.isnan(batched[i]).all()
+        else:
+            assert batched[i] == pytest.approx(single, rel=1e-12)
+        rate = model.degradation(int(lap), compounds[i])
+        assert (np.isnan(rates[i]) if rate is None else rates[i] == pytest.approx(rate, rel=1e-12))
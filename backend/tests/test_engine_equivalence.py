@@ -0,0 +1,96 @@
+"""The columnar strategy engine against the original implementations.
+
+Every lookup is made through both on the same synthetic races, across
+laps and drivers, and must give the same number.
+"""
+from __future__ import annotations
+
+import pytest
+
+from app import strategy_engine
+from app.session_frame import get_session_frame
+
+from . import reference
+
+# Before the first lap, through the race, past the end, and "latest"
+LAPS = [None, 1, 2, 3, 5, 9, 14, 20, 27, 33, 40, 48, 55, 57, 80]
+COMPOUNDS = [None, "SOFT", "medium", "HARD", "INTERMEDIATE"]
+
+
+def _same(actual: float | None, expected: float | None) -> bool:
+    if actual is None or expected is None:
+        return actual is expected
+    return actual == pytest.approx(expected, rel=1e-9, abs=1e-9)
+
+
+def _some_drivers(race) -> list[int]:
+    return race.drivers[::3]
+
+
+def test_mean_pit_loss(race, run):
+    for lap in LAPS:
+        expected = run(reference.calculate_mean_pit_loss(race.client, race.session_key, lap))
+        actual = run(strategy_engine.calculate_mean_pit_loss(race.client, race.session_key, lap))
+        assert _same(actual, expected), lap
+
+
+def test_clean_laps(race, run):
+    for dn in _some_drivers(race):
+        for lap in LAPS:
+            expected = run(reference.get_clean_laps(race.client, race.session_key, dn, lap))
+            actual = run(strategy_engine.get_clean_laps(race.client, race.session_key, dn, lap))
+            assert sorted(actual["lap_number"]) == sorted(expected["lap_number"]), (dn, lap)
+            by_lap = dict(zip(actual["lap_number"], actual["lap_duration"]))
+            for n, duration in zip(expected["lap_number"], expected["lap_duration"]):
+                assert by_lap[n] == duration
+
+
+@pytest.mark.parametrize("last_n", [1, 3, 5])
+def test_driver_race_pace(race, run, last_n):
+    for dn in _some_drivers(race):
+        for lap in LAPS:
+            expected = run(reference.get_driver_race_pace(
+                race.client, race.session_key, dn, last_n=last_n, up_to_lap=lap,
+            ))
+            actual = run(strategy_engine.get_driver_race_pace(
+                race.client, race.session_key, dn, last_n=last_n, up_to_lap=lap,
+            ))
+            assert _same(actual, expected), (dn, lap)
+
+
+def test_fresh_tyre_pace(race, run):
+    for dn in _some_drivers(race):
+        for compound in COMPOUNDS:
+            expected = run(reference.get_fresh_tyre_pace(race.client, race.session_key, dn, compound))
+            actual = run(strategy_engine.get_fresh_tyre_pace(race.client, race.session_key, dn, compound))
+            assert _same(actual, expected), (dn, compound)
+
+
+def test_pit_stop_advantage(race, run):
+    for compound in COMPOUNDS:
+        expected = run(reference.get_pit_stop_advantage(race.client, race.session_key, compound))
+        actual = run(strategy_engine.get_pit_stop_advantage(race.client, race.session_key, compound))
+        assert _same(actual, expected), compound
+
+
+def test_gap_at_lap(race, run):
+    frame = run(get_session_frame(race.client, race.session_key))
+    for chaser in _some_drivers(race):
+        laps = run(race.client.get_laps(session_key=race.session_key, driver_number=chaser))
+        intervals = run(race.client.get_intervals(session_key=race.session_key, driver_number=chaser))
+        for lap in range(1, race.total_laps + 2):
+            expected = run(reference._get_gap_at_lap(
+                race.client, race.session_key, chaser, race.drivers[0], lap, [], laps, intervals,
+            ))
+            assert _same(strategy_engine._gap_at_lap(frame, chaser, lap), expected), (chaser, lap)
+
+
+def test_timeline_matches_evaluate(race, run):
+    leader, chaser = race.drivers[0], race.drivers[1]
+    timeline = run(strategy_engine.get_undercut_timeline(race.client, race.session_key, leader, chaser))
+    assert timeline.total_laps == race.total_laps
+    for point in timeline.laps[::4]:
+        scalars = run(strategy_engine.evaluate_undercut_scalars(
+            race.client, race.session_key, leader, chaser, at_lap=point.at_lap,
+        ))
+        assert point.model_dump() == scalars.model_dump()
@@ -0,0 +1,134 @@
+from __future__ import annotations
+
+import time
+from datetime import datetime, timedelta, timezone
+
+from app import live_buffer, openf1_client
+from app.live_buffer import LiveBuffer
+from app.openf1_client import OpenF1Client
+from bench import synthetic
+from bench.stand_in import OpenF1StandIn, _filters, _matches
+
+URL = "https://api.openf1.org/v1/laps?session_key=1"
+
+
+def _laps(leader_laps: int, behind: int) -> list[dict]:
+    """Lap rows for a leader and a car `behind` laps down."""
+    return [
+        dict(session_key=1, driver_number=dn, lap_number=n, lap_duration=90.0 + dn)
+        for dn, last in ((1, leader_laps), (2, leader_laps - behind))
+        for n in range(1, last + 1)
+    ]
+
+
+def _poll(buffer: LiveBuffer, upstream: list[dict]) -> None:
+    """One delta poll, answered like OpenF1 would from `upstream`."""
+    delta_url = buffer.delta_url(URL)
+    assert delta_url is not None
+    filters = _filters(delta_url.split("?", 1)[1])
+    buffer.merge([r for r in upstream if _matches(r, filters)], 0)
+
+
+def _keys(rows: list[dict]) -> set[tuple]:
+    return {(r["driver_number"], r["lap_number"]) for r in rows}
+
+
+def test_date_cursor_asks_for_newer_rows():
+    rows = [
+        {"driver_number": 1, "date": "2024-03-02T15:00:00+00:00", "interval": 0.5},
+        {"driver_number": 1, "date": "2024-03-02T15:00:04+00:00", "interval": 0.6},
+    ]
+    buffer = LiveBuffer("/intervals", rows, 0)
+    url = "https://api.openf1.org/v1/intervals?session_key=1"
+    assert buffer.delta_url(url) == f"{url}&date>=2024-03-02T15:00:04%2B00:00"
+    assert LiveBuffer("/intervals", [], 0).delta_url(url) is None
+
+
+def test_merge_appends_in_place_and_skips_known_rows():
+    rows = [{"driver_number": 1, "date": "a", "interval": 0.5}]
+    buffer = LiveBuffer("/intervals", rows, 10)
+    added = buffer.merge([
+        {"driver_number": 1, "date": "a", "interval": 0.5},
+        {"driver_number": 1, "date": "b", "interval": 0.7},
+    ], 5)
+    assert added == 1
+    assert buffer.rows is rows
+    assert [r["date"] for r in rows] == ["a", "b"]
+    assert buffer.wire_size == 15
+
+
+def test_changed_lap_rows_are_swapped_into_a_new_list():
+    rows = [{"driver_number": 1, "lap_number": 3, "lap_duration": None}]
+    buffer = LiveBuffer("/laps", rows, 0)
+    added = buffer.merge([{"driver_number": 1, "lap_number": 3, "lap_duration": 91.2}], 0)
+    assert added == 1
+    assert buffer.rows is not rows
+    assert buffer.rows[0]["lap_duration"] == 91.2
+
+
+def test_cars_laps_down_keep_getting_their_laps():
+    buffer = LiveBuffer("/laps", _laps(10, behind=8), 0)
+    for leader_laps in range(11, 31):
+        _poll(buffer, _laps(leader_laps, behind=8))
+    assert _keys(buffer.rows) == _keys(_laps(30, behind=8))
+    assert sum(r["driver_number"] == 2 for r in buffer.rows) == 22
+
+
+def test_retired_cars_do_not_hold_the_laps_cursor_back():
+    def upstream(leader_laps: int) -> list[dict]:
+        retired = [dict(session_key=1, driver_number=3, lap_number=n, lap_duration=95.0) for n in range(1, 6)]
+        return _laps(leader_laps, behind=8) + retired
+
+    buffer = LiveBuffer("/laps", upstream(10), 0)
+    for leader_laps in range(11, 31):
+        _poll(buffer, upstream(leader_laps))
+    # The lapped car still sets the cursor; the car out on lap 5 doesn't
+    assert buffer.delta_url(URL) == f"{URL}&lap_number>=22"
+    assert _keys(buffer.rows) == _keys(upstream(30))
+
+
+def test_date_cursor_follows_merged_rows():
+    buffer = LiveBuffer("/weather", [{"date": "2024-03-02T15:00:00"}], 0)
+    buffer.merge([{"date": "2024-03-02T15:01:00"}, {"date": "2024-03-02T15:00:30"}], 0)
+    assert buffer.delta_url(URL).endswith("date>=2024-03-02T15:01:00")
+    buffer.merge([], 0)
+    assert buffer.delta_url(URL).endswith("date>=2024-03-02T15:01:00")
+
+
+def test_full_refetch_after_enough_polls():
+    buffer = LiveBuffer("/laps", _laps(5, behind=0), 0)
+    for leader_laps in range(6, 6 + live_buffer.FULL_REFETCH_POLLS):
+        _poll(buffer, _laps(leader_laps, behind=0))
+    assert buffer.delta_url(URL) is None
+
+
+def test_finished_session_is_refetched_in_full(run):
+    session_key = 9201
+    payloads = synthetic.generate_race(
+        seed=4, drivers=4, laps=20, session_key=session_key,
+        session_end=datetime.now(timezone.utc) + timedelta(hours=1),
+    )
+    all_laps = payloads["/laps"]
+    payloads["/laps"] = [l for l in all_laps if l["lap_number"] <= 10]
+    transport = OpenF1StandIn(payloads)
+    client = OpenF1Client(store_path=None, transport=transport)
+    try:
+        run(client.get_sessions(session_key=session_key))
+        live = run(client.get_laps(session_key=session_key))
+        assert len(live) == len(payloads["/laps"])
+        assert any(url.endswith(f"/laps?session_key={session_key}") for url in openf1_client._live)
+
+        # The session ends; the last laps arrive with the final payload
+        payloads["/laps"] = all_laps
+        openf1_client._session_end[str(session_key)] = (
+            time.time() - openf1_client._FINISHED_GRACE - 1
+        )
+        final = run(client.get_laps(session_key=session_key))
+        assert _keys(final) == _keys(all_laps)
+        assert not any(f"session_key={session_key}" in url for url in openf1_client._live)
+        # ...and is served from the cache from then on
+        requests = transport.requests
+        assert run(client.get_laps(session_key=session_key)) is final
+        assert transport.requests == requests
+    finally:
+        run(client.close())
@@ -0,0 +1,69 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+from typing import Any, Awaitable, Callable, Iterator
+
+import pytest
+
+from app import live_stream, strategy_engine
+from app.live_stream import Subscriber, UndercutHub
+from app.openf1_client import OpenF1Client
+from app.session_frame import get_session_frame
+from bench import synthetic
+from bench.stand_in import OpenF1StandIn
+
+SESSION_KEY = 9602
+
+
+@pytest.fixture
+def hub(monkeypatch: pytest.MonkeyPatch, run: Callable[[Awaitable[Any]], Any]) -> Iterator[UndercutHub]:
+    monkeypatch.setattr(live_stream, "_warned", {})
+    payloads = synthetic.generate_race(seed=7, drivers=4, laps=12, session_key=SESSION_KEY)
+    client = OpenF1Client(store_path=None, transport=OpenF1StandIn(payloads))
+    hub = UndercutHub(client, interval=0.01)
+    yield hub
+    run(hub.close())
+    run(client.close())
+
+
+def _fail_for(monkeypatch: pytest.MonkeyPatch, leader: int, exc: Exception) -> None:
+    snapshot = strategy_engine.undercut_snapshot
+
+    def flaky(frame, leader_number, chaser_number, simulate=False):
+        if leader_number == leader:
+            raise exc
+        return snapshot(frame, leader_number, chaser_number, simulate)
+
+    monkeypatch.setattr(strategy_engine, "undercut_snapshot", flaky)
+
+
+def test_a_pair_with_bad_data_is_skipped_with_one_warning(hub, monkeypatch, caplog, run):
+    _fail_for(monkeypatch, 3, ValueError("no stints"))
+    good, bad = (SESSION_KEY, 1, 2), (SESSION_KEY, 3, 4)
+    frame = run(get_session_frame(hub.client, SESSION_KEY))
+    with caplog.at_level(logging.WARNING, logger=live_stream.__name__):
+        for _ in range(3):
+            snapshots = live_stream._snapshots(frame, [good, bad])
+    assert list(snapshots) == [good]
+    warnings = [r for r in caplog.records if "skipped" in r.getMessage()]
+    assert len(warnings) == 1 and warnings[0].exc_info is not None
+
+
+def test_an_unexpected_error_is_logged_and_polling_goes_on(hub, monkeypatch, caplog, run):
+    _fail_for(monkeypatch, 3, RuntimeError("bug"))
+    sub = Subscriber()
+
+    async def scenario() -> None:
+        hub.subscribe(sub, (SESSION_KEY, 3, 4))
+        while not any("failed" in r.getMessage() for r in caplog.records):
+            await asyncio.sleep(0.01)
+        # The poller survives; once the bug is gone the pair gets its values
+        monkeypatch.undo()
+        await asyncio.wait_for(sub.next_batch(), 5)
+
+    with caplog.at_level(logging.ERROR, logger=live_stream.__name__):
+        run(scenario())
+    record = next(r for r in caplog.records if "failed" in r.getMessage())
+    assert record.exc_info[0] is RuntimeError
+    assert hub.stats()["sessions_polled"] == 1
@@ -0,0 +1,48 @@
+from __future__ import annotations
+
+import numpy as np
+
+from app.monte_carlo import simulate_undercut
+
+EMPTY = np.array([])
+
+
+def _simulate(advantages, residuals=EMPTY, gap=1.0, seed=0, samples=20_000):
+    return simulate_undercut(
+        gap, 3, np.asarray(advantages, dtype=float), residuals, residuals,
+        np.array([20.0, 20.5, 21.0]), seed, samples=samples,
+    )
+
+
+def test_same_inputs_and_seed_give_the_same_result():
+    rng = np.random.default_rng(1)
+    advantages, residuals = rng.normal(0.5, 0.3, 8), rng.normal(0, 0.2, 12)
+    assert _simulate(advantages, residuals, seed=[4, 2]) == _simulate(advantages, residuals, seed=[4, 2])
+    assert _simulate(advantages, residuals, seed=1) != _simulate(advantages, residuals, seed=2)
+
+
+def test_a_certain_outcome_has_no_interval():
+    # Pit-lane differences are at most 1 s; a 3 s-per-lap advantage always wins
+    won = _simulate([3.0, 3.0])
+    assert (won.probability, won.probability_low, won.probability_high) == (100.0, 100.0, 100.0)
+    lost = _simulate([-3.0])
+    assert (lost.probability, lost.probability_low, lost.probability_high) == (0.0, 0.0, 0.0)
+
+
+def test_interval_contains_the_estimate_and_shrinks_with_more_data():
+    rng = np.random.default_rng(5)
+    few = _simulate(rng.normal(0.3, 0.4, 4))
+    many = _simulate(rng.normal(0.3, 0.4, 400))
+    for result in (few, many):
+        assert result.probability_low <= result.probability <= result.probability_high
+        assert result.margin_p05 <= result.margin_p50 <= result.margin_p95
+    assert 0.0 < many.probability < 100.0
+    # The bootstrap spread of four measured stops dwarfs that of four hundred
+    few_width = few.probability_high - few.probability_low
+    many_width = many.probability_high - many.probability_low
+    assert few_width > 2 * many_width
+
+
+def test_samples_are_split_into_whole_batches():
+    assert _simulate([1.0], samples=1_050).samples == 1_000
+    assert _simulate([1.0], samples=7).samples == 7
@@ -0,0 +1,256 @@
+from __future__ import annotations
+
+import asyncio
+from typing import Any, Awaitable, Callable, Iterator
+
+import httpx
+import pytest
+
+from app import openf1_client
+from app.openf1_client import OfflineMissError, OpenF1Client, fetch_stats
+from app.rate_limiter import Priority, TokenBucket, priority
+from bench import synthetic
+from bench.stand_in import OpenF1StandIn
+
+BASE = "https://api.openf1.org/v1"
+
+
+class Upstream:
+    """OpenF1 stand-in that counts requests and can hold them until released."""
+
+    def __init__(self) -> None:
+        self.requests: list[str] = []
+        self.gate: asyncio.Event | None = None
+        self.status = 200
+        self.body = b'[{"lap_number": 1}]'
+        self.client = httpx.AsyncClient(transport=httpx.MockTransport(self.handle))
+
+    async def handle(self, request: httpx.Request) -> httpx.Response:
+        self.requests.append(str(request.url))
+        if self.gate is not None:
+            await self.gate.wait()
+        return httpx.Response(self.status, content=self.body)
+
+    async def until_requested(self, n: int = 1) -> None:
+        while len(self.requests) < n:
+            await asyncio.sleep(0)
+
+
+@pytest.fixture
+def upstream(monkeypatch: pytest.MonkeyPatch, run: Callable[[Awaitable[Any]], Any]) -> Iterator[Upstream]:
+    """An httpx client on an Upstream, with a limiter and breaker of its own."""
+    fake = Upstream()
+    monkeypatch.setattr(openf1_client, "_limiter", TokenBucket(rate=1000, burst=1000))
+    monkeypatch.setattr(openf1_client, "_breaker", openf1_client.CircuitBreaker(5, 30))
+    yield fake
+    run(fake.client.aclose())
+
+
+def test_concurrent_callers_share_one_request(upstream, run):
+    url = f"{BASE}/laps?session_key=9301"
+
+    async def scenario() -> list[Any]:
+        upstream.gate = asyncio.Event()
+        callers = [asyncio.ensure_future(openf1_client._fetch(upstream.client, url)) for _ in range(5)]
+        await upstream.until_requested()
+        await asyncio.sleep(0)
+        upstream.gate.set()
+        return await asyncio.gather(*callers)
+
+    coalesced = fetch_stats()["coalesced"]
+    results = run(scenario())
+    assert len(upstream.requests) == 1
+    assert all(r is results[0] for r in results)
+    assert fetch_stats()["coalesced"] == coalesced + 4
+    assert url not in openf1_client._inflight
+
+
+def test_a_cancelled_caller_does_not_cancel_the_shared_fetch(upstream, run):
+    url = f"{BASE}/laps?session_key=9302"
+
+    async def scenario() -> Any:
+        upstream.gate = asyncio.Event()
+        first = asyncio.ensure_future(openf1_client._fetch(upstream.client, url))
+        second = asyncio.ensure_future(openf1_client._fetch(upstream.client, url))
+        await upstream.until_requested()
+        first.cancel()
+        await asyncio.sleep(0)
+        assert first.cancelled()
+        upstream.gate.set()
+        return await second
+
+    assert run(scenario()) == [{"lap_number": 1}]
+    assert len(upstream.requests) == 1
+    # The result was cached for later callers too
+    assert run(openf1_client._fetch(upstream.client, url)) == [{"lap_number": 1}]
+    assert len(upstream.requests) == 1
+
+
+def test_a_joining_caller_raises_the_shared_priority(upstream, run):
+    url = f"{BASE}/laps?session_key=9303"
+
+    async def scenario() -> list[Priority]:
+        upstream.gate = asyncio.Event()
+        with priority(Priority.BACKGROUND):
+            background = asyncio.ensure_future(openf1_client._fetch(upstream.client, url))
+        await upstream.until_requested()
+        levels = [openf1_client._inflight_priority[url].level]
+        with priority(Priority.INTERACTIVE):
+            interactive = asyncio.ensure_future(openf1_client._fetch(upstream.client, url))
+        await asyncio.sleep(0)
+        levels.append(openf1_client._inflight_priority[url].level)
+        upstream.gate.set()
+        await asyncio.gather(background, interactive)
+        return levels
+
+    assert run(scenario()) == [Priority.BACKGROUND, Priority.INTERACTIVE]
+
+
+def test_a_failed_fetch_fails_every_waiter_and_is_not_kept(upstream, run):
+    url = f"{BASE}/laps?session_key=9304"
+    upstream.status = 404
+
+    async def scenario() -> list[Any]:
+        upstream.gate = asyncio.Event()
+        callers = [asyncio.ensure_future(openf1_client._fetch(upstream.client, url)) for _ in range(3)]
+        await upstream.until_requested()
+        upstream.gate.set()
+        return await asyncio.gather(*callers, return_exceptions=True)
+
+    results = run(scenario())
+    assert all(isinstance(r, httpx.HTTPStatusError) for r in results)
+    assert len(upstream.requests) == 1
+    assert url not in openf1_client._inflight
+
+
+def test_cache_evicts_least_recently_used_first():
+    cache = openf1_client._ResponseCache(max_bytes=100)
+    cache.set(f"{BASE}/laps?session_key=1", "a", 40)
+    cache.set(f"{BASE}/laps?session_key=2", "b", 40)
+    assert cache.get(f"{BASE}/laps?session_key=1") is not None
+    cache.set(f"{BASE}/laps?session_key=3", "c", 40)
+    assert cache.get(f"{BASE}/laps?session_key=2") is None
+    assert cache.get(f"{BASE}/laps?session_key=1")[0] == "a"
+    assert cache.get(f"{BASE}/laps?session_key=3")[0] == "c"
+    assert (cache.bytes, cache.evictions) == (80, 1)
+
+    # Replacing an entry frees its old size; one too big for the budget is skipped
+    cache.set(f"{BASE}/laps?session_key=3", "c2", 10)
+    cache.set(f"{BASE}/laps?session_key=4", "huge", 101)
+    assert cache.bytes == 50
+    assert cache.get(f"{BASE}/laps?session_key=4") is None
+
+
+def test_ttl_follows_the_session_lifecycle(monkeypatch):
+    now = openf1_client.time.time()
+    grace = openf1_client._FINISHED_GRACE
+    monkeypatch.setitem(openf1_client._session_end, "9311", now + 600)  # running
+    monkeypatch.setitem(openf1_client._session_end, "9312", now - grace + 60)  # just ended
+    monkeypatch.setitem(openf1_client._session_end, "9313", now - grace - 60)  # final
+    monkeypatch.setitem(openf1_client._meeting_end, "9320", now - grace - 60)
+    ttl = openf1_client._ttl_for
+    assert ttl(f"{BASE}/laps?session_key=9311") == openf1_client._TTL_LIVE
+    assert ttl(f"{BASE}/laps?session_key=9312") == openf1_client._TTL_LIVE
+    assert ttl(f"{BASE}/laps?session_key=9313") is None
+    assert ttl(f"{BASE}/laps?session_key=latest") == openf1_client._TTL_LIVE
+    assert ttl(f"{BASE}/laps?session_key=9399") == openf1_client._TTL_HISTORICAL
+    assert ttl(f"{BASE}/sessions?meeting_key=9320") is None
+    assert ttl(f"{BASE}/meetings?year=2023") is None
+    assert ttl(f"{BASE}/meetings") == openf1_client._TTL_HISTORICAL
+
+
+def test_cache_reports_entries_past_their_ttl(monkeypatch):
+    url = f"{BASE}/laps?session_key=9314"
+    monkeypatch.setitem(openf1_client._session_end, "9314", openf1_client.time.time() + 600)
+    cache = openf1_client._ResponseCache(max_bytes=100)
+    cache.set(url, "rows", 10)
+    assert cache.get(url) == ("rows", 0.0)
+    stored_at, size, data = cache._entries[url]
+    cache._entries[url] = (stored_at - openf1_client._TTL_LIVE - 5, size, data)
+    data, overdue = cache.get(url)
+    assert data == "rows" and overdue == pytest.approx(5, abs=0.5)
+    # Once the session is final the same entry never expires
+    monkeypatch.setitem(openf1_client._session_end, "9314", 0.0)
+    assert cache.get(url) == ("rows", 0.0)
+    assert (cache.hits, cache.stale_hits) == (2, 1)
+
+
+def test_offline_mode_serves_finished_sessions_from_the_store(tmp_path, monkeypatch, run):
+    session_key = 9331
+    payloads = synthetic.generate_race(seed=5, drivers=4, laps=12, session_key=session_key)
+    store_path = str(tmp_path / "store.sqlite3")
+    online = OpenF1Client(store_path=store_path, transport=OpenF1StandIn(payloads))
+    writes = fetch_stats()["store_writes"]
+    run(online.get_sessions(session_key=session_key))
+    laps = run(online.get_laps(session_key=session_key))
+    run(online.close())
+    assert fetch_stats()["store_writes"] == writes + 2
+
+    # A restart: nothing in memory, and any network call is an error
+    monkeypatch.setattr(openf1_client, "_cache", openf1_client._ResponseCache(1 << 30))
+    network = Upstream()
+    offline = OpenF1Client(store_path=store_path, offline=True, transport=httpx.MockTransport(network.handle))
+    try:
+        assert run(offline.get_laps(session_key=session_key)) == laps
+        with pytest.raises(OfflineMissError):
+            run(offline.get_stints(session_key=session_key))
+        assert network.requests == []
+    finally:
+        run(offline.close())
+    with pytest.raises(ValueError):
+        OpenF1Client(store_path=None, offline=True)
+
+
+def _age(url: str, seconds: float) -> None:
+    """Make a cached entry look `seconds` older."""
+    stored_at, size, data = openf1_client._cache._entries[url]
+    openf1_client._cache._entries[url] = (stored_at - seconds, size, data)
+
+
+def test_stale_entries_are_served_while_they_refresh(upstream, monkeypatch, run):
+    url = f"{BASE}/stints?session_key=9341"
+    monkeypatch.setitem(openf1_client._session_end, "9341", openf1_client.time.time() + 600)
+    run(openf1_client._fetch(upstream.client, url))
+    _age(url, openf1_client._TTL_LIVE + 30)
+    upstream.body = b'[{"lap_number": 2}]'
+
+    async def scenario() -> tuple[Any, float]:
+        upstream.gate = asyncio.Event()
+        with openf1_client.track_staleness() as staleness:
+            data = await openf1_client._fetch(upstream.client, url)
+        # Answered from the cache while the refresh waits on upstream
+        await upstream.until_requested(2)
+        assert url in openf1_client._inflight
+        upstream.gate.set()
+        await openf1_client._inflight[url]
+        return data, staleness.seconds
+
+    data, stale_for = run(scenario())
+    assert data == [{"lap_number": 1}]
+    assert stale_for == pytest.approx(30, abs=1)
+    assert run(openf1_client._fetch(upstream.client, url)) == [{"lap_number": 2}]
+    assert len(upstream.requests) == 2
+
+
+def test_open_breaker_serves_stale_data_and_fails_misses_fast(upstream, monkeypatch, run):
+    url = f"{BASE}/laps?session_key=9342"
+    monkeypatch.setitem(openf1_client._session_end, "9342", openf1_client.time.time() + 600)
+    run(openf1_client._fetch(upstream.client, url))
+    _age(url, openf1_client._TTL_LIVE + 30)
+
+    breaker = openf1_client._breaker
+    for _ in range(breaker.threshold):
+        breaker.record_failure()
+    assert breaker.state == "open"
+
+    async def stale_then_refresh() -> Any:
+        data = await openf1_client._fetch(upstream.client, url)
+        # The background refresh is refused by the breaker, quietly
+        await asyncio.gather(openf1_client._inflight[url], return_exceptions=True)
+        return data
+
+    assert run(stale_then_refresh()) == [{"lap_number": 1}]
+    with pytest.raises(openf1_client.UpstreamUnavailableError) as exc:
+        run(openf1_client._fetch(upstream.client, f"{BASE}/stints?session_key=9342"))
+    assert exc.value.retry_after > 0
+    assert len(upstream.requests) == 1
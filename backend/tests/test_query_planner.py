@@ -0,0 +1,53 @@
+from __future__ import annotations
+
+import operator
+from app.openf1_client import OpenF1Client
+from app.query_planner import IndexCache, RowIndex, plan_query
+from bench import synthetic
+from bench.stand_in import OpenF1StandIn, _filters, _matches
+
+
+def test_narrow_session_queries_are_widened():
+    wide, filters = plan_query("/laps", {"session_key": 9, "driver_number": 4, "lap_number>=": 10})
+    assert wide == {"session_key": 9}
+    assert filters == [("driver_number", operator.eq, 4), ("lap_number", operator.ge, 10)]
+    # Already session-wide, not session-scoped, or not a widenable endpoint
+    assert plan_query("/laps", {"session_key": 9}) is None
+    assert plan_query("/laps", {"driver_number": 4}) is None
+    assert plan_query("/car_data", {"session_key": 9, "driver_number": 4}) is None
+    assert plan_query("/laps", None) is None
+
+
+def test_row_index_selects_like_the_filters():
+    rows = [{"driver_number": dn, "lap_number": n} for n in range(1, 6) for dn in (1, 4)]
+    index = RowIndex(rows)
+    _, filters = plan_query("/laps", {"session_key": 9, "driver_number": "4", "lap_number<": "3"})
+    assert index.select(filters) == [{"driver_number": 4, "lap_number": 1}, {"driver_number": 4, "lap_number": 2}]
+    # Rows appended to a live payload are picked up by the cached index
+    cache = IndexCache()
+    assert cache.get("u", rows) is cache.get("u", rows)
+    rows.append({"driver_number": 4, "lap_number": 6})
+    _, filters = plan_query("/laps", {"session_key": 9, "driver_number": 4, "lap_number>": 5})
+    assert cache.get("u", rows).select(filters) == [{"driver_number": 4, "lap_number": 6}]
+
+
+def test_narrow_requests_are_served_from_one_wide_payload(run):
+    session_key = 9501
+    payloads = synthetic.generate_race(seed=6, drivers=6, laps=15, session_key=session_key)
+    transport = OpenF1StandIn(payloads)
+    client = OpenF1Client(store_path=None, transport=transport)
+    queries = [
+        {"session_key": session_key, "driver_number": dn, **extra}
+        for dn in (1, 4, 11, 99)
+        for extra in ({}, {"lap_number>=": 10}, {"lap_number<=": "3"})
+    ]
+    try:
+        for params in queries:
+            rows = run(client.get_laps(**params))
+            # What OpenF1 itself would have answered for the narrow query
+            query = "&".join(f"{k}{v}" if k[-1] in "<>=" else f"{k}={v}" for k, v in params.items())
+            expected = [r for r in payloads["/laps"] if _matches(r, _filters(query))]
+            assert rows == expected, params
+        assert transport.requests == 1
+    finally:
+        run(client.close())
@@ -0,0 +1,130 @@
+from __future__ import annotations
+
+import asyncio
+import time
+import types
+
+import httpx
+import pytest
+
+from app import openf1_client, rate_limiter
+from app.rate_limiter import Priority, SharedPriority, TokenBucket, priority, shared_priority
+
+
+class FakeClock:
+    """time.monotonic for the limiter; its sleeps advance the clock at once."""
+
+    def __init__(self) -> None:
+        self.now = 1000.0
+
+    def monotonic(self) -> float:
+        return self.now
+
+    async def sleep(self, delay: float) -> None:
+        self.now += delay
+        await asyncio.sleep(0)
+
+
+@pytest.fixture
+def clock(monkeypatch: pytest.MonkeyPatch) -> FakeClock:
+    fake = FakeClock()
+    monkeypatch.setattr(rate_limiter, "time", fake)
+    monkeypatch.setattr(rate_limiter, "asyncio", types.SimpleNamespace(
+        get_running_loop=asyncio.get_running_loop,
+        ensure_future=asyncio.ensure_future,
+        Future=asyncio.Future,
+        sleep=fake.sleep,
+    ))
+    return fake
+
+
+async def _acquire_all(bucket: TokenBucket, callers: list[tuple[str, Priority | SharedPriority]]) -> list[str]:
+    """Queue every caller at once and return the order they were let through."""
+    served: list[str] = []
+
+    async def one(name: str, level: Priority | SharedPriority) -> None:
+        if isinstance(level, SharedPriority):
+            shared_priority.set(level)
+            await bucket.acquire()
+        else:
+            with priority(level):
+                await bucket.acquire()
+        served.append(name)
+
+    await asyncio.gather(*(one(name, level) for name, level in callers))
+    return served
+
+
+def test_burst_is_granted_without_waiting(clock, run):
+    bucket = TokenBucket(rate=2, burst=3)
+    run(_acquire_all(bucket, [("a", Priority.NORMAL), ("b", Priority.NORMAL), ("c", Priority.NORMAL)]))
+    stats = bucket.stats()
+    assert (stats["granted"], stats["waited"]) == (3, 0)
+    assert clock.now == 1000.0
+
+
+def test_highest_priority_waiter_is_served_first(clock, run):
+    bucket = TokenBucket(rate=2, burst=1)
+    served = run(_acquire_all(bucket, [
+        ("first", Priority.BACKGROUND),  # takes the only token
+        ("background", Priority.BACKGROUND),
+        ("normal-1", Priority.NORMAL),
+        ("interactive", Priority.INTERACTIVE),
+        ("normal-2", Priority.NORMAL),
+    ]))
+    assert served == ["first", "interactive", "normal-1", "normal-2", "background"]
+    # One token every half second after the burst
+    assert clock.now == pytest.approx(1002.0)
+    assert bucket.stats()["waited"] == 4
+
+
+def test_raising_a_queued_waiter_moves_it_up(clock, run):
+    bucket = TokenBucket(rate=1, burst=1)
+    shared = SharedPriority(Priority.BACKGROUND)
+
+    async def scenario() -> list[str]:
+        waiting = asyncio.ensure_future(_acquire_all(bucket, [
+            ("first", Priority.NORMAL),
+            ("shared", shared),
+            ("normal", Priority.NORMAL),
+        ]))
+        while bucket.stats()["queue_depth"] < 2:
+            await asyncio.sleep(0)
+        assert bucket.stats()["queue_depth_by_priority"] == {"interactive": 0, "normal": 1, "background": 1}
+        shared.raise_to(Priority.INTERACTIVE)
+        assert bucket.stats()["queue_depth_by_priority"] == {"interactive": 1, "normal": 1, "background": 0}
+        return await waiting
+
+    assert run(scenario()) == ["first", "shared", "normal"]
+    # Lowering is a no-op
+    shared.raise_to(Priority.BACKGROUND)
+    assert shared.level == Priority.INTERACTIVE
+
+
+def test_pause_holds_every_request_until_the_deadline(clock, run):
+    bucket = TokenBucket(rate=10, burst=5)
+    bucket.pause_until(clock.now + 5)
+    bucket.pause_until(clock.now + 1)  # an earlier deadline doesn't shorten it
+    run(_acquire_all(bucket, [("a", Priority.INTERACTIVE), ("b", Priority.NORMAL)]))
+    assert clock.now >= 1005.0
+    assert bucket.stats()["pauses"] == 1
+
+
+def test_429_pauses_the_limiter_for_retry_after(run, monkeypatch):
+    limiter = TokenBucket(rate=100, burst=5)
+    monkeypatch.setattr(openf1_client, "_limiter", limiter)
+    monkeypatch.setattr(openf1_client, "_breaker", openf1_client.CircuitBreaker(5, 30))
+    responses = iter([
+        httpx.Response(429, headers={"Retry-After": "0.2"}),
+        httpx.Response(200, content=b"[]"),
+    ])
+
+    async def fetch() -> bytes:
+        transport = httpx.MockTransport(lambda request: next(responses))
+        async with httpx.AsyncClient(transport=transport) as client:
+            return await openf1_client._fetch_upstream(client, "https://api.openf1.org/v1/laps?session_key=1")
+
+    started = time.monotonic()
+    assert run(fetch()) == b"[]"
+    assert limiter.stats()["pauses"] == 1
+    assert time.monotonic() - started >= 0.2
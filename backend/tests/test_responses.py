@@ -0,0 +1,80 @@
+from __future__ import annotations
+
+from urllib.parse import urlencode
+
+from fastapi import Request, Response
+
+from app import openf1_client
+from app.responses import _ResultCache, cached_response
+
+SESSION_KEY = 9401
+
+
+def _request(etag: str | None = None, **params) -> Request:
+    headers = [(b"if-none-match", etag.encode())] if etag else []
+    return Request({
+        "type": "http", "method": "GET", "path": "/api/strategy/matrix",
+        "headers": headers, "query_string": urlencode(params).encode(),
+    })
+
+
+class Build:
+    """A response builder that counts its calls."""
+
+    def __init__(self, body: bytes) -> None:
+        self.body = body
+        self.calls = 0
+
+    async def __call__(self) -> Response:
+        self.calls += 1
+        return Response(content=self.body, media_type="application/json")
+
+
+def test_matching_if_none_match_gets_a_304(run):
+    build = Build(b'{"lap": 20}')
+    first = run(cached_response(_request(lap=20), SESSION_KEY, "v1", build))
+    assert first.status_code == 200 and first.body == b'{"lap": 20}'
+    etag = first.headers["ETag"]
+
+    again = run(cached_response(_request(etag, lap=20), SESSION_KEY, "v1", build))
+    assert again.status_code == 304 and again.body == b""
+    assert again.headers["ETag"] == etag
+    weak = run(cached_response(_request(f'"other", W/{etag}', lap=20), SESSION_KEY, "v1", build))
+    assert weak.status_code == 304
+    assert build.calls == 1
+
+    # Debug flags don't change what is cached
+    run(cached_response(_request(lap=20, timing="true"), SESSION_KEY, "v1", build))
+    assert build.calls == 1
+
+
+def test_new_data_version_rebuilds_with_a_new_etag(run):
+    build = Build(b'{"lap": 21}')
+    etag = run(cached_response(_request(lap=21), SESSION_KEY, "v1", build)).headers["ETag"]
+    build.body = b'{"lap": 21, "gap": 1.5}'
+    fresh = run(cached_response(_request(etag, lap=21), SESSION_KEY, "v2", build))
+    assert fresh.status_code == 200 and fresh.body == build.body
+    assert fresh.headers["ETag"] != etag
+    assert build.calls == 2
+
+
+def test_cache_control_depends_on_the_session_being_final(run, monkeypatch):
+    build = Build(b"{}")
+    monkeypatch.setitem(openf1_client._session_end, str(SESSION_KEY), openf1_client.time.time() + 600)
+    live = run(cached_response(_request(lap=22), SESSION_KEY, "v1", build))
+    assert live.headers["Cache-Control"] == "no-cache"
+    monkeypatch.setitem(openf1_client._session_end, str(SESSION_KEY), 0.0)
+    final = run(cached_response(_request(lap=22), SESSION_KEY, "v1", build))
+    assert final.headers["Cache-Control"].startswith("public, max-age=")
+
+
+def test_result_cache_is_bounded_by_bytes():
+    cache = _ResultCache(max_bytes=10)
+    cache.set(("a",), b"1234", "application/json")
+    cache.set(("b",), b"1234", "application/json")
+    assert cache.get(("a",)) is not None
+    cache.set(("c",), b"1234", "application/json")
+    assert cache.get(("b",)) is None
+    assert cache.bytes == 8
+    cache.set(("d",), b"x" * 11, "application/json")
+    assert cache.get(("d",)) is None
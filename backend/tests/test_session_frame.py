@@ -0,0 +1,56 @@
+from __future__ import annotations
+
+import asyncio
+from collections import OrderedDict
+
+import pytest
+
+from app import openf1_client, session_frame
+from app.openf1_client import OpenF1Client
+from app.rate_limiter import TokenBucket
+from app.session_frame import get_session_frame
+from bench import synthetic
+from bench.stand_in import OpenF1StandIn
+
+SESSION_KEYS = (9701, 9702, 9703)
+
+
+@pytest.fixture
+def client(monkeypatch, run):
+    monkeypatch.setattr(openf1_client, "_limiter", TokenBucket(rate=1000, burst=1000))
+    payloads: dict[str, list[dict]] = {}
+    for seed, session_key in enumerate(SESSION_KEYS, start=1):
+        race = synthetic.generate_race(seed=seed, drivers=4, laps=8, session_key=session_key)
+        for path, rows in race.items():
+            payloads.setdefault(path, []).extend(rows)
+    client = OpenF1Client(store_path=None, transport=OpenF1StandIn(payloads))
+    yield client
+    run(client.close())
+
+
+def test_concurrent_callers_share_one_build_and_leave_no_locks(client, monkeypatch, run):
+    monkeypatch.setattr(session_frame, "_MAX_FRAMES", 2)
+    monkeypatch.setattr(session_frame, "_frames", OrderedDict())
+
+    async def scenario():
+        return await asyncio.gather(*(
+            get_session_frame(client, session_key) for session_key in SESSION_KEYS for _ in range(3)
+        ))
+
+    frames = run(scenario())
+    for i in range(0, len(frames), 3):
+        assert frames[i] is frames[i + 1] is frames[i + 2]
+    assert len(session_frame._frames) == 2
+    assert session_frame._frame_locks == {}
+
+
+def test_a_failed_build_leaves_no_lock(client, monkeypatch, run):
+    monkeypatch.setattr(session_frame, "_frames", OrderedDict())
+
+    async def broken(fn, *args):
+        raise RuntimeError("build failed")
+
+    monkeypatch.setattr(session_frame.compute, "run", broken)
+    with pytest.raises(RuntimeError):
+        run(get_session_frame(client, SESSION_KEYS[0]))
+    assert session_frame._frame_locks == {}
@@ -0,0 +1,27 @@
+from __future__ import annotations
+
+from app.session_store import SessionStore
+
+URL = "https://api.openf1.org/v1/laps?session_key=9001"
+
+
+def test_round_trip_and_replace(tmp_path):
+    store = SessionStore(str(tmp_path / "store.sqlite3"))
+    assert store.get(URL) is None
+    store.put(URL, "9001", b'[{"lap_number": 1}]')
+    assert store.get(URL) == b'[{"lap_number": 1}]'
+    store.put(URL, "9001", b"[]")
+    assert store.get(URL) == b"[]"
+    store.put("https://api.openf1.org/v1/meetings?year=2023", None, b"[]")
+    assert store.sessions() == ["9001"]
+    store.close()
+
+
+def test_survives_a_restart_and_creates_its_directory(tmp_path):
+    path = tmp_path / "cache" / "f1-undercut" / "store.sqlite3"
+    store = SessionStore(str(path))
+    store.put(URL, "9001", b'{"ok": true}')
+    store.close()
+    reopened = SessionStore(str(path))
+    assert reopened.get(URL) == b'{"ok": true}'
+    reopened.close()
@@ -0,0 +1,66 @@
+from __future__ import annotations
+
+import numpy as np
+
+from app.session_frame import NO_TIME, TimeIndex
+
+
+def _index(ts: list[int], values: list[float] | None = None) -> TimeIndex:
+    values = list(range(len(ts))) if values is None else values
+    return TimeIndex(np.array(ts, dtype=np.int64), np.array(values, dtype=float))
+
+
+def _first_minimum(ts: np.ndarray, target: int) -> int:
+    """What a scan over the payload keeping the first strictly closer sample picks."""
+    best, best_diff = -1, None
+    for i, t in enumerate(ts):
+        diff = abs(int(t) - target)
+        if best_diff is None or diff < best_diff:
+            best, best_diff = i, diff
+    return best
+
+
+def test_tie_goes_to_the_earlier_sample():
+    index = _index([10, 20])
+    assert index.nearest(np.array([15])).tolist() == [0]
+    assert index.nearest(np.array([16])).tolist() == [1]
+
+
+def test_duplicate_timestamps_give_the_first():
+    index = _index([10, 20, 20, 20, 30])
+    assert index.nearest(np.array([19, 20, 21, 24])).tolist() == [1, 1, 1, 1]
+    assert index.nearest(np.array([25])).tolist() == [1]
+
+
+def test_outside_the_range_and_missing_targets():
+    index = _index([10, 20, 30])
+    assert index.nearest(np.array([-5, 10, 30, 99, NO_TIME])).tolist() == [0, 0, 2, 2, -1]
+    assert _index([]).nearest(np.array([5])).tolist() == [-1]
+
+
+def test_at_returns_values_and_nan_when_unknown():
+    index = _index([10, 20, 30], [1.5, 2.5, 3.5])
+    values = index.at(np.array([11, 26, NO_TIME]))
+    assert values[:2].tolist() == [1.5, 3.5]
+    assert np.isnan(values[2])
+    assert np.isnan(_index([]).at(np.array([5]))).all()
+
+
+def test_matches_a_first_minimum_scan():
+    rng = np.random.default_rng(7)
+    # Coarse timestamps so that ties and duplicates are common
+    ts = np.sort(rng.integers(0, 60, size=40)) * 5
+    index = _index(ts.tolist())
+    targets = np.arange(-10, 320)
+    expected = [_first_minimum(ts, int(t)) for t in targets]
+    assert index.nearest(targets).tolist() == expected
+
+
+def test_extend_appends_and_resorts_late_samples():
+    index = _index([10, 20], [1.0, 2.0])
+    index.extend(np.array([30, 40], dtype=np.int64), np.array([3.0, 4.0]))
+    assert index.ts.tolist() == [10, 20, 30, 40]
+    index.extend(np.array([15], dtype=np.int64), np.array([1.5]))
+    assert index.ts.tolist() == [10, 15, 20, 30, 40]
+    assert index.values.tolist() == [1.0, 1.5, 2.0, 3.0, 4.0]
+    assert index.at(np.array([16])).tolist() == [1.5]
@@ -2,8 +2,8 @@ import { useCallback, useRef, useState } from 'react';
 import SessionPicker from './components/SessionPicker';
 import DriverSelector from './components/DriverSelector';
 import Dashboard from './components/Dashboard';
-import { fetchEvaluation } from './api/client';
-import type { SessionInfo, UndercutResult } from './types';
+import { fetchScalars, fetchSeries, fetchTimeline } from './api/client';
+import type { SessionInfo, UndercutResult, UndercutScalars } from './types';
 
 export default function App() {
   const [session, setSession] = useState<SessionInfo | null>(null);
@@ -15,16 +15,27 @@ export default function App() {
 
   // Remember the last driver pair so the lap slider can re-fetch
   const driverPairRef = useRef<{ leader: number; chaser: number } | null>(null);
+  // Per-lap numbers for the whole race, so scrubbing needs no round trips
+  const timelineRef = useRef<Map<number, UndercutScalars> | null>(null);
 
   async function handleAnalyze(leader: number, chaser: number) {
     if (!session) return;
     driverPairRef.current = { leader, chaser };
+    timelineRef.current = null;
     setAnalyzing(true);
     setError(null);
     setResult(null);
     try {
-      const data = await fetchEvaluation(session.session_key, leader, chaser);
-      setResult(data);
+      const [scalars, series, timeline] = await Promise.all([
+        fetchScalars(session.session_key, leader, chaser),
+        fetchSeries(session.session_key, leader, chaser),
+        // The slider falls back to per-lap evaluation if this fails
+        fetchTimeline(session.session_key, leader, chaser).catch(() => null),
+      ]);
+      if (timeline) {
+        timelineRef.current = new Map(timeline.laps.map((p): [number, UndercutScalars] => [p.at_lap ?? 0, p]));
+      }
+      setResult({ ...series, ...scalars });
     } catch (err: any) {
       setError(err.message ?? 'Something went wrong');
     } finally {
@@ -36,11 +47,17 @@ export default function App() {
     async (lap: number) => {
       if (!session || !driverPairRef.current) return;
       const { leader, chaser } = driverPairRef.current;
-      setLapLoading(true);
       setCurrentLap(lap);
+      const point = timelineRef.current?.get(lap);
+      if (point) {
+        setResult((prev) => (prev ? { ...prev, ...point } : prev));
+        setError(null);
+        return;
+      }
+      setLapLoading(true);
       try {
-        const data = await fetchEvaluation(session.session_key, leader, chaser, lap);
-        setResult(data);
+        const scalars = await fetchScalars(session.session_key, leader, chaser, lap);
+        setResult((prev) => (prev ? { ...prev, ...scalars } : prev));
         setError(null);
       } catch (err: any) {
         setError(err.message ?? 'Something went wrong');
@@ -70,7 +87,7 @@ export default function App() {
 
       {/* Session selection */}
       <section className="mb-6 rounded-xl border border-zinc-700/50 bg-zinc-800/20 p-5">
-        <SessionPicker onSessionSelected={(s) => { setSession(s); setResult(null); setError(null); setCurrentLap(null); }} />
+        <SessionPicker onSessionSelected={(s) => { setSession(s); setResult(null); setError(null); setCurrentLap(null); timelineRef.current = null; }} />
       </section>
 
       {/* Driver selection */}
@@ -1,14 +1,69 @@
-import type { MeetingInfo, SessionInfo, DriverInfo, UndercutResult } from '../types';
+import type {
+  MeetingInfo,
+  SessionInfo,
+  DriverInfo,
+  UndercutResult,
+  UndercutScalars,
+  UndercutSeries,
+  UndercutTimeline,
+} from '../types';
 
 const BASE = '/api';
 
-async function get<T>(path: string): Promise<T> {
-  const res = await fetch(`${BASE}${path}`);
+// Column-oriented JSON: every list of objects arrives as
+// {"$length": n, "$columns": {field: column}}, where a column is an array,
+// {"$repeat": value}, or {"$time_deltas": [...], "$unit": "ms" | "us"}
+// (epoch time of the first row, then differences to the previous row).
+const COLUMNS = 'application/vnd.undercut.columns+json';
+
+type Column = unknown[] | { $repeat: unknown } | { $time_deltas: number[]; $unit: 'ms' | 'us' };
+
+function isoFromMicros(us: number): string {
+  const ms = Math.floor(us / 1000);
+  const frac = String(us - ms * 1000).padStart(3, '0');
+  return new Date(ms).toISOString().replace('Z', `${frac}+00:00`);
+}
+
+function decodeColumn(column: Column, length: number): unknown[] {
+  if (Array.isArray(column)) return column;
+  if ('$repeat' in column) return new Array(length).fill(column.$repeat);
+  const out = new Array<string>(length);
+  let t = 0;
+  column.$time_deltas.forEach((d, i) => {
+    t += d;
+    out[i] = column.$unit === 'ms' ? isoFromMicros(t * 1000) : isoFromMicros(t);
+  });
+  return out;
+}
+
+function decodeColumns(value: unknown): unknown {
+  if (Array.isArray(value)) return value.map(decodeColumns);
+  if (value === null || typeof value !== 'object') return value;
+  const obj = value as Record<string, unknown>;
+  if ('$columns' in obj) {
+    const length = obj.$length as number;
+    const columns = Object.entries(obj.$columns as Record<string, Column>).map(
+      ([key, column]): [string, unknown[]] => [key, decodeColumn(column, length)],
+    );
+    const rows = new Array<Record<string, unknown>>(length);
+    for (let i = 0; i < length; i++) {
+      const row: Record<string, unknown> = {};
+      for (const [key, values] of columns) row[key] = values[i];
+      rows[i] = row;
+    }
+    return rows;
+  }
+  return Object.fromEntries(Object.entries(obj).map(([k, v]) => [k, decodeColumns(v)]));
+}
+
+async function get<T>(path: string, columnar = false): Promise<T> {
+  const res = await fetch(`${BASE}${path}`, columnar ? { headers: { Accept: `${COLUMNS}, application/json` } } : undefined);
   if (!res.ok) {
     const text = await res.text();
     throw new Error(`API error ${res.status}: ${text}`);
   }
-  return res.json();
+  const body = await res.json();
+  return (res.headers.get('content-type')?.startsWith(COLUMNS) ? decodeColumns(body) : body) as T;
 }
 
 export function fetchMeetings(year: number) {
@@ -37,5 +92,30 @@ export function fetchPositions(sessionKey: number, lap?: number) {
 export function fetchEvaluation(sessionKey: number, leader: number, chaser: number, lap?: number) {
   let url = `/strategy/evaluate?session_key=${sessionKey}&leader=${leader}&chaser=${chaser}`;
   if (lap != null) url += `&lap=${lap}`;
-  return get<UndercutResult>(url);
+  return get<UndercutResult>(url, true);
+}
+
+// Lap-dependent numbers only; pair with fetchSeries for the charts
+export function fetchScalars(sessionKey: number, leader: number, chaser: number, lap?: number) {
+  let url = `/strategy/evaluate?session_key=${sessionKey}&leader=${leader}&chaser=${chaser}&slim=true`;
+  if (lap != null) url += `&lap=${lap}`;
+  return get<UndercutScalars>(url);
+}
+
+// Gap/weather points per chart; more than a chart's width in pixels adds nothing
+const CHART_POINTS = 800;
+
+// Served with an ETag, so the browser cache revalidates instead of refetching
+export function fetchSeries(sessionKey: number, leader: number, chaser: number) {
+  return get<UndercutSeries>(
+    `/strategy/series?session_key=${sessionKey}&leader=${leader}&chaser=${chaser}&max_points=${CHART_POINTS}`,
+    true,
+  );
+}
+
+export function fetchTimeline(sessionKey: number, leader: number, chaser: number) {
+  return get<UndercutTimeline>(
+    `/strategy/timeline?session_key=${sessionKey}&leader=${leader}&chaser=${chaser}`,
+    true,
+  );
 }
@@ -64,6 +64,58 @@ export interface WeatherEntry {
   rainfall?: number | null;
 }
 
+export interface UndercutSimulation {
+  samples: number;
+  probability: number;
+  probability_low: number;
+  probability_high: number;
+  margin_mean: number;
+  margin_p05: number;
+  margin_p50: number;
+  margin_p95: number;
+}
+
+export interface UndercutScalars {
+  gap: number | null;
+  pit_loss: number | null;
+  leader_pace: number | null;
+  chaser_pace: number | null;
+  projected_outlap_pace: number | null;
+  pace_delta: number | null;
+  undercut_margin: number | null;
+  probability: number;
+  window_open: boolean;
+  leader_compound: string | null;
+  chaser_compound: string | null;
+  leader_tyre_age: number | null;
+  chaser_tyre_age: number | null;
+  at_lap: number | null;
+  projected_leader_laps?: number[] | null;
+  projected_chaser_laps?: number[] | null;
+  leader_degradation?: number | null;
+  chaser_degradation?: number | null;
+  simulation?: UndercutSimulation | null;
+}
+
+export interface UndercutTimeline {
+  leader_number: number;
+  chaser_number: number;
+  total_laps: number;
+  laps: UndercutScalars[];
+}
+
+export interface UndercutSeries {
+  leader_info: DriverInfo | null;
+  chaser_info: DriverInfo | null;
+  laps_leader: LapData[];
+  laps_chaser: LapData[];
+  stints_leader: StintData[];
+  stints_chaser: StintData[];
+  gap_history: GapEntry[];
+  weather: WeatherEntry[];
+  total_laps: number;
+}
+
 export interface UndercutResult {
   gap: number | null;
   pit_loss: number | null;
@@ -88,4 +140,9 @@ export interface UndercutResult {
   weather: WeatherEntry[];
   at_lap: number | null;
   total_laps: number;
+  projected_leader_laps?: number[] | null;
+  projected_chaser_laps?: number[] | null;
+  leader_degradation?: number | null;
+  chaser_degradation?: number | null;
+  simulation?: UndercutSimulation | null;
 }